@@ -0,0 +1,304 @@
+"""
+基准测试脚本
+测量测速引擎、配置持久化和界面热点路径的耗时，并与保存的基线比较以发现性能回退
+
+用法:
+    python benchmark.py                  # 运行全部基准并与基线比较
+    python benchmark.py --save-baseline  # 运行并保存为新基线
+    python benchmark.py -k history       # 只运行名称包含history的基准
+"""
+
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+from config_manager import ConfigManager
+from fake_registry import FakeRegistryServer
+
+
+BASELINE_FILE = Path(__file__).parent / "bench_baseline.json"
+
+# 相对基线变慢超过该比例视为回退
+DEFAULT_TOLERANCE = 0.25
+
+# 基线低于该值（秒）的基准受计时抖动影响大，使用更宽的容差
+SMALL_BASELINE = 0.01
+SMALL_TOLERANCE = 1.0
+
+
+class SkipBenchmark(Exception):
+    """当前环境无法运行该基准"""
+
+
+class Benchmark:
+    """单个基准测试：setup准备数据，run为被测量的操作"""
+
+    def __init__(self, name: str, run: Callable[[], None], setup: Optional[Callable[[], None]] = None,
+                 teardown: Optional[Callable[[], None]] = None, repeat: int = 10):
+        self.name = name
+        self.run = run
+        self.setup = setup
+        self.teardown = teardown
+        self.repeat = repeat
+
+    def measure(self) -> float:
+        """运行repeat次，返回最短耗时（秒，受调度和缓存抖动影响最小）；环境不满足时抛出SkipBenchmark"""
+        try:
+            if self.setup:
+                self.setup()
+            timings = []
+            for _ in range(self.repeat):
+                start = time.perf_counter()
+                self.run()
+                timings.append(time.perf_counter() - start)
+            return min(timings)
+        finally:
+            if self.teardown:
+                self.teardown()
+
+
+def _make_npm_manager(cache_dir: Path):
+    """创建NPMRegistryManager，npm不可用时跳过依赖它的基准"""
+    from npm_manager import NPMRegistryManager
+    try:
+        return NPMRegistryManager(cache_dir=cache_dir)
+    except Exception as e:
+        raise SkipBenchmark(f"无法创建NPMRegistryManager: {e}")
+
+
+def probe_benchmarks(workdir: Path, registry_counts=(3, 10), latency: float = 0.05) -> List[Benchmark]:
+    """完整测速（测试全部源）的墙钟时间，源为注入延迟的本地模拟源"""
+    benchmarks = []
+    for count in registry_counts:
+        state = {}
+
+        def setup(count=count, state=state):
+            state["servers"] = []
+            state["manager"] = _make_npm_manager(workdir / "cache")
+            state["servers"] = [FakeRegistryServer(latency=latency, seed=i).start() for i in range(count)]
+
+        def run(state=state):
+            manager = state["manager"]
+            manager.begin_probe_run()
+            for server in state["servers"]:
+                manager.test_registry_phases(server.url)
+
+        def teardown(state=state):
+            for server in state["servers"]:
+                server.stop()
+
+        benchmarks.append(Benchmark(f"probe_all[{count} registries, {int(latency * 1000)}ms]",
+                                    run, setup, teardown, repeat=3))
+    return benchmarks
+
+
+def _fill_history(config_manager: ConfigManager, registry_count: int) -> None:
+    """为每个源写入10条测速记录（历史记录的保留上限）"""
+    config_manager.history["speed_tests"] = {
+        f"https://registry-{i}.example.com/": [
+            {"timestamp": "2024-01-01T00:00:00", "speed": 100.0 + j, "success": True}
+            for j in range(10)
+        ]
+        for i in range(registry_count)
+    }
+    config_manager.save_history()
+
+
+def history_benchmarks(workdir: Path, sizes=(10, 100, 1000)) -> List[Benchmark]:
+    """record_speed_test和load_history的耗时与历史记录规模的关系"""
+    benchmarks = []
+    for size in sizes:
+        state = {}
+
+        def setup(size=size, state=state):
+            state["config"] = ConfigManager(config_dir=workdir / f"history-{size}")
+            _fill_history(state["config"], size)
+
+        def record(state=state):
+            state["config"].record_speed_test("https://registry-0.example.com/", 123.0, True)
+
+        def load(state=state):
+            state["config"].load_history()
+
+        benchmarks.append(Benchmark(f"record_speed_test[{size} registries]", record, setup, repeat=30))
+        benchmarks.append(Benchmark(f"load_history[{size} registries]", load, setup, repeat=30))
+    return benchmarks
+
+
+def ui_benchmarks(workdir: Path, sizes=(10, 100, 1000)) -> List[Benchmark]:
+    """MainWindow.load_registry_list在offscreen平台下的耗时"""
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    benchmarks = []
+    for size in sizes:
+        state = {}
+
+        def setup(size=size, state=state):
+            from PySide6.QtWidgets import QApplication
+            from main_window import MainWindow
+
+            state["app"] = QApplication.instance() or QApplication([])
+            config_manager = ConfigManager(config_dir=workdir / f"ui-{size}")
+            config_manager.config["custom_registries"] = [
+                {"name": f"源{i}", "url": f"https://registry-{i}.example.com/"} for i in range(size)
+            ]
+            npm_manager = _make_npm_manager(workdir / "cache")
+            state["window"] = MainWindow(npm_manager, config_manager)
+
+        def run(state=state):
+            state["window"].load_registry_list()
+
+        def teardown(state=state):
+            window = state.pop("window", None)
+            if window is not None:
+                _dispose_window(window)
+
+        benchmarks.append(Benchmark(f"load_registry_list[{size} registries]", run, setup, teardown, repeat=5))
+    return benchmarks
+
+
+def _dispose_window(window) -> None:
+    """关闭窗口并在事件循环中真正删除它和它的子对象，避免由Python析构共享的QObject"""
+    from PySide6.QtCore import QCoreApplication, QEvent
+
+    window.close()
+    window.deleteLater()
+    QCoreApplication.sendPostedEvents(None, QEvent.DeferredDelete)
+    QCoreApplication.processEvents()
+
+
+def shutdown_qt() -> None:
+    """在解释器退出前关闭界面基准创建的QApplication"""
+    if "PySide6.QtWidgets" not in sys.modules:
+        return
+    from PySide6.QtCore import QCoreApplication, QEvent
+    from PySide6.QtWidgets import QApplication
+
+    app = QApplication.instance()
+    if app is not None:
+        QCoreApplication.sendPostedEvents(None, QEvent.DeferredDelete)
+        app.processEvents()
+        app.shutdown()
+
+
+def install_benchmarks(workdir: Path, latency: float = 0.02) -> List[Benchmark]:
+    """对注入延迟的本地模拟源执行内置测试项目的 npm ci（全新缓存）"""
+    state = {}
+
+    def setup():
+        from install_bench import InstallBenchmark
+
+        npm = shutil.which("npm")
+        if npm is None:
+            raise SkipBenchmark("未找到npm")
+        state["server"] = FakeRegistryServer(latency=latency).start()
+        project = state["server"].write_fixture_project(workdir / "install-fixture")
+        state["bench"] = InstallBenchmark(npm, project)
+
+    def run():
+        result = state["bench"].run_once(state["server"].url)
+        if not result["success"]:
+            raise RuntimeError(f"npm ci 失败: {result['error']}")
+
+    def teardown():
+        if state.get("server") is not None:
+            state["server"].stop()
+
+    return [Benchmark(f"npm_ci[fixture, {int(latency * 1000)}ms]", run, setup, teardown, repeat=3)]
+
+
+def startup_benchmarks() -> List[Benchmark]:
+    """main.py的进程启动（解释器启动 + 导入全部界面模块）耗时"""
+    env = dict(os.environ, QT_QPA_PLATFORM="offscreen")
+    cwd = Path(__file__).parent
+
+    def run():
+        subprocess.run([sys.executable, "-c", "import main"], cwd=cwd, env=env, check=True)
+
+    return [Benchmark("startup[import main]", run, repeat=7)]
+
+
+def load_baseline(path: Path) -> Dict[str, float]:
+    """读取基线文件"""
+    if not path.exists():
+        return {}
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_baseline(path: Path, results: Dict[str, float]) -> None:
+    """保存基线文件（合并已有基线中未运行的条目）"""
+    baseline = load_baseline(path)
+    baseline.update({name: round(value, 6) for name, value in results.items()})
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(baseline, f, indent=2, ensure_ascii=False, sort_keys=True)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """运行基准测试"""
+    parser = argparse.ArgumentParser(description="NPM源管理器基准测试")
+    parser.add_argument("-k", dest="keyword", help="只运行名称包含该关键字的基准")
+    parser.add_argument("--save-baseline", action="store_true", help="将本次结果保存为基线")
+    parser.add_argument("--baseline", type=Path, default=BASELINE_FILE, help="基线文件路径")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="允许相对基线变慢的比例（默认0.25，基线低于10ms的基准至少为1.0）")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory(prefix="npm-registry-bench-") as tmp:
+        workdir = Path(tmp)
+        benchmarks = (
+            probe_benchmarks(workdir)
+            + history_benchmarks(workdir)
+            + ui_benchmarks(workdir)
+            + install_benchmarks(workdir)
+            + startup_benchmarks()
+        )
+        if args.keyword:
+            benchmarks = [b for b in benchmarks if args.keyword in b.name]
+
+        baseline = load_baseline(args.baseline)
+        results = {}
+        regressions = []
+        for benchmark in benchmarks:
+            print(f"{benchmark.name} ...")
+            try:
+                value = benchmark.measure()
+            except SkipBenchmark as e:
+                print(f"  跳过: {e}")
+                continue
+            results[benchmark.name] = value
+
+            line = f"  {value * 1000:.3f}ms"
+            base = baseline.get(benchmark.name)
+            if base:
+                change = (value - base) / base
+                tolerance = max(args.tolerance, SMALL_TOLERANCE) if base < SMALL_BASELINE else args.tolerance
+                line += f"  (基线 {base * 1000:.3f}ms, {change:+.1%})"
+                if change > tolerance:
+                    line += "  ← 性能回退"
+                    regressions.append(benchmark.name)
+            print(line)
+        shutdown_qt()
+
+    if args.save_baseline:
+        save_baseline(args.baseline, results)
+        print(f"\n基线已保存到 {args.baseline}")
+        return 0
+
+    if regressions:
+        print(f"\n发现 {len(regressions)} 项性能回退:")
+        for name in regressions:
+            print(f"  {name}")
+        return 1
+    print("\n全部基准测试完成")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
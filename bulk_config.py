@@ -0,0 +1,141 @@
+"""
+批量项目配置模块
+在目录树中查找npm项目（跳过node_modules），并行读取各项目的.npmrc，
+报告每个项目实际使用的源，并一次性把选定的源写入全部项目（支持只显示差异的预演模式）
+"""
+
+import difflib
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from npmrc import parse_npmrc, registry_key, set_npmrc_value
+
+
+# 不进入的目录（依赖目录和版本库，其他以.开头的目录同样跳过）
+SKIP_DIRS = {"node_modules", "bower_components", ".git", ".hg", ".svn"}
+
+# 默认并行I/O线程数
+DEFAULT_WORKERS = 16
+
+
+def _scan_dir(path: str):
+    """列出一个目录：返回 (是否为项目, 子目录列表)"""
+    is_project = False
+    subdirs = []
+    try:
+        with os.scandir(path) as entries:
+            for entry in entries:
+                if entry.name == "package.json" and entry.is_file():
+                    is_project = True
+                elif (entry.is_dir(follow_symlinks=False) and entry.name not in SKIP_DIRS
+                      and not entry.name.startswith(".")):
+                    subdirs.append(entry.path)
+    except OSError:
+        pass
+    return is_project, subdirs
+
+
+def find_projects(root: Path, max_depth: Optional[int] = None, workers: int = DEFAULT_WORKERS) -> List[Path]:
+    """按层并行遍历目录树，返回包含package.json的项目目录（按路径排序）
+
+    找到项目后不再进入其子目录（工作区中的子包使用项目根目录的.npmrc）。
+    """
+    projects = []
+    frontier = [str(Path(root).expanduser())]
+    depth = 0
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        while frontier:
+            next_frontier = []
+            for path, (is_project, subdirs) in zip(frontier, executor.map(_scan_dir, frontier)):
+                if is_project:
+                    projects.append(Path(path))
+                elif max_depth is None or depth < max_depth:
+                    next_frontier.extend(subdirs)
+            frontier = next_frontier
+            depth += 1
+    return sorted(projects)
+
+
+def _read_text(path: Path) -> Tuple[Optional[str], Optional[str]]:
+    """读取文件内容，返回 (内容, 错误信息)
+
+    只有文件不存在时内容为None且没有错误；无法读取或不是UTF-8编码时返回错误信息，
+    这样的文件不能当作不存在而被覆盖。
+    """
+    try:
+        return path.read_text(encoding="utf-8"), None
+    except FileNotFoundError:
+        return None, None
+    except (OSError, UnicodeDecodeError) as e:
+        return None, str(e)
+
+
+def read_projects(projects: List[Path], scope: Optional[str] = None,
+                  workers: int = DEFAULT_WORKERS) -> List[Dict]:
+    """并行读取各项目的.npmrc
+
+    返回 [{"path", "npmrc", "text", "registry", "error"}]，registry为项目.npmrc中设置的源
+    （未设置时为None，即继承用户配置），error为读取失败的原因（.npmrc存在但无法读取时）。
+    """
+    key = registry_key(scope)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(_read_text, [project / ".npmrc" for project in projects]))
+    return [{"path": project, "npmrc": project / ".npmrc", "text": text,
+             "registry": parse_npmrc(text).get(key) if text else None, "error": error}
+            for project, (text, error) in zip(projects, results)]
+
+
+def plan_registry_change(projects: List[Dict], registry_url: str, scope: Optional[str] = None) -> List[Dict]:
+    """计算把源写入每个项目.npmrc后的新内容，只返回需要修改的项目（跳过.npmrc无法读取的项目）"""
+    key = registry_key(scope)
+    plan = []
+    for project in projects:
+        if project.get("error"):
+            continue
+        old_text = project["text"] or ""
+        new_text = set_npmrc_value(old_text, key, registry_url)
+        if new_text != old_text:
+            plan.append(dict(project, new_text=new_text))
+    return plan
+
+
+def format_diff(plan: List[Dict], root: Optional[Path] = None) -> str:
+    """把修改计划格式化为统一差异格式"""
+    chunks = []
+    for change in plan:
+        name = str(change["npmrc"].relative_to(root)) if root else str(change["npmrc"])
+        old_name = name if change["text"] is not None else "/dev/null"
+        chunks.extend(difflib.unified_diff((change["text"] or "").splitlines(keepends=True),
+                                           change["new_text"].splitlines(keepends=True),
+                                           fromfile=old_name, tofile=name))
+    return "".join(chunks)
+
+
+def _write_atomic(change: Dict) -> Optional[str]:
+    """先写临时文件再替换，返回错误信息（成功时为None）；读取失败的文件不写入"""
+    if change.get("error"):
+        return f"无法读取原文件，未修改: {change['error']}"
+    path = change["npmrc"]
+    tmp = None
+    try:
+        fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=".npmrc.", suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(change["new_text"])
+        if path.exists():
+            os.chmod(tmp, path.stat().st_mode & 0o777)
+        os.replace(tmp, path)
+        return None
+    except OSError as e:
+        if tmp is not None and os.path.exists(tmp):
+            os.unlink(tmp)
+        return str(e)
+
+
+def apply_plan(plan: List[Dict], workers: int = DEFAULT_WORKERS) -> List[Dict]:
+    """并行写入修改，返回写入失败的项目 [{"npmrc", "error"}]"""
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        errors = list(executor.map(_write_atomic, plan))
+    return [{"npmrc": change["npmrc"], "error": error} for change, error in zip(plan, errors) if error]
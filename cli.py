@@ -0,0 +1,709 @@
+"""
+NPM源管理器 - 命令行工具
+在无界面环境（服务器、CI）下查看、测试和切换NPM源
+"""
+
+import argparse
+import sys
+import tempfile
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from npm_manager import NPMRegistryManager
+from config_manager import ConfigManager
+from daemon import RegistryDaemon, query_daemon
+from rate_limit import RateLimiter
+from mirror_selection import STRATEGIES, MirrorSelector, simulate_selection
+from scoring import ScoringEngine, format_breakdown
+from install_bench import InstallBenchmark, default_project_name, rank_results
+from load_profile import LoadProfiler, suggest_overall
+from install_guard import InstallGuard
+from bulk_config import apply_plan, find_projects, format_diff, plan_registry_change, read_projects
+from npmrc import registry_key
+from registry_import import filter_existing, read_registry_file, validate_registries
+from scoped_registry import choose_fastest, scope_candidates, select_scope_registries
+from fake_registry import FakeRegistryServer
+from probe_trace import TraceReplayer, load_trace, replay_live
+from metrics import METRICS
+from connectivity import format_offline
+
+
+def get_all_registries(npm_manager: NPMRegistryManager, config_manager: ConfigManager) -> Dict[str, str]:
+    """获取预置源和自定义源"""
+    all_registries = npm_manager.CHINA_REGISTRIES.copy()
+    for custom in config_manager.get_custom_registries():
+        all_registries[custom["name"]] = custom["url"]
+    return all_registries
+
+
+# 选出最快源的依据
+CHOICE_SOURCES = {"fresh": "最近测速", "profile": "当前时段历史统计", "probe": "实时测速",
+                  "cached": "最后一次测速"}
+
+
+def _format_ms(value: Optional[float]) -> str:
+    """格式化毫秒数"""
+    return f"{value}ms" if value is not None else "-"
+
+
+def _print_ranking(ranking: List[Dict], verbose: bool = False) -> None:
+    """输出综合评分排名（verbose时显示各项明细）"""
+    for index, item in enumerate(ranking, 1):
+        score = item["score"] if item["score"] is not None else "-"
+        print(f"{index}. {item['name']:<10} {item['url']:<50} {score}")
+        if verbose and item["score"] is not None:
+            for line in format_breakdown(item).splitlines()[1:]:
+                print(f"     {line}")
+
+
+def cmd_list(args, npm_manager: NPMRegistryManager, config_manager: ConfigManager) -> int:
+    """列出所有源"""
+    current_url = npm_manager.current_registry
+    for name, url in get_all_registries(npm_manager, config_manager).items():
+        marker = "*" if url == current_url else " "
+        avg_speed = config_manager.get_average_speed(url)
+        speed_text = f"{round(avg_speed, 2)}ms" if avg_speed > 0 else "-"
+        print(f"{marker} {name:<10} {url:<50} {speed_text}")
+    return 0
+
+
+def cmd_current(args, npm_manager: NPMRegistryManager, config_manager: ConfigManager) -> int:
+    """显示当前源"""
+    current_url = npm_manager.current_registry
+    print(f"{npm_manager.get_registry_name(current_url)}: {current_url}")
+    return 0
+
+
+def cmd_test(args, npm_manager: NPMRegistryManager, config_manager: ConfigManager) -> int:
+    """测试所有源的速度"""
+    registries = get_all_registries(npm_manager, config_manager)
+    timeout = args.timeout or config_manager.get("test_timeout", 5)
+
+    trace_file = args.trace or config_manager.get("probe_trace_file")
+    if trace_file:
+        npm_manager.enable_trace(Path(trace_file).expanduser())
+
+    selector = MirrorSelector.from_config(config_manager, args.strategy)
+    if args.probes:
+        selector.probes_per_round = args.probes
+    urls = list(registries.values())
+    selected = selector.select(urls)
+    report = selector.expected_regret(urls, selected)
+
+    connectivity = npm_manager.check_connectivity(urls, config_manager.get("offline_check_timeout", 0.2))
+    if not connectivity["online"]:
+        print(f"{format_offline(connectivity)}，{connectivity['duration_ms']}ms内跳过测速，按已有记录排名:")
+        _print_ranking(ScoringEngine.from_config(config_manager).rank(registries, config_manager.history["speed_tests"]))
+        npm_manager.disable_trace()
+        return 2
+
+    npm_manager.begin_probe_run()
+    recommendations: List[str] = []
+    for name, url in registries.items():
+        if url not in selected:
+            continue
+        phases = npm_manager.test_registry_phases(url, timeout)
+        if phases.get("deferred"):
+            print(f"{name:<10} {phases['error']}")
+            continue
+        success = phases["success"]
+        speed = phases["total"] if success else 0.0
+        if args.families and config_manager.get("compare_ip_families", True):
+            phases["families"] = npm_manager.test_registry_families(url, timeout, known=phases)
+        if success and args.quality and config_manager.get("measure_quality", True):
+            quality = npm_manager.test_registry_quality(url, config_manager.get("quality_package", "lodash"),
+                                                        range_budget=config_manager.get_range_budget())
+            phases["throughput"] = quality["throughput"]
+            phases["sync_lag"] = quality["sync_lag"]
+
+        config_manager.record_speed_test(url, speed, success, phases)
+        line = f"{name:<10} {_format_ms(speed) if success else '连接失败':<12}"
+        if phases.get("throughput"):
+            line += f" {round(phases['throughput'] / 1024)}KB/s"
+
+        families = phases.get("families")
+        if families:
+            config_manager.record_family_test(url, families)
+            line += f" IPv4 {_format_ms(families['ipv4']):<12} IPv6 {_format_ms(families['ipv6'])}"
+            recommendation = config_manager.get_family_recommendation(url)
+            if recommendation:
+                recommendations.append(f"{name}: {recommendation['message']}")
+        print(line)
+
+    if report["probes_saved"]:
+        print(f"\n按{selector.strategy}策略跳过 {report['probes_saved']} 个源，"
+              f"相比测试全部源的预计遗憾值: {report['regret_ms']}ms")
+    deferred = npm_manager.get_rate_limit_stats()["deferred"]
+    if deferred:
+        print(f"\n{deferred} 次探测因限速推迟")
+    if recommendations:
+        print("\n网络路径建议:")
+        for item in recommendations:
+            print(f"  {item}")
+    npm_manager.disable_trace()
+    return 0
+
+
+def cmd_replay(args, npm_manager: NPMRegistryManager, config_manager: ConfigManager) -> int:
+    """回放探测轨迹，评估超时和并发设置"""
+    records = load_trace(Path(args.trace).expanduser())
+    if not records:
+        print(f"轨迹文件为空: {args.trace}", file=sys.stderr)
+        return 1
+
+    if args.live:
+        # 回放的是本地模拟源，回放期间不限速
+        rate_limiter, npm_manager.rate_limiter = npm_manager.rate_limiter, RateLimiter.unlimited()
+        try:
+            records = replay_live(records, lambda url: npm_manager.test_registry_phases(url, args.probe_timeout),
+                                  time_scale=args.time_scale)
+        finally:
+            npm_manager.rate_limiter = rate_limiter
+
+    replayer = TraceReplayer(records)
+    if args.strategy:
+        penalty = args.timeout_ms or args.probe_timeout * 1000
+        result = simulate_selection(replayer.runs, args.strategy, args.probes, penalty)
+        print(f"{args.strategy}策略: 探测 {result['probes']}/{result['probes_all']} 次，"
+              f"平均遗憾值 {result.get('avg_regret_ms', 0)}ms")
+        return 0
+
+    summary = replayer.replay(timeout_ms=args.timeout_ms, concurrency=args.concurrency)
+    names = {url: npm_manager.get_registry_name(url) for url in summary["choices"]}
+    print(f"回放轮数: {summary['runs']}  全部失败轮数: {summary['failed_runs']}")
+    print(f"平均每轮耗时: {summary.get('avg_wall_ms', 0)}ms  平均遗憾值: {summary.get('avg_regret_ms', 0)}ms")
+    print("选中次数:")
+    for url, count in sorted(summary["choices"].items(), key=lambda item: -item[1]):
+        print(f"  {names[url]:<10} {url:<50} {count}")
+    return 0
+
+
+def cmd_rank(args, npm_manager: NPMRegistryManager, config_manager: ConfigManager) -> int:
+    """按综合评分列出源的排名和各项明细"""
+    registries = get_all_registries(npm_manager, config_manager)
+    ranking = ScoringEngine.from_config(config_manager).rank(registries, config_manager.history["speed_tests"])
+    _print_ranking(ranking, args.verbose)
+
+    if args.switch:
+        old_registry = npm_manager.current_registry
+        url = npm_manager.switch_to_best(ranking)
+        if url is None:
+            print("没有可用的评分，请先运行 test", file=sys.stderr)
+            return 1
+        if url != old_registry:
+            config_manager.record_registry_switch(old_registry, url)
+        print(f"\n已切换到: {npm_manager.get_registry_name(url)} ({url})")
+    return 0
+
+
+def cmd_fastest(args, npm_manager: NPMRegistryManager, config_manager: ConfigManager) -> int:
+    """选出综合评分最高的源：最近的测速结果优先，其次为当前时段的历史统计，都没有时才实际测速"""
+    registries = get_all_registries(npm_manager, config_manager)
+    urls = list(registries.values())
+    choice = choose_fastest(npm_manager, config_manager, urls, args.probe, args.max_age)
+    if choice is None:
+        print("所有源均连接失败或网络不可用", file=sys.stderr)
+        return 1
+
+    name = npm_manager.get_registry_name(choice["url"])
+    if args.quiet:
+        print(choice["url"])
+    else:
+        offline = "，网络不可用" if choice.get("offline") else ""
+        print(f"{name}: {choice['url']} (评分{choice['score']}, {_format_ms(choice['speed'])}, "
+              f"依据{CHOICE_SOURCES[choice['source']]}{offline})")
+
+    if args.switch and choice["url"] != npm_manager.current_registry:
+        old_registry = npm_manager.current_registry
+        npm_manager.set_registry(choice["url"])
+        config_manager.record_registry_switch(old_registry, choice["url"])
+        if not args.quiet:
+            print(f"已切换到: {name}")
+    return 0
+
+
+def cmd_install_bench(args, npm_manager: NPMRegistryManager, config_manager: ConfigManager) -> int:
+    """对每个源执行 npm ci 安装基准"""
+    repeats = args.repeat or config_manager.get("install_bench_repeats", 3)
+    registries = get_all_registries(npm_manager, config_manager)
+    servers = []
+    workdir = None
+
+    if args.project:
+        project_dir = Path(args.project).expanduser()
+        if args.registries:
+            registries = {name: registries.get(name, name) for name in args.registries}
+    else:
+        # 没有指定项目时，对本地模拟源（分别注入不同延迟）运行内置的测试项目
+        workdir = tempfile.TemporaryDirectory(prefix="npm-install-fixture-")
+        servers = [FakeRegistryServer(latency=latency).start() for latency in (0.0, 0.05, 0.2)]
+        registries = {f"模拟源({int(s.latency * 1000)}ms)": s.url for s in servers}
+        project_dir = servers[0].write_fixture_project(Path(workdir.name) / "project")
+
+    try:
+        bench = InstallBenchmark(npm_manager.npm_command, project_dir, repeats, args.timeout)
+        project = default_project_name(project_dir if args.project else None)
+        names = {url: name for name, url in registries.items()}
+        results = []
+        for name, url in registries.items():
+            print(f"{name} ...", flush=True)
+            result = bench.run(url)
+            if not servers:
+                config_manager.record_install_benchmark(url, project, result)
+            results.append(result)
+    finally:
+        for server in servers:
+            server.stop()
+        if workdir is not None:
+            workdir.cleanup()
+
+    print()
+    for result in rank_results(results):
+        wall = f"{result['median_wall']}s" if result["median_wall"] is not None else "失败"
+        size = f"{round(result['median_bytes'] / 1024)}KB" if result["median_bytes"] is not None else "-"
+        print(f"{names[result['url']]:<14} {wall:<10} {size:<10} 失败 {result['failures']}/{repeats}")
+        errors = {run["error"] for run in result["runs"] if run["error"]}
+        for error in errors:
+            print(f"    {error}")
+    return 0
+
+
+def _parse_levels(text: Optional[str]) -> Optional[List[int]]:
+    """解析逗号分隔的并发级别"""
+    if not text:
+        return None
+    return [int(item) for item in text.split(",") if item.strip()]
+
+
+def cmd_load_profile(args, npm_manager: NPMRegistryManager, config_manager: ConfigManager) -> int:
+    """测试源在不同并发数下的吞吐量和响应时间，建议maxsockets"""
+    registries = get_all_registries(npm_manager, config_manager)
+    if args.registries:
+        registries = {name: registries.get(name, name) for name in args.registries}
+    try:
+        levels = _parse_levels(args.levels)
+    except ValueError:
+        print(f"无效的并发级别: {args.levels}", file=sys.stderr)
+        return 1
+
+    profiler = LoadProfiler.from_config(npm_manager, config_manager, levels=levels,
+                                        requests_per_level=args.requests, packages=args.packages)
+    names = {url: name for name, url in registries.items()}
+    profiles = []
+    for name, url in registries.items():
+        print(f"{name} ({url})", flush=True)
+        profile = profiler.run(url)
+        profiles.append(profile)
+        if profile["levels"]:
+            config_manager.record_load_profile(profile)
+        for level in profile["levels"]:
+            throughput = f"{round(level['throughput'] / 1024)}KB/s" if level["throughput"] else "-"
+            print(f"    并发 {level['concurrency']:<4} {throughput:<12} P50 {_format_ms(level['p50']):<11} "
+                  f"P90 {_format_ms(level['p90']):<11} P99 {_format_ms(level['p99']):<11} "
+                  f"失败 {level['errors']}/{level['requests']}")
+        if profile["error"]:
+            print(f"    {profile['error']}")
+        if profile["suggested_maxsockets"]:
+            print(f"    建议 maxsockets: {profile['suggested_maxsockets']}")
+
+    overall = suggest_overall(profiles)
+    if overall is None:
+        print("\n没有可用的测试结果")
+        return 1
+    print(f"\n吞吐量最高: {names[overall['url']]} ({round(overall['throughput'] / 1024)}KB/s)")
+    print(f"  npm config set registry {overall['url']}")
+    print(f"  npm config set maxsockets {overall['maxsockets']}")
+    return 0
+
+
+def cmd_range_probe(args, npm_manager: NPMRegistryManager, config_manager: ConfigManager) -> int:
+    """在字节预算内用Range分片估算源的吞吐量，适合按流量计费或很慢的网络"""
+    registries = get_all_registries(npm_manager, config_manager)
+    if args.registries:
+        registries = {name: registries.get(name, name) for name in args.registries}
+    budget = args.budget or config_manager.get("range_probe_budget", 256 * 1024)
+    slices = args.slices or config_manager.get("range_probe_slices", 4)
+    package = args.package or config_manager.get("range_probe_package", "typescript")
+
+    measured = 0
+    total_bytes = 0
+    for name, url in registries.items():
+        result = npm_manager.test_registry_range(url, package, budget, slices, config_manager.get("test_timeout", 5))
+        total_bytes += result["bytes"]
+        if not result["throughput"]:
+            print(f"{name:<10} {result['error'] or '无法估算吞吐量'}")
+            continue
+        measured += 1
+        line = (f"{name:<10} {round(result['throughput'] / 1024)}KB/s  请求耗时 {_format_ms(result['latency_ms'])}  "
+                f"新连接爬升 {_format_ms(result['ramp_up_ms'])}  {result['bytes'] // 1024}KB/{result['slices']}片")
+        if not result["range_supported"]:
+            line += "  (不支持Range，按单次传输估算)"
+        print(line)
+    print(f"\n共使用 {total_bytes // 1024}KB（每个源预算 {budget // 1024}KB）")
+    return 0 if measured else 1
+
+
+def cmd_install(args, npm_manager: NPMRegistryManager, config_manager: ConfigManager) -> int:
+    """运行 npm install，停滞时自动切换到次优源重试"""
+    npm_args = args.npm_args[1:] if args.npm_args[:1] == ["--"] else args.npm_args
+    guard = InstallGuard.from_config(npm_manager, config_manager, args.stall, args.attempts)
+    result = guard.run(["install"] + npm_args, get_all_registries(npm_manager, config_manager))
+
+    print()
+    for attempt in result["attempts"]:
+        outcome = {"success": "成功", "stalled": f"停滞超过{attempt['threshold']}秒", "network": "网络错误",
+                   "failed": "失败"}[attempt["outcome"]]
+        print(f"{npm_manager.get_registry_name(attempt['registry'])}: {outcome}（{attempt['elapsed']}秒）")
+    if len(result["attempts"]) > 1:
+        print(f"已切换到: {npm_manager.get_registry_name(result['registry'])} ({result['registry']})")
+    if result["time_saved"]:
+        print(f"相比等待npm自身超时约节省 {result['time_saved']} 秒")
+    return 0 if result["success"] else (result["attempts"][-1]["returncode"] or 1)
+
+
+def cmd_scope(args, npm_manager: NPMRegistryManager, config_manager: ConfigManager) -> int:
+    """管理作用域源（@scope:registry）及其候选列表"""
+    try:
+        scope = npm_manager.normalize_scope(args.scope) if getattr(args, "scope", None) else None
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return 1
+
+    if args.action == "list":
+        current = npm_manager.get_scoped_registries()
+        candidates = scope_candidates(npm_manager, config_manager)
+        if not candidates:
+            print("没有设置作用域源")
+        for name, urls in candidates.items():
+            print(f"{name}: {current.get(name) or '(未设置，使用默认源)'}")
+            for url in urls:
+                marker = "*" if url == current.get(name) else " "
+                print(f"  {marker} {url}")
+    elif args.action == "set":
+        if not args.url.startswith(('http://', 'https://')):
+            print(f"无效的源地址: {args.url}", file=sys.stderr)
+            return 1
+        old_registry = npm_manager.get_scope_registry(scope)
+        npm_manager.set_scope_registry(scope, args.url)
+        config_manager.record_scope_switch(scope, old_registry, args.url)
+        print(f"{scope} 已切换到: {args.url}")
+    elif args.action == "delete":
+        npm_manager.delete_scope_registry(scope)
+        print(f"已删除 {scope} 的源设置")
+    elif args.action == "candidates":
+        invalid = [url for url in args.urls if not url.startswith(('http://', 'https://'))]
+        if invalid:
+            print(f"无效的源地址: {', '.join(invalid)}", file=sys.stderr)
+            return 1
+        config_manager.set_scope_candidates(scope, args.urls)
+        print(f"{scope} 的候选源: {', '.join(args.urls) if args.urls else '(已清空)'}")
+    else:
+        results = select_scope_registries(npm_manager, config_manager, args.scopes, args.probe, args.switch,
+                                          args.max_age)
+        if not results:
+            print("没有设置作用域源或候选源", file=sys.stderr)
+            return 1
+        for result in results:
+            choice = result["choice"]
+            if choice is None:
+                print(f"{result['scope']}: 没有可用的候选源")
+                continue
+            status = "（已切换）" if result["switched"] else ""
+            print(f"{result['scope']}: {choice['url']} (评分{choice['score']}, {_format_ms(choice['speed'])}, "
+                  f"依据{CHOICE_SOURCES[choice['source']]}){status}")
+    return 0
+
+
+def cmd_projects(args, npm_manager: NPMRegistryManager, config_manager: ConfigManager) -> int:
+    """报告目录树中每个项目使用的源，或把选定的源批量写入各项目的.npmrc"""
+    root = Path(args.root).expanduser()
+    try:
+        scope = npm_manager.normalize_scope(args.scope) if args.scope else None
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return 1
+    projects = read_projects(find_projects(root, args.depth, args.workers), scope, args.workers)
+    if not projects:
+        print(f"{root} 下没有找到npm项目")
+        return 0
+
+    unreadable = [project for project in projects if project["error"]]
+    for project in unreadable:
+        print(f"读取{project['npmrc']}失败，跳过该项目: {project['error']}", file=sys.stderr)
+
+    if not args.set:
+        inherited = (npm_manager.get_scope_registry(scope) if scope else npm_manager.current_registry) or "默认源"
+        for project in projects:
+            registry = "(读取失败)" if project["error"] else project["registry"] or f"(继承) {inherited}"
+            print(f"{str(project['path'].relative_to(root)) or '.':<50} {registry}")
+        counts: Dict[str, int] = {}
+        for project in projects:
+            label = "(读取失败)" if project["error"] else project["registry"] or "(继承)"
+            counts[label] = counts.get(label, 0) + 1
+        print(f"\n共 {len(projects)} 个项目: " + ", ".join(f"{url} {count}个" for url, count in counts.items()))
+        return 1 if unreadable else 0
+
+    url = get_all_registries(npm_manager, config_manager).get(args.set, args.set)
+    if not url.startswith(('http://', 'https://')):
+        print(f"未知的源: {args.set}", file=sys.stderr)
+        return 1
+    plan = plan_registry_change(projects, url, scope)
+    if args.dry_run:
+        print(format_diff(plan, root), end="")
+        print(f"\n{len(plan)}/{len(projects)} 个项目需要修改（预演，未写入）")
+        return 1 if unreadable else 0
+
+    errors = apply_plan(plan, args.workers)
+    for error in errors:
+        print(f"写入{error['npmrc']}失败: {error['error']}", file=sys.stderr)
+    print(f"已修改 {len(plan) - len(errors)}/{len(projects)} 个项目的 .npmrc（{registry_key(scope)} = {url}）")
+    return 1 if errors or unreadable else 0
+
+
+def cmd_managers(args, npm_manager: NPMRegistryManager, config_manager: ConfigManager) -> int:
+    """显示yarn、pnpm、bun使用的源是否与npm一致，--sync时写入npm当前源"""
+    if args.sync:
+        for name, error in npm_manager.sync_package_manager_registries().items():
+            print(f"{name}: {'已同步' if error is None else '同步失败: ' + error}")
+
+    status = npm_manager.get_package_manager_status()
+    if not status:
+        print("没有检测到yarn、pnpm或bun")
+        return 0
+    print(f"{'npm':<14} {npm_manager.current_registry}")
+    for item in status:
+        if item["error"]:
+            print(f"{item['label']:<14} 读取{item['path']}失败: {item['error']}")
+            continue
+        source = "" if item["registry"] else "（未设置）"
+        mark = "" if item["in_sync"] else "  ← 与npm不一致"
+        print(f"{item['label']:<14} {item['effective']}{source}{mark}")
+    return 0 if all(item["in_sync"] for item in status) else 2
+
+
+def cmd_import(args, npm_manager: NPMRegistryManager, config_manager: ConfigManager) -> int:
+    """从源列表文件（纯文本、JSON或nrm的registries.json）批量导入自定义源"""
+    registries, invalid = read_registry_file(Path(args.file).expanduser())
+    for entry in invalid:
+        print(f"无效的源URL: {entry}", file=sys.stderr)
+    registries, duplicates = filter_existing(registries, get_all_registries(npm_manager, config_manager))
+    if duplicates:
+        print(f"跳过 {len(duplicates)} 个已存在的源")
+    if not registries:
+        print("没有需要导入的新源")
+        return 1 if invalid else 0
+
+    if args.no_validate:
+        accepted = registries
+    else:
+        def progress(done, total, registry, valid):
+            print(f"[{done}/{total}] {'✓' if valid else '✗'} {registry['name']} ({registry['url']})")
+
+        results = validate_registries(npm_manager, registries,
+                                      timeout=args.timeout or config_manager.get("import_timeout", 5),
+                                      workers=args.workers or config_manager.get("import_workers", 16),
+                                      progress=progress)
+        accepted = [result for result in results if result["valid"]]
+    added = config_manager.add_custom_registries(accepted)
+    print(f"已导入 {len(added)} 个源，{len(registries) - len(accepted)} 个不可访问，{len(invalid)} 个无效")
+    return 0 if added or not registries else 1
+
+
+def cmd_use(args, npm_manager: NPMRegistryManager, config_manager: ConfigManager) -> int:
+    """切换源（按名称或URL）"""
+    registries = get_all_registries(npm_manager, config_manager)
+    url = registries.get(args.registry, args.registry)
+    if not url.startswith(('http://', 'https://')):
+        print(f"未知的源: {args.registry}", file=sys.stderr)
+        return 1
+
+    old_registry = npm_manager.current_registry
+    npm_manager.set_registry(url)
+    config_manager.record_registry_switch(old_registry, url)
+    print(f"已切换到: {npm_manager.get_registry_name(url)} ({url})")
+    return 0
+
+
+def cmd_daemon(args, npm_manager: NPMRegistryManager, config_manager: ConfigManager) -> int:
+    """以常驻服务方式持续测速并提供JSON接口"""
+    interval = args.interval or config_manager.get("daemon_interval", 300)
+    timeout = config_manager.get("test_timeout", 5)
+    socket_path = args.socket or config_manager.get("daemon_socket") or None
+    port = args.port if args.port is not None else config_manager.get("daemon_port", 7873)
+
+    daemon = RegistryDaemon(npm_manager, config_manager, interval=interval, timeout=timeout)
+    daemon.start(port=port, socket_path=str(Path(socket_path).expanduser()) if socket_path else None)
+    print(f"测速服务已启动: {daemon.address}（每{interval}秒测速一次）")
+    try:
+        daemon.wait()
+    except KeyboardInterrupt:
+        print("\n测速服务已停止")
+    finally:
+        daemon.stop()
+    return 0
+
+
+def cmd_best(args, npm_manager: NPMRegistryManager, config_manager: ConfigManager) -> int:
+    """向常驻服务查询当前最快的源"""
+    socket_path = args.socket or config_manager.get("daemon_socket") or None
+    port = args.port if args.port is not None else config_manager.get("daemon_port", 7873)
+    try:
+        best = query_daemon("/best", port=port,
+                            socket_path=str(Path(socket_path).expanduser()) if socket_path else None)
+    except (OSError, ValueError) as e:
+        print(f"查询测速服务失败: {e}", file=sys.stderr)
+        return 1
+    offline = "，测速服务离线，依据已有记录" if best.get("offline") else ""
+    print(best["url"] if args.quiet else f"{best['name']}: {best['url']} ({_format_ms(best['avg_speed'])}{offline})")
+    return 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    """构建命令行参数解析器"""
+    parser = argparse.ArgumentParser(prog="npm-registry-manager", description="NPM源管理器命令行工具")
+    parser.add_argument("--metrics-file", help="执行完成后把性能指标以OpenMetrics格式写入该文件")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    subparsers.add_parser("list", help="列出所有源").set_defaults(func=cmd_list)
+    subparsers.add_parser("current", help="显示当前源").set_defaults(func=cmd_current)
+
+    test_parser = subparsers.add_parser("test", help="测试所有源的速度")
+    test_parser.add_argument("--timeout", type=int, help="超时时间（秒）")
+    test_parser.add_argument("--no-families", dest="families", action="store_false",
+                             help="不进行IPv4/IPv6对比测试")
+    test_parser.add_argument("--trace", help="把探测结果追加记录到轨迹文件")
+    test_parser.add_argument("--no-quality", dest="quality", action="store_false",
+                             help="不测量下载吞吐量和同步延迟")
+    test_parser.add_argument("--strategy", choices=STRATEGIES, help="探测策略（默认使用配置中的probe_strategy）")
+    test_parser.add_argument("--probes", type=int, help="每轮最多测试的源数量（thompson/ucb策略）")
+    test_parser.set_defaults(func=cmd_test)
+
+    replay_parser = subparsers.add_parser("replay", help="回放探测轨迹")
+    replay_parser.add_argument("trace", help="轨迹文件")
+    replay_parser.add_argument("--timeout-ms", type=float, help="按新的超时时间（毫秒）重新判定探测结果")
+    replay_parser.add_argument("--concurrency", type=int, default=1, help="模拟的测速并发数")
+    replay_parser.add_argument("--live", action="store_true", help="通过本地回放服务器重新探测")
+    replay_parser.add_argument("--time-scale", type=float, default=1.0, help="本地回放时的时间缩放比例")
+    replay_parser.add_argument("--probe-timeout", type=int, default=5, help="本地回放时的探测超时（秒）")
+    replay_parser.add_argument("--strategy", choices=STRATEGIES, help="评估探测策略的探测次数和遗憾值")
+    replay_parser.add_argument("--probes", type=int, default=3, help="评估探测策略时每轮测试的源数量")
+    replay_parser.set_defaults(func=cmd_replay)
+
+    daemon_parser = subparsers.add_parser("daemon", help="以常驻服务方式持续测速")
+    daemon_parser.add_argument("--port", type=int, help="监听的本地端口（默认7873，0表示随机端口）")
+    daemon_parser.add_argument("--socket", help="监听的Unix套接字路径（指定后不监听端口）")
+    daemon_parser.add_argument("--interval", type=int, help="测速间隔（秒）")
+    daemon_parser.set_defaults(func=cmd_daemon)
+
+    best_parser = subparsers.add_parser("best", help="向常驻服务查询最快的源")
+    best_parser.add_argument("--port", type=int, help="测速服务端口")
+    best_parser.add_argument("--socket", help="测速服务的Unix套接字路径")
+    best_parser.add_argument("-q", "--quiet", action="store_true", help="只输出源地址")
+    best_parser.set_defaults(func=cmd_best)
+
+    rank_parser = subparsers.add_parser("rank", help="按综合评分列出源的排名")
+    rank_parser.add_argument("-v", "--verbose", action="store_true", help="显示各评分项明细")
+    rank_parser.add_argument("--switch", action="store_true", help="切换到评分最高的源")
+    rank_parser.set_defaults(func=cmd_rank)
+
+    bench_parser = subparsers.add_parser("install-bench", help="对每个源执行 npm ci 安装基准")
+    bench_parser.add_argument("registries", nargs="*", help="要测试的源名称或URL（默认全部）")
+    bench_parser.add_argument("--project", help="项目目录（需要package-lock.json），不指定时使用内置测试项目和本地模拟源")
+    bench_parser.add_argument("--repeat", type=int, help="每个源重复的次数（默认使用配置中的install_bench_repeats）")
+    bench_parser.add_argument("--timeout", type=int, default=600, help="单次 npm ci 的超时时间（秒）")
+    bench_parser.set_defaults(func=cmd_install_bench)
+
+    load_parser = subparsers.add_parser("load-profile", help="测试源在不同并发数下的吞吐量，建议maxsockets")
+    load_parser.add_argument("registries", nargs="*", help="要测试的源名称或URL（默认全部）")
+    load_parser.add_argument("--levels", help="逗号分隔的并发级别（默认使用配置中的load_profile_levels）")
+    load_parser.add_argument("--requests", type=int, help="每个并发级别下载的tarball数（默认使用配置中的load_profile_requests）")
+    load_parser.add_argument("--packages", nargs="+", help="下载哪些包的最新版本（默认使用配置中的load_profile_packages）")
+    load_parser.set_defaults(func=cmd_load_profile)
+
+    range_parser = subparsers.add_parser("range-probe", help="用Range分片在字节预算内估算源的吞吐量（省流量）")
+    range_parser.add_argument("registries", nargs="*", help="要测试的源名称或URL（默认全部）")
+    range_parser.add_argument("--budget", type=int, help="每个源的字节预算（默认使用配置中的range_probe_budget）")
+    range_parser.add_argument("--slices", type=int, help="分片数（默认使用配置中的range_probe_slices）")
+    range_parser.add_argument("--package", help="从哪个包的tarball取分片（默认使用配置中的range_probe_package）")
+    range_parser.set_defaults(func=cmd_range_probe)
+
+    fastest_parser = subparsers.add_parser("fastest", help="选出最快的源（优先使用已有结果，不测速）")
+    fastest_parser.add_argument("--max-age", type=int, help="最近测速结果的有效期（秒，默认使用配置中的fresh_result_age）")
+    fastest_parser.add_argument("--probe", action="store_true", help="忽略已有结果，实际测速")
+    fastest_parser.add_argument("--switch", action="store_true", help="切换到选出的源")
+    fastest_parser.add_argument("-q", "--quiet", action="store_true", help="只输出源地址")
+    fastest_parser.set_defaults(func=cmd_fastest)
+
+    install_parser = subparsers.add_parser("install", help="运行 npm install，源停滞时自动切换并重试")
+    install_parser.add_argument("--stall", type=float, help="停滞阈值（秒，默认根据历史响应时间推算）")
+    install_parser.add_argument("--attempts", type=int, help="最多尝试的源数（默认使用配置中的install_max_attempts）")
+    install_parser.add_argument("npm_args", nargs=argparse.REMAINDER, help="传给 npm install 的参数")
+    install_parser.set_defaults(func=cmd_install)
+
+    scope_parser = subparsers.add_parser("scope", help="管理作用域源（@scope:registry）")
+    scope_actions = scope_parser.add_subparsers(dest="action", required=True)
+    scope_actions.add_parser("list", help="列出作用域源和候选源")
+    scope_set = scope_actions.add_parser("set", help="设置作用域的源")
+    scope_set.add_argument("scope", help="作用域，如 @ourco")
+    scope_set.add_argument("url", help="源地址")
+    scope_delete = scope_actions.add_parser("delete", help="删除作用域的源设置")
+    scope_delete.add_argument("scope", help="作用域")
+    scope_candidates_parser = scope_actions.add_parser("candidates", help="设置作用域的候选源列表（不带地址时清空）")
+    scope_candidates_parser.add_argument("scope", help="作用域")
+    scope_candidates_parser.add_argument("urls", nargs="*", help="候选源地址")
+    scope_fastest = scope_actions.add_parser("fastest", help="为每个作用域选出最快的候选源")
+    scope_fastest.add_argument("scopes", nargs="*", help="只处理这些作用域（默认全部）")
+    scope_fastest.add_argument("--max-age", type=int, help="最近测速结果的有效期（秒）")
+    scope_fastest.add_argument("--probe", action="store_true", help="忽略已有结果，实际测速")
+    scope_fastest.add_argument("--switch", action="store_true", help="把选出的源写入 @scope:registry")
+    scope_parser.set_defaults(func=cmd_scope)
+
+    projects_parser = subparsers.add_parser("projects", help="报告或批量设置目录树中各项目的源")
+    projects_parser.add_argument("root", help="要扫描的根目录")
+    projects_parser.add_argument("--set", metavar="REGISTRY", help="把该源（名称或URL）写入每个项目的.npmrc")
+    projects_parser.add_argument("--scope", help="只处理该作用域的源（@scope:registry）")
+    projects_parser.add_argument("--dry-run", action="store_true", help="只显示差异，不写入")
+    projects_parser.add_argument("--depth", type=int, help="最大扫描深度")
+    projects_parser.add_argument("--workers", type=int, default=16, help="并行I/O线程数")
+    projects_parser.set_defaults(func=cmd_projects)
+
+    managers_parser = subparsers.add_parser("managers", help="检查yarn、pnpm、bun的源是否与npm一致")
+    managers_parser.add_argument("--sync", action="store_true", help="把npm当前源写入不一致的包管理器配置")
+    managers_parser.set_defaults(func=cmd_managers)
+
+    import_parser = subparsers.add_parser("import", help="从文件批量导入自定义源（纯文本、JSON或nrm的registries.json）")
+    import_parser.add_argument("file", help="源列表文件")
+    import_parser.add_argument("--no-validate", action="store_true", help="不验证可访问性，直接导入")
+    import_parser.add_argument("--workers", type=int, help="并发验证数")
+    import_parser.add_argument("--timeout", type=float, help="单个源的验证超时（秒）")
+    import_parser.set_defaults(func=cmd_import)
+
+    use_parser = subparsers.add_parser("use", help="切换源")
+    use_parser.add_argument("registry", help="源名称或URL")
+    use_parser.set_defaults(func=cmd_use)
+
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """命令行入口"""
+    args = build_parser().parse_args(argv)
+    try:
+        config_manager = ConfigManager()
+        metrics_file = args.metrics_file or config_manager.get("metrics_file")
+        METRICS.configure(config_manager.get("metrics_enabled", False) or bool(args.metrics_file))
+        npm_manager = NPMRegistryManager(cache_ttl=config_manager.get("cache_ttl", 300),
+                                         rate_limiter=RateLimiter.from_config(config_manager),
+                                         sync_package_managers=config_manager.get("sync_package_managers", True))
+        try:
+            return args.func(args, npm_manager, config_manager)
+        finally:
+            if METRICS.enabled and metrics_file:
+                METRICS.write(Path(metrics_file).expanduser())
+    except Exception as e:
+        print(f"错误: {e}", file=sys.stderr)
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
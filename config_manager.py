@@ -5,25 +5,60 @@
 
 import json
 import os
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional
 from pathlib import Path
 
 
 class ConfigManager:
     """配置管理器"""
     
-    def __init__(self):
-        self.config_dir = Path.home() / ".npm-registry-manager"
+    def __init__(self, config_dir: Optional[Path] = None):
+        self.config_dir = Path(config_dir) if config_dir else Path.home() / ".npm-registry-manager"
         self.config_file = self.config_dir / "config.json"
         self.history_file = self.config_dir / "history.json"
         
         # 确保配置目录存在
-        self.config_dir.mkdir(exist_ok=True)
+        self.config_dir.mkdir(parents=True, exist_ok=True)
         
         # 默认配置
         self.default_config = {
             "auto_test_speed": True,
             "test_timeout": 5,
+            "offline_check_timeout": 0.2,
+            "cache_ttl": 300,
+            "probe_each_address": False,
+            "compare_ip_families": True,
+            "probe_trace_file": "",
+            "metrics_enabled": False,
+            "metrics_file": "",
+            "metrics_port": 0,
+            "measure_quality": True,
+            "quality_package": "lodash",
+            "throughput_probe": "full",
+            "range_probe_budget": 256 * 1024,
+            "range_probe_slices": 4,
+            "range_probe_package": "typescript",
+            "score_weights": {},
+            "install_bench_repeats": 3,
+            "fresh_result_age": 600,
+            "scope_registries": {},
+            "sync_package_managers": True,
+            "config_watch_debounce": 300,
+            "import_workers": 16,
+            "import_timeout": 5,
+            "install_stall_timeout": 0,
+            "install_max_attempts": 3,
+            "load_profile_packages": ["lodash", "react", "vue", "express", "chalk", "debug", "ms", "semver"],
+            "load_profile_levels": [1, 4, 8, 16, 32],
+            "load_profile_requests": 32,
+            "probe_strategy": "all",
+            "probes_per_round": 3,
+            "probe_rate_per_host": 1.0,
+            "probe_burst_per_host": 6,
+            "probe_budget_per_minute": 120,
+            "daemon_interval": 300,
+            "daemon_port": 7873,
+            "daemon_socket": "",
             "remember_last_registry": True,
             "show_speed_in_list": True,
             "window_geometry": {
@@ -117,6 +152,33 @@ class ConfigManager:
         self.save_config()
         return True
     
+    def get_range_budget(self) -> int:
+        """测速时吞吐量探测的字节预算：throughput_probe为"range"时使用Range分片，否则为0（下载tarball）"""
+        if self.config.get("throughput_probe") != "range":
+            return 0
+        return int(self.config.get("range_probe_budget") or 0)
+    
+    def add_custom_registries(self, registries: List[Dict]) -> List[Dict]:
+        """批量添加自定义源（只写入一次配置文件），跳过名称或URL已存在的源，返回实际添加的源"""
+        custom_registries = self.config.get("custom_registries", [])
+        names = {registry["name"] for registry in custom_registries}
+        urls = {registry["url"] for registry in custom_registries}
+        
+        added = []
+        for registry in registries:
+            if registry["name"] in names or registry["url"] in urls:
+                continue
+            entry = {"name": registry["name"], "url": registry["url"]}
+            custom_registries.append(entry)
+            names.add(entry["name"])
+            urls.add(entry["url"])
+            added.append(entry)
+        
+        if added:
+            self.config["custom_registries"] = custom_registries
+            self.save_config()
+        return added
+    
     def remove_custom_registry(self, name: str) -> bool:
         """移除自定义源"""
         custom_registries = self.config.get("custom_registries", [])
@@ -136,6 +198,19 @@ class ConfigManager:
         """获取自定义源列表"""
         return self.config.get("custom_registries", [])
     
+    def get_scope_candidates(self) -> Dict[str, List[str]]:
+        """获取各作用域的候选源列表 {作用域: [URL, ...]}"""
+        return self.config.get("scope_registries", {})
+    
+    def set_scope_candidates(self, scope: str, urls: List[str]) -> None:
+        """设置作用域的候选源列表，列表为空时删除该作用域"""
+        scopes = dict(self.config.get("scope_registries", {}))
+        if urls:
+            scopes[scope] = list(dict.fromkeys(urls))
+        else:
+            scopes.pop(scope, None)
+        self.set("scope_registries", scopes)
+    
     def record_registry_switch(self, from_registry: str, to_registry: str) -> None:
         """记录源切换历史"""
         import datetime
@@ -155,18 +230,43 @@ class ConfigManager:
         self.history["last_used_registry"] = to_registry
         self.save_history()
     
-    def record_speed_test(self, registry_url: str, speed: float, success: bool) -> None:
-        """记录速度测试结果"""
+    def record_scope_switch(self, scope: str, from_registry: Optional[str], to_registry: str) -> None:
+        """记录作用域源（@scope:registry）的切换历史，与默认源的切换历史分开保存"""
         import datetime
         
+        switches = self.history.setdefault("scope_switches", [])
+        switches.append({
+            "timestamp": datetime.datetime.now().isoformat(),
+            "scope": scope,
+            "from": from_registry or "",
+            "to": to_registry
+        })
+        
+        # 只保留最近100条记录
+        if len(switches) > 100:
+            self.history["scope_switches"] = switches[-100:]
+        
+        self.save_history()
+    
+    def record_speed_test(self, registry_url: str, speed: float, success: bool,
+                          phases: Optional[Dict] = None) -> None:
+        """记录速度测试结果（可附带分阶段耗时），因限速推迟的探测不记录"""
+        import datetime
+        
+        if phases and phases.get("deferred"):
+            return
+        
         if registry_url not in self.history["speed_tests"]:
             self.history["speed_tests"][registry_url] = []
         
+        now = datetime.datetime.now()
         test_record = {
-            "timestamp": datetime.datetime.now().isoformat(),
+            "timestamp": now.isoformat(),
             "speed": speed,
             "success": success
         }
+        if phases:
+            test_record["phases"] = phases
         
         self.history["speed_tests"][registry_url].append(test_record)
         
@@ -174,6 +274,129 @@ class ConfigManager:
         if len(self.history["speed_tests"][registry_url]) > 10:
             self.history["speed_tests"][registry_url] = self.history["speed_tests"][registry_url][-10:]
         
+        self._update_hourly_profile(registry_url, speed, success, now)
+        self.save_history()
+    
+    @staticmethod
+    def get_week_slot(when=None) -> int:
+        """一周中的小时时段编号（周一0点为0，共168个）"""
+        import datetime
+        
+        when = when or datetime.datetime.now()
+        return when.weekday() * 24 + when.hour
+    
+    def _update_hourly_profile(self, registry_url: str, speed: float, success: bool, when) -> None:
+        """把一次测速结果累加到所在时段的统计中（不随最近10次的截断而丢失）"""
+        profile = self.history.setdefault("hourly_profile", {}).setdefault(registry_url, {})
+        slot = profile.setdefault(str(self.get_week_slot(when)), {"count": 0, "total": 0.0, "failures": 0})
+        if success:
+            slot["count"] += 1
+            slot["total"] = round(slot["total"] + speed, 2)
+        else:
+            slot["failures"] += 1
+    
+    def get_hourly_profile(self, registry_url: str) -> List[Optional[Dict]]:
+        """获取源按周内小时时段的统计，长度168，无数据的时段为None"""
+        profile = self.history.get("hourly_profile", {}).get(registry_url, {})
+        return [profile.get(str(slot)) for slot in range(168)]
+    
+    def _profile_speed(self, registry_url: str, slots: List[int], min_samples: int) -> Optional[float]:
+        """若干时段合计的平均响应时间，样本不足或失败过半时返回None"""
+        profile = self.history.get("hourly_profile", {}).get(registry_url, {})
+        count = total = failures = 0
+        for slot in slots:
+            stats = profile.get(str(slot))
+            if stats:
+                count += stats["count"]
+                total += stats["total"]
+                failures += stats["failures"]
+        if count < min_samples or failures > count:
+            return None
+        return total / count
+    
+    def get_fastest_registry(self, registry_urls: List[str], max_age: Optional[int] = None,
+                             when=None, min_samples: int = 2) -> Optional[Dict]:
+        """不测速直接选出综合评分最高的源
+        
+        优先对最后一次测速在max_age秒内成功的源按测速历史评分；没有时以当前周内时段的
+        平均响应时间作为评分输入，该时段样本不足时退回到每天同一小时的统计。都没有时返回None。
+        返回 {"url", "speed", "score", "source"}，source为"fresh"或"profile"。
+        """
+        import datetime
+        from scoring import ScoringEngine, best_registry
+        
+        when = when or datetime.datetime.now()
+        if max_age is None:
+            max_age = self.get("fresh_result_age", 600)
+        engine = ScoringEngine.from_config(self)
+        
+        fresh = {}
+        for url in registry_urls:
+            tests = self.history["speed_tests"].get(url)
+            if not tests or not tests[-1]["success"]:
+                continue
+            age = (when - datetime.datetime.fromisoformat(tests[-1]["timestamp"])).total_seconds()
+            if 0 <= age <= max_age:
+                fresh[url] = tests
+        if fresh:
+            best = best_registry(engine.rank({url: url for url in fresh}, fresh))
+            if best is not None:
+                return {"url": best["url"], "speed": fresh[best["url"]][-1]["speed"],
+                        "score": best["score"], "source": "fresh"}
+        
+        slot = self.get_week_slot(when)
+        for slots in ([slot], [day * 24 + slot % 24 for day in range(7)]):
+            speeds = {}
+            for url in registry_urls:
+                speed = self._profile_speed(url, slots, min_samples)
+                if speed is not None:
+                    speeds[url] = speed
+            if speeds:
+                # 时段统计只有平均响应时间，作为该源的一条成功测速参与评分
+                profile_tests = {url: [{"speed": speed, "success": True}] for url, speed in speeds.items()}
+                best = best_registry(engine.rank({url: url for url in speeds}, profile_tests))
+                if best is None:
+                    continue
+                return {"url": best["url"], "speed": round(speeds[best["url"]], 2),
+                        "score": best["score"], "source": "profile"}
+        return None
+    
+    def record_install_benchmark(self, registry_url: str, project: str, result: Dict) -> None:
+        """记录 npm ci 安装基准的结果（每次运行的耗时、下载字节数和是否成功）"""
+        import datetime
+        
+        records = self.history.setdefault("install_benchmarks", {}).setdefault(registry_url, [])
+        timestamp = datetime.datetime.now().isoformat()
+        for run in result["runs"]:
+            records.append({
+                "timestamp": timestamp,
+                "project": project,
+                "wall": run["wall"],
+                "bytes": run["bytes"],
+                "success": run["success"]
+            })
+        
+        # 只保留最近10次运行结果
+        if len(records) > 10:
+            self.history["install_benchmarks"][registry_url] = records[-10:]
+        
+        self.save_history()
+    
+    def record_load_profile(self, profile: Dict) -> None:
+        """记录源的并发负载曲线（每个并发级别的吞吐量和响应时间分位数）"""
+        import datetime
+        
+        records = self.history.setdefault("load_profiles", {}).setdefault(profile["url"], [])
+        records.append({
+            "timestamp": datetime.datetime.now().isoformat(),
+            "levels": profile["levels"],
+            "suggested_maxsockets": profile["suggested_maxsockets"]
+        })
+        
+        # 只保留最近5次负载曲线
+        if len(records) > 5:
+            self.history["load_profiles"][profile["url"]] = records[-5:]
+        
         self.save_history()
     
     def get_average_speed(self, registry_url: str) -> float:
@@ -189,6 +412,89 @@ class ConfigManager:
         
         return sum(successful_tests) / len(successful_tests)
     
+    def record_family_test(self, registry_url: str, families: Dict) -> None:
+        """记录IPv4/IPv6对比测试结果，因限速推迟的测试不记录"""
+        import datetime
+        
+        if families.get("deferred"):
+            return
+        
+        family_tests = self.history.setdefault("family_tests", {})
+        records = family_tests.setdefault(registry_url, [])
+        records.append({
+            "timestamp": datetime.datetime.now().isoformat(),
+            "ipv4": families.get("ipv4"),
+            "ipv6": families.get("ipv6"),
+            "ipv4_available": families.get("ipv4_available", False),
+            "ipv6_available": families.get("ipv6_available", False)
+        })
+        
+        # 只保留最近10次测试结果
+        if len(records) > 10:
+            family_tests[registry_url] = records[-10:]
+        
+        self.save_history()
+    
+    def get_family_recommendation(self, registry_url: str, min_samples: int = 3) -> Optional[Dict]:
+        """判断某个地址族是否持续较慢，返回建议；数据不足或差异不明显时返回None
+        
+        只统计两个地址族都有地址的测试；某一族失败视为比另一族慢。
+        """
+        records = [
+            r for r in self.history.get("family_tests", {}).get(registry_url, [])
+            if r.get("ipv4_available") and r.get("ipv6_available")
+        ]
+        if len(records) < min_samples:
+            return None
+        
+        slower_counts = {"ipv4": 0, "ipv6": 0}
+        ratios = []
+        for record in records:
+            v4, v6 = record.get("ipv4"), record.get("ipv6")
+            if v4 is None and v6 is None:
+                continue
+            if v6 is None or (v4 is not None and v6 > v4 * 1.2):
+                slower_counts["ipv6"] += 1
+            elif v4 is None or v4 > v6 * 1.2:
+                slower_counts["ipv4"] += 1
+            if v4 and v6:
+                ratios.append(v6 / v4)
+        
+        for slower, faster in (("ipv6", "ipv4"), ("ipv4", "ipv6")):
+            # 至少80%的测试中该地址族明显更慢才视为"持续较慢"
+            if slower_counts[slower] >= max(min_samples, 0.8 * len(records)):
+                failures = sum(1 for r in records if r.get(slower) is None)
+                if ratios:
+                    ratios.sort()
+                    median = ratios[len(ratios) // 2]
+                    factor = median if slower == "ipv6" else 1 / median
+                else:
+                    factor = None
+                
+                if slower == "ipv6":
+                    advice = "建议设置 NODE_OPTIONS=--dns-result-order=ipv4first 让npm优先使用IPv4"
+                else:
+                    advice = "IPv6路径更快，可检查IPv4出口或代理配置"
+                
+                labels = {"ipv4": "IPv4", "ipv6": "IPv6"}
+                detail = f"{failures}/{len(records)} 次连接失败" if failures else f"约慢 {round(factor, 1)} 倍"
+                return {
+                    "slower": slower,
+                    "faster": faster,
+                    "samples": len(records),
+                    "failures": failures,
+                    "factor": round(factor, 2) if factor else None,
+                    "message": f"{labels[slower]}持续比{labels[faster]}慢（{detail}），{advice}"
+                }
+        return None
+    
+    def get_last_phases(self, registry_url: str) -> Optional[Dict]:
+        """获取源最近一次测试的分阶段耗时"""
+        for test in reversed(self.history["speed_tests"].get(registry_url, [])):
+            if test.get("phases"):
+                return test["phases"]
+        return None
+    
     def get_window_geometry(self) -> Dict[str, int]:
         """获取窗口几何信息"""
         return self.config.get("window_geometry", self.default_config["window_geometry"])
@@ -0,0 +1,119 @@
+"""
+网络可达性检查模块
+测速前快速判断是否离线：检查是否有可用的路由，并对源（或代理）发起一次短超时的连接，
+离线时跳过全部探测，避免每个源都等待完整的超时时间
+"""
+
+import queue
+import socket
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+
+# 可达性检查的默认时限（秒）
+DEFAULT_TIMEOUT = 0.2
+
+# 最多同时尝试连接的目标数
+MAX_TARGETS = 8
+
+# 判断是否有默认路由时使用的公网地址（UDP的connect只查路由表，不发送数据包）
+_ROUTE_PROBES = ((socket.AF_INET, ("8.8.8.8", 53)), (socket.AF_INET6, ("2001:4860:4860::8888", 53)))
+
+
+def has_default_route() -> bool:
+    """本机是否有通往公网的路由（IPv4或IPv6任一即可）"""
+    for family, address in _ROUTE_PROBES:
+        try:
+            with socket.socket(family, socket.SOCK_DGRAM) as sock:
+                sock.connect(address)
+                return True
+        except OSError:
+            continue
+    return False
+
+
+def _attempt(host: str, port: int, timeout: float, events: queue.Queue) -> None:
+    """解析主机并对第一个地址发起一次TCP连接，把各阶段结果放入events"""
+    target = f"{host}:{port}"
+    try:
+        infos = socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)
+    except (socket.gaierror, UnicodeError) as e:
+        events.put(("failed", target, f"无法解析主机 {host}: {e}"))
+        return
+    events.put(("resolved", target, None))
+
+    family, socktype, proto, _, address = infos[0]
+    try:
+        with socket.socket(family, socktype, proto) as sock:
+            sock.settimeout(timeout)
+            sock.connect(address)
+        events.put(("connected", target, None))
+    except ConnectionRefusedError:
+        # 对方主机回应了拒绝，说明网络本身是通的
+        events.put(("connected", target, None))
+    except socket.timeout:
+        events.put(("timeout", target, None))
+    except OSError as e:
+        events.put(("failed", target, f"无法连接 {target}: {e.strerror or e}"))
+
+
+def check_connectivity(targets: List[Tuple[str, int]], timeout: float = DEFAULT_TIMEOUT) -> Dict:
+    """在timeout秒内判断网络是否可用
+
+    并行对前几个目标解析并连接一次，任一连接成功（或被对方拒绝）即为在线；
+    只有明确的信号才判为离线：没有默认路由且没有任何目标连通，或全部目标都明确失败（无法解析、网络不可达）。
+    时限内解析或连接仍未完成时无法判断（如内网DNS较慢），按在线处理，继续测速。
+    返回 {"online", "state", "reason", "target", "duration_ms"}，state为"online"、"offline"或"unknown"。
+    """
+    start = time.perf_counter()
+    targets = list(dict.fromkeys(targets))[:MAX_TARGETS]
+    result = {"online": True, "state": "unknown", "reason": None, "target": None}
+
+    if not targets:
+        result["reason"] = "没有需要检查的目标"
+    else:
+        events: queue.Queue = queue.Queue()
+        for host, port in targets:
+            threading.Thread(target=_attempt, args=(host, port, timeout, events), daemon=True).start()
+
+        deadline = start + timeout
+        resolved = set()
+        errors = []
+        pending = len(targets)
+        while pending:
+            try:
+                state, target, error = events.get(timeout=max(deadline - time.perf_counter(), 0))
+            except queue.Empty:
+                break
+            if state == "resolved":
+                resolved.add(target)
+                continue
+            pending -= 1
+            if state == "connected":
+                result.update(state="online", reason=None, target=target)
+                break
+            if error:
+                errors.append(error)
+
+        if result["state"] != "online":
+            if pending == 0 and len(errors) == len(targets):
+                result.update(state="offline", reason=errors[0])
+            elif not has_default_route() and not resolved:
+                result.update(state="offline", reason="没有可用的网络路由")
+            elif not resolved:
+                result["reason"] = f"{round(timeout * 1000)}ms内未能解析源的域名"
+            else:
+                result["reason"] = f"{round(timeout * 1000)}ms内未能完成连接"
+            if result["state"] == "offline" and not has_default_route():
+                result["reason"] = "没有可用的网络路由"
+
+    result["online"] = result["state"] != "offline"
+    result["duration_ms"] = round((time.perf_counter() - start) * 1000, 1)
+    return result
+
+
+def format_offline(result: Optional[Dict]) -> str:
+    """离线提示文本"""
+    reason = (result or {}).get("reason")
+    return f"网络不可用（{reason}）" if reason else "网络不可用"
@@ -0,0 +1,241 @@
+"""
+常驻测速服务模块
+按计划持续测速，并通过本地端口或Unix套接字提供JSON接口，
+构建机上的任务直接查询最快的源，无需各自测速
+
+接口:
+    GET /best     当前最快的源
+    GET /scores   全部源的排名
+    GET /history  最近的测速记录
+"""
+
+import http.client
+import json
+import os
+import socket
+import socketserver
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+
+from npm_manager import NPMRegistryManager
+from config_manager import ConfigManager
+from metrics import METRICS
+from mirror_selection import MirrorSelector
+from scoring import ScoringEngine, best_registry
+
+
+class _DaemonHandler(BaseHTTPRequestHandler):
+    """接口请求处理器，只返回预先序列化好的快照"""
+
+    def do_GET(self):
+        daemon = self.server.daemon
+        path = self.path.split("?")[0].rstrip("/") or "/"
+        if path == "/metrics" and METRICS.enabled:
+            body = METRICS.render().encode("utf-8")
+            self._respond(200, body, "application/openmetrics-text; version=1.0.0; charset=utf-8")
+            return
+
+        body = daemon.get_snapshot(path)
+        if body is None:
+            self._respond(404, b'{"error":"not found"}')
+        elif body is daemon.EMPTY:
+            self._respond(503, b'{"error":"no probe results yet"}')
+        else:
+            self._respond(200, body)
+
+    def _respond(self, status: int, body: bytes, content_type: str = "application/json; charset=utf-8"):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def address_string(self):
+        # Unix套接字没有客户端地址
+        return self.client_address[0] if self.client_address else "unix"
+
+    def log_message(self, format, *args):
+        pass
+
+
+class _UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """监听Unix套接字的HTTP服务器"""
+
+    daemon_threads = True
+
+    def get_request(self):
+        request, _ = super().get_request()
+        return request, ("unix", 0)
+
+
+class RegistryDaemon:
+    """常驻测速服务"""
+
+    # 尚无测速结果时的占位快照
+    EMPTY = b""
+
+    def __init__(self, npm_manager: NPMRegistryManager, config_manager: ConfigManager,
+                 interval: int = 300, timeout: int = 5):
+        self.npm_manager = npm_manager
+        self.config_manager = config_manager
+        self.interval = interval
+        self.timeout = timeout
+        self._snapshot = {"/best": self.EMPTY, "/scores": self.EMPTY, "/history": self.EMPTY}
+        self._stop = threading.Event()
+        self._server = None
+        self.rounds = 0
+        self.connectivity: Optional[Dict] = None
+
+    def get_registries(self) -> Dict[str, str]:
+        """获取预置源和自定义源"""
+        registries = self.npm_manager.CHINA_REGISTRIES.copy()
+        for custom in self.config_manager.get_custom_registries():
+            registries[custom["name"]] = custom["url"]
+        return registries
+
+    def get_snapshot(self, path: str) -> Optional[bytes]:
+        """获取接口路径对应的JSON快照"""
+        return self._snapshot.get(path)
+
+    def probe_round(self) -> None:
+        """测试全部源一轮并更新快照"""
+        urls = list(self.get_registries().values())
+        selected = MirrorSelector.from_config(self.config_manager).select(urls)
+        # 离线时不测速（避免每个源都等待超时并记为失败），继续提供已有的排名
+        self.connectivity = self.npm_manager.check_connectivity(
+            selected, self.config_manager.get("offline_check_timeout", 0.2))
+        if not self.connectivity["online"]:
+            self.rebuild_snapshot()
+            return
+        self.npm_manager.begin_probe_run()
+        for url in selected:
+            if self._stop.is_set():
+                return
+            phases = self.npm_manager.test_registry_phases(url, self.timeout)
+            success = phases["success"]
+            if success and self.config_manager.get("measure_quality", True):
+                quality = self.npm_manager.test_registry_quality(
+                    url, self.config_manager.get("quality_package", "lodash"),
+                    range_budget=self.config_manager.get_range_budget())
+                phases["throughput"] = quality["throughput"]
+                phases["sync_lag"] = quality["sync_lag"]
+            self.config_manager.record_speed_test(url, phases["total"] if success else 0.0, success, phases)
+        self.rounds += 1
+        self.rebuild_snapshot()
+
+    def ranking(self) -> List[Dict]:
+        """按综合评分排序的源列表（无测试记录的源排在最后）"""
+        speed_tests = self.config_manager.history["speed_tests"]
+        scores = ScoringEngine.from_config(self.config_manager).rank(self.get_registries(), speed_tests)
+        for item in scores:
+            tests = speed_tests.get(item["url"], [])
+            avg_speed = self.config_manager.get_average_speed(item["url"])
+            item.update({
+                "avg_speed": round(avg_speed, 2) if avg_speed > 0 else None,
+                "last_speed": tests[-1]["speed"] if tests and tests[-1]["success"] else None,
+                "samples": len(tests)
+            })
+        return scores
+
+    def rebuild_snapshot(self) -> None:
+        """重新生成全部接口的JSON快照（请求时无需任何计算）"""
+        updated_at = time.time()
+        scores = self.ranking()
+        best = best_registry(scores)
+        history = {url: tests for url, tests in self.config_manager.history["speed_tests"].items()
+                   if url in {item["url"] for item in scores}}
+
+        offline = self.connectivity is not None and not self.connectivity["online"]
+
+        def encode(data):
+            return json.dumps(data, ensure_ascii=False).encode("utf-8")
+
+        self._snapshot = {
+            "/best": encode(dict(best, updated_at=updated_at, offline=offline)) if best else self.EMPTY,
+            "/scores": encode({"updated_at": updated_at, "rounds": self.rounds, "scores": scores,
+                               "offline": offline, "connectivity": self.connectivity,
+                               "rate_limit": self.npm_manager.get_rate_limit_stats()}),
+            "/history": encode({"updated_at": updated_at, "speed_tests": history})
+        }
+
+    def _schedule_loop(self) -> None:
+        """按间隔持续测速"""
+        while not self._stop.is_set():
+            try:
+                self.probe_round()
+            except Exception as e:
+                print(f"测速失败: {e}")
+            # 间隔加上随机抖动，避免多台机器的测速同时开始
+            self._stop.wait(self.npm_manager.rate_limiter.next_jitter(self.interval))
+
+    def start(self, port: int = 0, host: str = "127.0.0.1", socket_path: Optional[str] = None) -> None:
+        """启动服务：先用已有历史生成快照，再启动测速线程和接口服务"""
+        self.rebuild_snapshot()
+
+        if socket_path:
+            if os.path.exists(socket_path):
+                os.unlink(socket_path)
+            self._server = _UnixHTTPServer(socket_path, _DaemonHandler)
+        else:
+            self._server = ThreadingHTTPServer((host, port), _DaemonHandler)
+            self._server.daemon_threads = True
+        self._server.daemon = self
+
+        threading.Thread(target=self._schedule_loop, daemon=True).start()
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+
+    @property
+    def address(self) -> str:
+        """服务地址，用于显示"""
+        if isinstance(self._server, _UnixHTTPServer):
+            return f"unix:{self._server.server_address}"
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def stop(self) -> None:
+        """停止服务"""
+        self._stop.set()
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            if isinstance(self._server, _UnixHTTPServer) and os.path.exists(self._server.server_address):
+                os.unlink(self._server.server_address)
+            self._server = None
+
+    def wait(self) -> None:
+        """阻塞直到服务停止"""
+        while not self._stop.wait(1):
+            pass
+
+
+class _UnixHTTPConnection(http.client.HTTPConnection):
+    """通过Unix套接字发送HTTP请求"""
+
+    def __init__(self, socket_path: str, timeout: float = 2):
+        super().__init__("localhost", timeout=timeout)
+        self.socket_path = socket_path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.socket_path)
+
+
+def query_daemon(path: str, port: int = 0, host: str = "127.0.0.1",
+                 socket_path: Optional[str] = None, timeout: float = 2) -> Dict:
+    """查询常驻服务的接口，服务不可用时抛出 OSError 或 ValueError"""
+    if socket_path:
+        connection = _UnixHTTPConnection(socket_path, timeout)
+    else:
+        connection = http.client.HTTPConnection(host, port, timeout=timeout)
+    try:
+        connection.request("GET", path)
+        response = connection.getresponse()
+        body = response.read()
+        if response.status != 200:
+            raise ValueError(f"服务返回 {response.status}: {body.decode('utf-8', 'replace')}")
+        return json.loads(body)
+    finally:
+        connection.close()
@@ -1,177 +1,225 @@
 """
 NPM环境诊断工具
-用于诊断和解决NPM环境配置问题
+用于诊断和解决NPM环境配置问题：并行检查各平台常见的Node.js/npm安装位置，
+输出每项检查的耗时，可生成JSON报告（python diagnose.py --json）
 """
 
+import argparse
+import datetime
+import json
 import os
+import platform
+import shutil
 import subprocess
 import sys
-from pathlib import Path
-
-
-def check_node_installations():
-    """检查Node.js安装情况"""
-    print("=== Node.js 安装检查 ===")
-    
-    # 常见安装路径
-    possible_paths = [
-        r"C:\Program Files\nodejs",
-        r"C:\Program Files (x86)\nodejs",
-        Path.home() / "AppData" / "Roaming" / "npm",
-        Path.home() / "scoop" / "apps" / "nodejs" / "current",
-        Path.home() / "scoop" / "shims",
-        r"C:\tools\nodejs",
-        r"D:\Program Files\nodejs",
-        r"D:\nodejs"
-    ]
-    
-    found_installations = []
-    
-    for path in possible_paths:
-        path = Path(path)
-        if path.exists():
-            node_exe = path / "node.exe"
-            npm_cmd = path / "npm.cmd"
-            
-            print(f"✓ 找到安装目录: {path}")
-            
-            if node_exe.exists():
-                print(f"  - node.exe: 存在")
-                try:
-                    result = subprocess.run([str(node_exe), "--version"], 
-                                          capture_output=True, text=True, timeout=5)
-                    if result.returncode == 0:
-                        print(f"  - Node.js版本: {result.stdout.strip()}")
-                    else:
-                        print(f"  - Node.js版本检查失败")
-                except Exception as e:
-                    print(f"  - Node.js版本检查错误: {e}")
-            else:
-                print(f"  - node.exe: 不存在")
-            
-            if npm_cmd.exists():
-                print(f"  - npm.cmd: 存在")
-                try:
-                    result = subprocess.run([str(npm_cmd), "--version"], 
-                                          capture_output=True, text=True, timeout=5)
-                    if result.returncode == 0:
-                        print(f"  - NPM版本: {result.stdout.strip()}")
-                        found_installations.append(str(path))
-                    else:
-                        print(f"  - NPM版本检查失败")
-                except Exception as e:
-                    print(f"  - NPM版本检查错误: {e}")
-            else:
-                print(f"  - npm.cmd: 不存在")
-            
-            print()
-    
-    return found_installations
-
-
-def check_path_environment():
-    """检查PATH环境变量"""
-    print("=== PATH 环境变量检查 ===")
-    
-    path_env = os.environ.get('PATH', '')
-    path_dirs = path_env.split(os.pathsep)
-    
-    nodejs_paths = []
-    for path_dir in path_dirs:
-        if 'node' in path_dir.lower():
-            nodejs_paths.append(path_dir)
-            print(f"✓ PATH中的Node.js相关路径: {path_dir}")
-    
-    if not nodejs_paths:
-        print("✗ PATH中未找到Node.js相关路径")
-    
-    print()
-    return nodejs_paths
-
-
-def test_npm_commands():
-    """测试NPM命令"""
-    print("=== NPM 命令测试 ===")
-    
-    commands_to_test = [
-        ["npm", "--version"],
-        ["npm.cmd", "--version"],
-        ["node", "--version"],
-        ["node.exe", "--version"]
-    ]
-    
-    working_commands = []
-    
-    for cmd in commands_to_test:
-        try:
-            print(f"测试命令: {' '.join(cmd)}")
-            result = subprocess.run(cmd, capture_output=True, text=True, 
-                                  timeout=10, shell=True)
-            if result.returncode == 0:
-                print(f"✓ 成功: {result.stdout.strip()}")
-                working_commands.append(cmd)
-            else:
-                print(f"✗ 失败: {result.stderr.strip()}")
-        except FileNotFoundError:
-            print(f"✗ 命令未找到: {' '.join(cmd)}")
-        except subprocess.TimeoutExpired:
-            print(f"✗ 命令超时: {' '.join(cmd)}")
-        except Exception as e:
-            print(f"✗ 错误: {e}")
-        print()
-    
-    return working_commands
-
-
-def generate_fix_suggestions(found_installations, working_commands):
-    """生成修复建议"""
-    print("=== 修复建议 ===")
-    
-    if working_commands:
-        print("✓ NPM命令可以正常使用，应用程序应该能够正常运行。")
-        return
-    
-    if found_installations:
-        print("发现Node.js安装，但命令行无法访问。建议:")
-        print("1. 将以下路径添加到系统PATH环境变量:")
-        for path in found_installations:
-            print(f"   {path}")
-        print("\n2. 添加PATH的步骤:")
-        print("   - 右键'此电脑' -> 属性 -> 高级系统设置")
-        print("   - 点击'环境变量'")
-        print("   - 在'系统变量'中找到'Path'，点击'编辑'")
-        print("   - 点击'新建'，添加Node.js路径")
-        print("   - 确定保存，重启命令行")
-        
-        print("\n3. 或者重新安装Node.js并选择'Add to PATH'选项")
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+from node_discovery import (DEFAULT_TIMEOUT, IS_WINDOWS, NODE_NAMES, NPM_NAMES, DiscoveryCache,
+                            discover_installations, platform_name, run_version)
+
+
+# PATH中与Node.js相关的目录关键字
+NODE_PATH_KEYWORDS = ("node", "npm", "nvm", "fnm", "volta", "asdf", "scoop")
+
+
+def _timed(check: Callable[[], Dict]) -> Dict:
+    """执行一项检查并记录耗时，检查抛出异常时记为失败"""
+    start = time.perf_counter()
+    try:
+        outcome = check()
+    except Exception as e:
+        outcome = {"ok": False, "error": str(e)}
+    outcome["duration_ms"] = round((time.perf_counter() - start) * 1000, 1)
+    return outcome
+
+
+def check_discovery_cache(cache: DiscoveryCache) -> Dict:
+    """检查npm发现缓存（NPMRegistryManager启动时使用）"""
+    entry = cache.load()
+    return {"ok": entry is not None, "result": entry}
+
+
+def check_path_commands(cache: DiscoveryCache, timeout: float) -> Dict:
+    """检查PATH中的npm和node命令，缓存有效时直接使用缓存中的npm版本"""
+    entry = cache.load()
+    commands = {}
+    pending = {}
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        for name in NPM_NAMES + NODE_NAMES:
+            resolved = shutil.which(name)
+            commands[name] = {"path": resolved, "version": None, "error": None if resolved else "命令未找到"}
+            if not resolved:
+                continue
+            if entry is not None and entry["npm"] == name and entry.get("npm_version"):
+                commands[name].update(version=entry["npm_version"], cached=True)
+                continue
+            pending[name] = executor.submit(run_version, name, timeout)
+        for name, future in pending.items():
+            commands[name].update(future.result())
+    working = any(commands[name]["version"] for name in NPM_NAMES)
+    return {"ok": working, "result": commands}
+
+
+def check_installations(timeout: float) -> Dict:
+    """并行检查各平台常见安装位置中的node和npm"""
+    installations = discover_installations(timeout)
+    return {"ok": any(item["ok"] for item in installations), "result": installations}
+
+
+def check_path_environment() -> Dict:
+    """检查PATH环境变量中与Node.js相关的目录"""
+    entries = [entry for entry in os.environ.get("PATH", "").split(os.pathsep)
+               if any(keyword in entry.lower() for keyword in NODE_PATH_KEYWORDS)]
+    return {"ok": bool(entries), "result": entries}
+
+
+def check_npm_registry(cache: DiscoveryCache, timeout: float) -> Dict:
+    """用找到的npm读取当前源（验证npm能正常读取配置）"""
+    entry = cache.load()
+    command = entry["npm"] if entry else next((name for name in NPM_NAMES if shutil.which(name)), None)
+    if command is None:
+        return {"ok": False, "error": "没有可用的npm命令"}
+    try:
+        process = subprocess.run([command, "config", "get", "registry"], capture_output=True, text=True,
+                                 timeout=timeout, shell=IS_WINDOWS)
+    except subprocess.TimeoutExpired:
+        return {"ok": False, "error": f"超时（{timeout}秒）"}
+    except OSError as e:
+        return {"ok": False, "error": str(e)}
+    if process.returncode != 0:
+        return {"ok": False, "error": process.stderr.strip()}
+    return {"ok": True, "result": process.stdout.strip()}
+
+
+def generate_fix_suggestions(checks: Dict) -> List[str]:
+    """根据检查结果生成修复建议"""
+    if checks["path_commands"]["ok"]:
+        return ["NPM命令可以正常使用，应用程序应该能够正常运行。"]
+
+    found = [item for item in checks["installations"].get("result") or [] if item["ok"]]
+    if found:
+        suggestions = ["发现Node.js安装，但PATH中无法访问npm。请将以下目录添加到PATH:"]
+        suggestions += [f"  {item['dir']}（{item['source']}, npm {item['npm_version']['version']}）"
+                        for item in found]
+        if IS_WINDOWS:
+            suggestions += [
+                "添加PATH的步骤: 右键'此电脑' -> 属性 -> 高级系统设置 -> 环境变量，"
+                "在'系统变量'中编辑'Path'，新建一项填入上述目录，保存后重启命令行",
+                "或者重新安装Node.js并选择'Add to PATH'选项"
+            ]
+        else:
+            suggestions += [
+                "在 ~/.bashrc 或 ~/.zshrc 中加入 export PATH=\"<目录>:$PATH\" 后重新打开终端",
+                "使用nvm/fnm/volta安装的版本，请确认已在shell配置中加载对应的初始化脚本（如 nvm use --lts）"
+            ]
+        return suggestions
+
+    suggestions = ["未找到Node.js安装。建议:", "从官网下载Node.js LTS版本: https://nodejs.org/"]
+    if IS_WINDOWS:
+        suggestions.append("安装时确保勾选'Add to PATH'选项，安装完成后重启计算机")
+    elif sys.platform == "darwin":
+        suggestions.append("或使用Homebrew安装: brew install node")
     else:
-        print("未找到Node.js安装。建议:")
-        print("1. 从官网下载Node.js: https://nodejs.org/")
-        print("2. 选择LTS版本")
-        print("3. 安装时确保勾选'Add to PATH'选项")
-        print("4. 安装完成后重启计算机")
+        suggestions.append("或使用nvm安装: https://github.com/nvm-sh/nvm （nvm install --lts）")
+    return suggestions
 
 
-def main():
-    """主诊断函数"""
-    print("NPM环境诊断工具")
+def run_diagnosis(timeout: float = DEFAULT_TIMEOUT, cache: Optional[DiscoveryCache] = None) -> Dict:
+    """并行执行全部检查，返回诊断报告（每项检查包含ok、duration_ms和result/error）"""
+    cache = cache or DiscoveryCache()
+    checks = {
+        "discovery_cache": lambda: check_discovery_cache(cache),
+        "path_commands": lambda: check_path_commands(cache, timeout),
+        "installations": lambda: check_installations(timeout),
+        "path_environment": check_path_environment,
+        "npm_registry": lambda: check_npm_registry(cache, timeout),
+    }
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=len(checks)) as executor:
+        futures = {name: executor.submit(_timed, check) for name, check in checks.items()}
+        results = {name: future.result() for name, future in futures.items()}
+
+    # 缓存失效但找到了可用的npm时更新缓存，下次启动无需重新查找
+    if not results["discovery_cache"]["ok"]:
+        working = next((name for name in NPM_NAMES
+                        if (results["path_commands"].get("result") or {}).get(name, {}).get("version")), None)
+        if working:
+            cache.save(working, results["path_commands"]["result"][working]["version"])
+
+    return {
+        "platform": platform_name(),
+        "os": platform.platform(),
+        "python": platform.python_version(),
+        "generated_at": datetime.datetime.now().isoformat(),
+        "total_ms": round((time.perf_counter() - start) * 1000, 1),
+        "checks": results,
+        "suggestions": generate_fix_suggestions(results)
+    }
+
+
+def print_report(report: Dict) -> None:
+    """以文本形式输出诊断报告"""
+    checks = report["checks"]
+    print(f"NPM环境诊断工具（{report['platform']}）")
     print("=" * 50)
-    
-    # 检查Node.js安装
-    found_installations = check_node_installations()
-    
-    # 检查PATH环境变量
-    check_path_environment()
-    
-    # 测试NPM命令
-    working_commands = test_npm_commands()
-    
-    # 生成修复建议
-    generate_fix_suggestions(found_installations, working_commands)
-    
-    print("\n诊断完成!")
-    input("按回车键退出...")
+
+    print(f"\n=== NPM 命令测试 ({checks['path_commands']['duration_ms']}ms) ===")
+    for name, command in (checks["path_commands"].get("result") or {}).items():
+        if command["version"]:
+            cached = "，来自缓存" if command.get("cached") else ""
+            print(f"✓ {name}: {command['version']} ({command['path']}{cached})")
+        else:
+            print(f"✗ {name}: {command['error']}")
+
+    print(f"\n=== Node.js 安装检查 ({checks['installations']['duration_ms']}ms) ===")
+    installations = checks["installations"].get("result") or []
+    if not installations:
+        print("✗ 常见安装位置中未找到Node.js")
+    for item in installations:
+        mark = "✓" if item["ok"] else "✗"
+        print(f"{mark} [{item['source']}] {item['dir']} ({item['duration_ms']}ms)")
+        for key in ("node_version", "npm_version"):
+            check = item[key]
+            if check is not None:
+                print(f"  - {key.split('_')[0]}: {check['version'] or check['error']}")
+
+    print(f"\n=== PATH 环境变量检查 ({checks['path_environment']['duration_ms']}ms) ===")
+    for entry in checks["path_environment"]["result"] or ["✗ PATH中未找到Node.js相关路径"]:
+        print(entry if entry.startswith("✗") else f"✓ {entry}")
+
+    registry = checks["npm_registry"]
+    print(f"\n=== NPM 配置 ({registry['duration_ms']}ms) ===")
+    print(f"✓ 当前源: {registry['result']}" if registry["ok"] else f"✗ {registry['error']}")
+
+    print("\n=== 修复建议 ===")
+    for line in report["suggestions"]:
+        print(line)
+    print(f"\n诊断完成，耗时 {report['total_ms']}ms")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """主诊断函数"""
+    parser = argparse.ArgumentParser(description="NPM环境诊断工具")
+    parser.add_argument("--json", action="store_true", help="输出JSON格式的诊断报告")
+    parser.add_argument("--timeout", type=float, default=DEFAULT_TIMEOUT, help="单项命令检查的超时时间（秒）")
+    parser.add_argument("--no-cache", action="store_true", help="忽略并清除npm发现缓存")
+    args = parser.parse_args(argv)
+
+    cache = DiscoveryCache()
+    if args.no_cache:
+        cache.clear()
+    report = run_diagnosis(args.timeout, cache)
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+    else:
+        print_report(report)
+        # 双击运行时保持窗口
+        if IS_WINDOWS and sys.stdin.isatty():
+            input("按回车键退出...")
+    return 0 if report["checks"]["path_commands"]["ok"] else 1
 
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
@@ -0,0 +1,441 @@
+"""
+本地模拟NPM源模块
+提供一个可离线运行、结果可复现的模拟npm源，用于测试和基准测试
+
+从 fixtures/registry/packages.json 读取包定义，提供源根信息、完整/精简包元数据和tarball，
+每个实例可以单独配置延迟、带宽限制、抖动、错误率和连接中断率，
+以及是否支持Range请求（模拟忽略Range、总是返回完整响应的镜像）。
+"""
+
+import argparse
+import base64
+import gzip
+import hashlib
+import io
+import json
+import random
+import re
+import tarfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, List, Optional
+from urllib.parse import quote, unquote, urlsplit
+
+
+FIXTURES_FILE = Path(__file__).parent / "fixtures" / "registry" / "packages.json"
+
+# npm请求精简元数据时使用的Accept类型
+ABBREVIATED_TYPE = "application/vnd.npm.install-v1+json"
+
+# 固定的发布时间，保证元数据可复现
+FIXED_TIME = "2024-01-01T00:00:00.000Z"
+
+# 只支持单个字节区间：bytes=起始-结束、bytes=起始- 或 bytes=-末尾长度
+_RANGE_PATTERN = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def parse_range(value: Optional[str], length: int):
+    """解析Range请求头，返回 (起始, 结束)（包含结束位置）；没有或无法识别时返回None，区间无效时返回False"""
+    match = _RANGE_PATTERN.match((value or "").strip())
+    if not match or match.groups() == ("", ""):
+        return None
+    first, last = match.groups()
+    if not first:
+        start, end = max(length - int(last), 0), length - 1
+    else:
+        start, end = int(first), min(int(last), length - 1) if last else length - 1
+    if start >= length or start > end:
+        return False
+    return start, end
+
+
+def build_tarball(name: str, version: str, size: int, dependencies: Optional[Dict] = None) -> bytes:
+    """生成内容确定的npm包tarball（package/package.json + 填充数据）"""
+    manifest = {"name": name, "version": version, "main": "index.js"}
+    if dependencies:
+        manifest["dependencies"] = dependencies
+
+    files = {
+        "package/package.json": json.dumps(manifest, indent=2).encode("utf-8"),
+        "package/index.js": f"module.exports = {json.dumps(name)};\n".encode("utf-8")
+    }
+    # 随机数据几乎无法压缩，tarball大小接近size
+    rng = random.Random(f"{name}@{version}")
+    files["package/data.bin"] = rng.getrandbits(size * 8).to_bytes(size, "little") if size else b""
+
+    raw = io.BytesIO()
+    with tarfile.open(fileobj=raw, mode="w", format=tarfile.USTAR_FORMAT) as tar:
+        for path, content in files.items():
+            info = tarfile.TarInfo(path)
+            info.size = len(content)
+            info.mtime = 0
+            info.mode = 0o644
+            tar.addfile(info, io.BytesIO(content))
+
+    return gzip.compress(raw.getvalue(), mtime=0)
+
+
+class FakeRegistry:
+    """模拟源的数据部分：包元数据和tarball"""
+
+    def __init__(self, fixtures_file: Optional[Path] = None):
+        fixtures_file = Path(fixtures_file) if fixtures_file else FIXTURES_FILE
+        with open(fixtures_file, 'r', encoding='utf-8') as f:
+            self.packages = json.load(f)
+        self._tarballs = {}
+        self._lock = threading.Lock()
+
+    def tarball(self, name: str, version: str) -> Optional[bytes]:
+        """获取tarball内容（首次访问时生成并缓存）"""
+        spec = self.packages.get(name, {}).get("versions", {}).get(version)
+        if spec is None:
+            return None
+        key = (name, version)
+        with self._lock:
+            if key not in self._tarballs:
+                self._tarballs[key] = build_tarball(name, version, spec.get("size", 1024),
+                                                    spec.get("dependencies"))
+            return self._tarballs[key]
+
+    def tarball_path(self, name: str, version: str) -> str:
+        """tarball的相对路径（与npm官方源格式一致）"""
+        basename = name.split("/")[-1]
+        return f"/{name}/-/{basename}-{version}.tgz"
+
+    def dist(self, base_url: str, name: str, version: str) -> Dict:
+        """生成版本的dist字段"""
+        data = self.tarball(name, version)
+        return {
+            "tarball": base_url.rstrip("/") + self.tarball_path(name, version),
+            "shasum": hashlib.sha1(data).hexdigest(),
+            "integrity": "sha512-" + base64.b64encode(hashlib.sha512(data).digest()).decode("ascii")
+        }
+
+    def packument(self, base_url: str, name: str, abbreviated: bool = False) -> Optional[Dict]:
+        """生成包元数据（完整或精简格式）"""
+        package = self.packages.get(name)
+        if package is None:
+            return None
+
+        versions = list(package["versions"].keys())
+        latest = versions[-1]
+        version_docs = {}
+        for version, spec in package["versions"].items():
+            doc = {
+                "name": name,
+                "version": version,
+                "dependencies": spec.get("dependencies", {}),
+                "dist": self.dist(base_url, name, version)
+            }
+            if not abbreviated:
+                doc["description"] = package.get("description", "")
+                doc["_id"] = f"{name}@{version}"
+            version_docs[version] = doc
+
+        if abbreviated:
+            return {
+                "name": name,
+                "modified": FIXED_TIME,
+                "dist-tags": {"latest": latest},
+                "versions": version_docs
+            }
+
+        times = {"created": FIXED_TIME, "modified": FIXED_TIME}
+        times.update({version: FIXED_TIME for version in versions})
+        return {
+            "_id": name,
+            "name": name,
+            "description": package.get("description", ""),
+            "dist-tags": {"latest": latest},
+            "versions": version_docs,
+            "time": times
+        }
+
+    def manifest(self, base_url: str, name: str, tag: str) -> Optional[Dict]:
+        """生成单个版本的元数据（tag为版本号或dist-tag）"""
+        doc = self.packument(base_url, name)
+        if doc is None:
+            return None
+        version = doc["dist-tags"].get(tag, tag)
+        return doc["versions"].get(version)
+
+    def resolve_version(self, name: str, spec: str) -> Optional[str]:
+        """按简单的semver范围（^、~、精确版本、*、latest）选出满足条件的最高版本"""
+        versions = list(self.packages.get(name, {}).get("versions", {}).keys())
+
+        def parse(version):
+            return tuple(int(part) for part in version.split("."))
+
+        spec = spec.strip()
+        if spec in ("", "*", "latest"):
+            candidates = versions
+        else:
+            base = parse(spec.lstrip("^~="))
+            if spec.startswith("^"):
+                prefix = 1 if base[0] > 0 else 2
+            elif spec.startswith("~"):
+                prefix = 2
+            else:
+                prefix = 3
+            candidates = [v for v in versions if parse(v)[:prefix] == base[:prefix] and parse(v) >= base]
+        return max(candidates, key=parse) if candidates else None
+
+    def lockfile(self, base_url: str, dependencies: Dict[str, str], name: str = "fixture-project") -> Dict:
+        """为依赖生成package-lock.json（lockfileVersion 3，依赖全部平铺在顶层node_modules）"""
+        packages = {"": {"name": name, "version": "1.0.0", "dependencies": dict(dependencies)}}
+        pending = list(dependencies.items())
+        while pending:
+            dep_name, spec = pending.pop(0)
+            key = f"node_modules/{dep_name}"
+            if key in packages:
+                continue
+            version = self.resolve_version(dep_name, spec)
+            if version is None:
+                raise ValueError(f"模拟源中没有满足 {dep_name}@{spec} 的版本")
+            dist = self.dist(base_url, dep_name, version)
+            entry = {"version": version, "resolved": dist["tarball"], "integrity": dist["integrity"]}
+            deps = self.packages[dep_name]["versions"][version].get("dependencies")
+            if deps:
+                entry["dependencies"] = dict(deps)
+                pending.extend(deps.items())
+            packages[key] = entry
+        return {"name": name, "version": "1.0.0", "lockfileVersion": 3, "requires": True, "packages": packages}
+
+    def root(self) -> Dict:
+        """源根路径返回的信息"""
+        return {
+            "db_name": "registry",
+            "doc_count": len(self.packages),
+            "update_seq": len(self.packages),
+            "instance_start_time": "0"
+        }
+
+
+class _RegistryHandler(BaseHTTPRequestHandler):
+    """模拟源的请求处理器"""
+
+    protocol_version = "HTTP/1.1"
+    server_version = "FakeRegistry/1.0"
+
+    def log_message(self, format, *args):
+        """默认不输出访问日志"""
+        if self.server.owner.verbose:
+            super().log_message(format, *args)
+
+    def do_HEAD(self):
+        self._handle(send_body=False)
+
+    def do_GET(self):
+        self._handle(send_body=True)
+
+    def _handle(self, send_body: bool):
+        owner = self.server.owner
+        path = unquote(urlsplit(self.path).path)
+        plan = owner.plan_request(path)
+
+        # 模拟连接中断：不返回任何数据直接断开
+        if plan["drop"]:
+            owner.log_request(path, 0, 0)
+            self.close_connection = True
+            return
+
+        if plan["delay"] > 0:
+            time.sleep(plan["delay"])
+
+        if plan["status"] is not None:
+            self._send(plan["status"], b'{"error":"injected error"}', "application/json", send_body)
+            return
+
+        status, body, content_type = owner.resolve(path, self.headers.get("Accept", ""))
+        etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+        if status == 200 and self.headers.get("If-None-Match") == etag:
+            self._send(304, b"", content_type, send_body, etag=etag)
+            return
+
+        headers = {"Accept-Ranges": "bytes"} if status == 200 and owner.support_range else {}
+        byte_range = parse_range(self.headers.get("Range"), len(body)) if headers else None
+        if byte_range is False:
+            self._send(416, b"", content_type, send_body, headers={"Content-Range": f"bytes */{len(body)}"})
+            return
+        if byte_range:
+            start, end = byte_range
+            headers["Content-Range"] = f"bytes {start}-{end}/{len(body)}"
+            self._send(206, body[start:end + 1], content_type, send_body, etag=etag, headers=headers)
+            return
+        self._send(status, body, content_type, send_body, etag=etag if status == 200 else None, headers=headers)
+
+    def _send(self, status: int, body: bytes, content_type: str, send_body: bool,
+              etag: Optional[str] = None, headers: Optional[Dict[str, str]] = None):
+        """发送响应，按带宽限制分块写出"""
+        owner = self.server.owner
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        if etag:
+            self.send_header("ETag", etag)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+
+        sent = 0
+        if send_body and status != 304:
+            chunk_size = 16 * 1024
+            try:
+                for offset in range(0, len(body), chunk_size):
+                    chunk = body[offset:offset + chunk_size]
+                    self.wfile.write(chunk)
+                    sent += len(chunk)
+                    if owner.bandwidth:
+                        time.sleep(len(chunk) / owner.bandwidth)
+            except (BrokenPipeError, ConnectionResetError):
+                self.close_connection = True
+        owner.log_request(unquote(urlsplit(self.path).path), status, sent)
+
+
+class FakeRegistryServer:
+    """本地模拟npm源服务器
+
+    用法:
+        with FakeRegistryServer(latency=0.05, bandwidth=512 * 1024) as server:
+            manager.test_registry_speed(server.url)
+    """
+
+    def __init__(self, latency: float = 0.0, bandwidth: int = 0, jitter: float = 0.0,
+                 error_rate: float = 0.0, drop_rate: float = 0.0, seed: int = 0,
+                 port: int = 0, host: str = "127.0.0.1", registry: Optional[FakeRegistry] = None,
+                 verbose: bool = False, support_range: bool = True):
+        self.latency = latency          # 每个请求的固定延迟（秒）
+        self.bandwidth = bandwidth      # 带宽上限（字节/秒），0表示不限制
+        self.jitter = jitter            # 延迟抖动范围（秒）
+        self.error_rate = error_rate    # 返回503的概率
+        self.drop_rate = drop_rate      # 直接断开连接的概率
+        self.support_range = support_range  # 是否支持Range请求，False时总是返回完整响应
+        self.verbose = verbose
+        self.registry = registry or FakeRegistry()
+        self.requests: List[Dict] = []
+
+        self._random = random.Random(seed)
+        self._random_lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer((host, port), _RegistryHandler)
+        self._httpd.daemon_threads = True
+        self._httpd.owner = self
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        """源地址（以/结尾）"""
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}/"
+
+    def next_random(self) -> random.Random:
+        """为单个请求生成独立的随机数发生器，保证多线程下结果可复现"""
+        with self._random_lock:
+            return random.Random(self._random.getrandbits(64))
+
+    def plan_request(self, path: str) -> Dict:
+        """决定单个请求的表现：是否断开、延迟多久、是否返回注入的错误状态码
+
+        子类可以重写该方法按脚本回放请求（见probe_trace.ReplayServer）。
+        """
+        rng = self.next_random()
+        drop = rng.random() < self.drop_rate
+        delay = self.latency + (rng.uniform(-self.jitter, self.jitter) if self.jitter else 0)
+        status = 503 if rng.random() < self.error_rate else None
+        return {"drop": drop, "delay": max(delay, 0), "status": status}
+
+    def log_request(self, path: str, status: int, sent: int) -> None:
+        """记录请求，供测试断言和基准统计使用"""
+        self.requests.append({"path": path, "status": status, "bytes": sent, "time": time.time()})
+
+    def resolve(self, path: str, accept: str):
+        """根据请求路径生成 (状态码, 响应体, Content-Type)"""
+        if path in ("", "/"):
+            return 200, json.dumps(self.registry.root()).encode("utf-8"), "application/json"
+
+        if "/-/" in path:
+            name, filename = path.lstrip("/").split("/-/", 1)
+            basename = name.split("/")[-1]
+            if filename.startswith(basename + "-") and filename.endswith(".tgz"):
+                version = filename[len(basename) + 1:-len(".tgz")]
+                data = self.registry.tarball(name, version)
+                if data is not None:
+                    return 200, data, "application/octet-stream"
+            return 404, b'{"error":"not found"}', "application/json"
+
+        abbreviated = ABBREVIATED_TYPE in accept
+        doc = self.registry.packument(self.url, path.lstrip("/"), abbreviated)
+        if doc is None and "/" in path.strip("/"):
+            # /{包名}/{版本或标签}：单个版本的元数据
+            name, tag = path.strip("/").rsplit("/", 1)
+            doc = self.registry.manifest(self.url, name, tag)
+            if doc is not None:
+                return 200, json.dumps(doc).encode("utf-8"), "application/json"
+        if doc is None:
+            return 404, b'{"error":"not found"}', "application/json"
+        return 200, json.dumps(doc).encode("utf-8"), ABBREVIATED_TYPE if abbreviated else "application/json"
+
+    def write_fixture_project(self, path: Path, dependencies: Optional[Dict[str, str]] = None) -> Path:
+        """在path下生成依赖本模拟源的测试项目（package.json + package-lock.json），用于npm ci基准"""
+        dependencies = dependencies or {"tiny-lib": "^1.0.0", "@fixture/scoped": "^0.1.0"}
+        path = Path(path)
+        path.mkdir(parents=True, exist_ok=True)
+        manifest = {"name": "fixture-project", "version": "1.0.0", "private": True, "dependencies": dependencies}
+        (path / "package.json").write_text(json.dumps(manifest, indent=2), encoding="utf-8")
+        lockfile = self.registry.lockfile(self.url, dependencies)
+        (path / "package-lock.json").write_text(json.dumps(lockfile, indent=2), encoding="utf-8")
+        return path
+
+    def tarball_url(self, name: str, version: str) -> str:
+        """获取tarball完整URL"""
+        return self.url.rstrip("/") + quote(self.registry.tarball_path(name, version))
+
+    def start(self) -> "FakeRegistryServer":
+        """在后台线程中启动服务器"""
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        """停止服务器"""
+        self._httpd.shutdown()
+        self._httpd.server_close()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+
+def main():
+    """以独立进程运行模拟源"""
+    parser = argparse.ArgumentParser(description="本地模拟NPM源")
+    parser.add_argument("--port", type=int, default=4873, help="监听端口")
+    parser.add_argument("--latency", type=float, default=0.0, help="每个请求的延迟（秒）")
+    parser.add_argument("--jitter", type=float, default=0.0, help="延迟抖动（秒）")
+    parser.add_argument("--bandwidth", type=int, default=0, help="带宽上限（字节/秒）")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="返回503的概率")
+    parser.add_argument("--drop-rate", type=float, default=0.0, help="断开连接的概率")
+    parser.add_argument("--seed", type=int, default=0, help="随机种子")
+    parser.add_argument("--no-range", action="store_true", help="忽略Range请求，总是返回完整响应")
+    args = parser.parse_args()
+
+    server = FakeRegistryServer(latency=args.latency, bandwidth=args.bandwidth, jitter=args.jitter,
+                                error_rate=args.error_rate, drop_rate=args.drop_rate,
+                                seed=args.seed, port=args.port, verbose=True, support_range=not args.no_range)
+    print(f"模拟源已启动: {server.url}")
+    try:
+        server._httpd.serve_forever()
+    except KeyboardInterrupt:
+        print("\n模拟源已停止")
+    finally:
+        server._httpd.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+"""
+安装基准测试模块
+对每个源在隔离的临时目录中用全新的缓存执行 npm ci，重复多次，
+记录耗时、下载字节数和失败次数，回答"哪个源让 npm ci 最快"
+"""
+
+import copy
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+
+# 复制到临时目录的项目文件
+PROJECT_FILES = ("package.json", "package-lock.json", "npm-shrinkwrap.json")
+
+
+def rewrite_lockfile(lockfile: Dict, registry_url: str) -> Dict:
+    """把锁文件中各依赖的resolved地址改写到指定源，使 npm ci 从该源下载"""
+    lockfile = copy.deepcopy(lockfile)
+    base = registry_url.rstrip("/")
+    for key, entry in lockfile.get("packages", {}).items():
+        resolved = entry.get("resolved")
+        if not key or not resolved or not resolved.startswith(("http://", "https://")):
+            continue
+        name = key.rsplit("node_modules/", 1)[-1]
+        marker = f"/{name}/-/"
+        index = resolved.find(marker)
+        if index >= 0:
+            entry["resolved"] = base + resolved[index:]
+    return lockfile
+
+
+def dir_size(path: Path) -> int:
+    """目录中全部文件的总字节数"""
+    total = 0
+    try:
+        with os.scandir(path) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    total += dir_size(Path(entry.path))
+                elif entry.is_file(follow_symlinks=False):
+                    total += entry.stat(follow_symlinks=False).st_size
+    except OSError:
+        pass
+    return total
+
+
+class InstallBenchmark:
+    """npm ci 安装基准"""
+
+    def __init__(self, npm_command: str, project_dir: Path, repeats: int = 3, timeout: int = 600):
+        self.npm_command = npm_command
+        self.project_dir = Path(project_dir)
+        self.repeats = repeats
+        self.timeout = timeout
+        if not (self.project_dir / "package.json").exists():
+            raise Exception(f"项目目录中没有package.json: {self.project_dir}")
+        if not any((self.project_dir / name).exists() for name in PROJECT_FILES[1:]):
+            raise Exception(f"npm ci 需要锁文件，项目目录中没有package-lock.json: {self.project_dir}")
+
+    def _prepare(self, workdir: Path, registry_url: str) -> Path:
+        """把项目文件复制到临时目录，并把锁文件改写到目标源"""
+        project = workdir / "project"
+        project.mkdir()
+        for name in PROJECT_FILES:
+            source = self.project_dir / name
+            if not source.exists():
+                continue
+            if name == "package.json":
+                shutil.copyfile(source, project / name)
+                continue
+            with open(source, 'r', encoding='utf-8') as f:
+                lockfile = json.load(f)
+            with open(project / name, 'w', encoding='utf-8') as f:
+                json.dump(rewrite_lockfile(lockfile, registry_url), f, indent=2)
+        return project
+
+    def run_once(self, registry_url: str) -> Dict:
+        """在临时目录中用全新缓存执行一次 npm ci"""
+        result = {"wall": None, "bytes": 0, "success": False, "error": None}
+        with tempfile.TemporaryDirectory(prefix="npm-install-bench-") as tmp:
+            workdir = Path(tmp)
+            project = self._prepare(workdir, registry_url)
+            cache = workdir / "cache"
+            args = [self.npm_command, "ci", "--registry", registry_url, "--cache", str(cache),
+                    "--prefer-online", "--no-audit", "--no-fund", "--no-update-notifier", "--ignore-scripts",
+                    "--loglevel=error"]
+
+            start = time.perf_counter()
+            try:
+                process = subprocess.run(args, cwd=project, capture_output=True, text=True,
+                                         timeout=self.timeout, shell=os.name == "nt")
+                result["wall"] = round(time.perf_counter() - start, 3)
+                result["success"] = process.returncode == 0
+                if not result["success"]:
+                    lines = (process.stderr or process.stdout).strip().splitlines()
+                    result["error"] = lines[-1] if lines else f"npm ci 退出码 {process.returncode}"
+            except subprocess.TimeoutExpired:
+                result["wall"] = self.timeout
+                result["error"] = f"超时（{self.timeout}秒）"
+            except OSError as e:
+                result["error"] = str(e)
+            # 全新缓存目录的大小即本次下载的数据量（tarball和元数据）
+            result["bytes"] = dir_size(cache)
+        return result
+
+    def run(self, registry_url: str) -> Dict:
+        """对一个源重复执行 npm ci，返回每次结果和汇总"""
+        runs = [self.run_once(registry_url) for _ in range(self.repeats)]
+        return summarize(registry_url, runs)
+
+
+def summarize(registry_url: str, runs: List[Dict]) -> Dict:
+    """汇总多次运行：成功运行的耗时和下载量取中位数"""
+    successful = [r for r in runs if r["success"]]
+    return {
+        "url": registry_url,
+        "runs": runs,
+        "failures": len(runs) - len(successful),
+        "median_wall": round(statistics.median(r["wall"] for r in successful), 3) if successful else None,
+        "median_bytes": int(statistics.median(r["bytes"] for r in successful)) if successful else None
+    }
+
+
+def rank_results(results: List[Dict]) -> List[Dict]:
+    """按中位耗时排序（全部失败的源排在最后）"""
+    return sorted(results, key=lambda r: (r["median_wall"] is None, r["median_wall"] or 0, r["failures"]))
+
+
+def default_project_name(project_dir: Optional[Path]) -> str:
+    """历史记录中标识项目的名称"""
+    if project_dir is None:
+        return "fixture"
+    try:
+        with open(Path(project_dir) / "package.json", 'r', encoding='utf-8') as f:
+            return json.load(f).get("name") or Path(project_dir).name
+    except (OSError, json.JSONDecodeError):
+        return Path(project_dir).name
@@ -0,0 +1,237 @@
+"""
+安装守护模块
+用当前源运行 npm install 并监视进度（输出和缓存目录中的下载活动），
+停滞超过阈值时结束npm，切换到评分次高的源并利用已填充的缓存重试，
+报告相比等待npm自身超时节省的时间
+"""
+
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from install_bench import dir_size
+from scoring import ScoringEngine, percentile
+
+
+# 没有历史记录时的停滞阈值（秒）
+DEFAULT_STALL_TIMEOUT = 60.0
+
+# 停滞阈值为该倍数的历史响应时间P90，并限制在上下限之间
+STALL_FACTOR = 100
+MIN_STALL_TIMEOUT = 20.0
+MAX_STALL_TIMEOUT = 180.0
+
+# 检查进度的间隔（秒）
+POLL_INTERVAL = 0.5
+
+# 输出中出现这些错误码时视为网络失败，同样切换源重试
+NETWORK_ERRORS = ("ETIMEDOUT", "ECONNRESET", "ECONNREFUSED", "EAI_AGAIN", "ENOTFOUND",
+                  "ESOCKETTIMEDOUT", "E500", "E502", "E503", "E504")
+
+
+def stall_timeout_for(speed_tests: List[Dict]) -> float:
+    """根据源的历史响应时间推算停滞阈值（秒）"""
+    speeds = [t["speed"] for t in speed_tests if t["success"] and t["speed"] > 0]
+    if not speeds:
+        return DEFAULT_STALL_TIMEOUT
+    return min(max(STALL_FACTOR * percentile(speeds, 90) / 1000, MIN_STALL_TIMEOUT), MAX_STALL_TIMEOUT)
+
+
+def npm_timeout_budget(npm_config: Dict) -> float:
+    """npm自身判定一次请求失败前最多等待的时间（秒）：fetch-timeout乘以尝试次数加上重试间隔"""
+    def number(key: str, default: float) -> float:
+        try:
+            return float(npm_config.get(key, default))
+        except (TypeError, ValueError):
+            return default
+
+    timeout = number("fetch-timeout", 300000) / 1000
+    retries = int(number("fetch-retries", 2))
+    min_wait = number("fetch-retry-mintimeout", 10000) / 1000
+    max_wait = number("fetch-retry-maxtimeout", 60000) / 1000
+    factor = number("fetch-retry-factor", 10)
+    backoff = sum(min(min_wait * factor ** i, max_wait) for i in range(retries))
+    return timeout * (retries + 1) + backoff
+
+
+def _kill_tree(process: subprocess.Popen) -> None:
+    """结束npm及其子进程"""
+    if process.poll() is not None:
+        return
+    if os.name == "nt":
+        subprocess.run(["taskkill", "/F", "/T", "/PID", str(process.pid)], capture_output=True)
+    else:
+        try:
+            os.killpg(process.pid, signal.SIGTERM)
+            process.wait(timeout=2)
+        except subprocess.TimeoutExpired:
+            os.killpg(process.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+    process.wait()
+
+
+def _exit_status(returncode: int) -> int:
+    """转换为shell风格的退出码：被信号结束的进程（负数返回码）记为128加信号编号"""
+    return 128 - returncode if returncode < 0 else returncode
+
+
+class _ActivityMonitor:
+    """记录最后一次进度：npm输出新的一行，或缓存临时目录（正在下载的文件）发生变化"""
+
+    def __init__(self, cache_dir: Optional[Path], output=None):
+        self.tmp_dir = cache_dir / "_cacache" / "tmp" if cache_dir else None
+        self.output = output
+        self.last_activity = time.monotonic()
+        self.lines: List[str] = []
+        self._signature = self._cache_signature()
+        self._lock = threading.Lock()
+
+    def _cache_signature(self):
+        """缓存临时目录的修改时间和大小（目录中只有正在下载的文件，统计开销很小）"""
+        if self.tmp_dir is None:
+            return None
+        try:
+            return self.tmp_dir.stat().st_mtime_ns, dir_size(self.tmp_dir)
+        except OSError:
+            return None
+
+    def follow(self, stream) -> None:
+        """逐行读取npm输出并转发"""
+        for line in stream:
+            with self._lock:
+                self.last_activity = time.monotonic()
+                self.lines.append(line.rstrip())
+                del self.lines[:-50]
+            if self.output is not None:
+                self.output.write(line)
+                self.output.flush()
+
+    def idle_seconds(self) -> float:
+        """距离最后一次进度的秒数"""
+        signature = self._cache_signature()
+        with self._lock:
+            if signature != self._signature:
+                self._signature = signature
+                self.last_activity = time.monotonic()
+            return time.monotonic() - self.last_activity
+
+
+class InstallGuard:
+    """带停滞检测和自动切换源的 npm install"""
+
+    def __init__(self, npm_manager, config_manager, stall_timeout: Optional[float] = None,
+                 max_attempts: int = 3, output=None):
+        self.npm_manager = npm_manager
+        self.config_manager = config_manager
+        self.stall_timeout = stall_timeout
+        self.max_attempts = max_attempts
+        self.output = output if output is not None else sys.stdout
+
+    @classmethod
+    def from_config(cls, npm_manager, config_manager, stall_timeout: Optional[float] = None,
+                    max_attempts: Optional[int] = None) -> "InstallGuard":
+        """按配置创建安装守护（install_stall_timeout为0时根据历史响应时间推算阈值）"""
+        return cls(npm_manager, config_manager,
+                   stall_timeout=stall_timeout or config_manager.get("install_stall_timeout", 0),
+                   max_attempts=max_attempts or config_manager.get("install_max_attempts", 3))
+
+    def _cache_dir(self) -> Optional[Path]:
+        """npm缓存目录"""
+        try:
+            cache = self.npm_manager.get_npm_config().get("cache")
+        except Exception:
+            cache = None
+        return Path(cache) if cache else Path.home() / ".npm"
+
+    def threshold(self, registry_url: str) -> float:
+        """源的停滞阈值（秒），配置或参数中指定时使用指定值"""
+        if self.stall_timeout:
+            return self.stall_timeout
+        return stall_timeout_for(self.config_manager.history["speed_tests"].get(registry_url, []))
+
+    def candidates(self, registries: Dict[str, str], tried: List[str]) -> List[str]:
+        """按综合评分排列的备选源（排除已尝试过的）"""
+        ranking = ScoringEngine.from_config(self.config_manager).rank(
+            registries, self.config_manager.history["speed_tests"])
+        return [item["url"] for item in ranking if item["url"] not in tried]
+
+    def run_once(self, npm_args: List[str], registry_url: str, retry: bool, cwd: Optional[Path] = None) -> Dict:
+        """用指定源运行一次npm，返回结果（outcome为success、stalled、network或failed）
+
+        重试时使用 --prefer-offline 复用已下载到缓存的包，并把锁文件中的地址替换为当前源。
+        """
+        args = [self.npm_manager.npm_command] + npm_args + ["--registry", registry_url, "--loglevel=http"]
+        if retry:
+            args += ["--prefer-offline", "--replace-registry-host=always"]
+        threshold = self.threshold(registry_url)
+        monitor = _ActivityMonitor(self._cache_dir(), self.output)
+        start = time.monotonic()
+        process = subprocess.Popen(args, cwd=cwd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                                   text=True, errors="replace", shell=os.name == "nt",
+                                   start_new_session=os.name != "nt")
+        reader = threading.Thread(target=monitor.follow, args=(process.stdout,), daemon=True)
+        reader.start()
+
+        outcome = None
+        while process.poll() is None:
+            if monitor.idle_seconds() > threshold:
+                _kill_tree(process)
+                outcome = "stalled"
+                break
+            time.sleep(POLL_INTERVAL)
+        reader.join(timeout=5)
+
+        if outcome is None:
+            if process.returncode == 0:
+                outcome = "success"
+            elif any(code in line for line in monitor.lines for code in NETWORK_ERRORS):
+                outcome = "network"
+            else:
+                outcome = "failed"
+        return {"registry": registry_url, "outcome": outcome, "elapsed": round(time.monotonic() - start, 1),
+                "threshold": round(threshold, 1), "returncode": _exit_status(process.returncode)}
+
+    def run(self, npm_args: List[str], registries: Dict[str, str], cwd: Optional[Path] = None) -> Dict:
+        """运行npm，停滞或网络失败时切换到次优源重试
+
+        返回 {"success", "attempts", "registry", "time_saved"}。不切换源时npm会在最后一次进度后
+        再等待自身超时才失败，time_saved为每次停滞时这段时间与实际花费（停滞的这次加上
+        切换后的下一次尝试的实测耗时）之差的总和（秒）。
+        """
+        try:
+            npm_config = self.npm_manager.get_npm_config()
+        except Exception:
+            npm_config = {}
+        budget = npm_timeout_budget(npm_config)
+        registry_url = self.npm_manager.current_registry
+        attempts: List[Dict] = []
+
+        while True:
+            attempt = self.run_once(npm_args, registry_url, retry=bool(attempts), cwd=cwd)
+            attempts.append(attempt)
+            if attempt["outcome"] in ("success", "failed") or len(attempts) >= self.max_attempts:
+                break
+
+            remaining = self.candidates(registries, [a["registry"] for a in attempts])
+            if not remaining:
+                break
+            old_registry, registry_url = registry_url, remaining[0]
+            self.npm_manager.set_registry(registry_url)
+            self.config_manager.record_registry_switch(old_registry, registry_url)
+
+        time_saved = 0.0
+        for index, attempt in enumerate(attempts):
+            if attempt["outcome"] != "stalled":
+                continue
+            without_guard = attempt["elapsed"] - attempt["threshold"] + budget
+            fallback = attempts[index + 1]["elapsed"] if index + 1 < len(attempts) else 0.0
+            time_saved += max(without_guard - attempt["elapsed"] - fallback, 0.0)
+
+        return {"success": attempts[-1]["outcome"] == "success", "attempts": attempts,
+                "registry": registry_url, "time_saved": round(time_saved, 1)}
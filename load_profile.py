@@ -0,0 +1,164 @@
+"""
+并发负载曲线模块
+在并发数1、4、8、16、32下从源下载同一组tarball，记录每一级的总吞吐量和响应时间分位数，
+用于同时选择源和npm的maxsockets设置
+"""
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+import requests
+
+from rate_limit import parse_retry_after
+from scoring import percentile
+
+
+# 默认测试的并发级别
+DEFAULT_LEVELS = (1, 4, 8, 16, 32)
+
+# 吞吐量达到峰值的该比例即视为饱和
+SATURATION_RATIO = 0.9
+
+# 某一级的错误率超过该值时不作为maxsockets建议
+MAX_ERROR_RATE = 0.05
+
+
+def resolve_tarballs(npm_manager, registry_url: str, packages: List[str], timeout: int = 10) -> List[str]:
+    """从源获取各包最新版本的tarball地址（获取失败的包跳过）"""
+    tarballs = []
+    for package in packages:
+        try:
+            doc, _, _ = npm_manager._fetch_modified(registry_url, package, timeout)
+            latest = doc["dist-tags"]["latest"]
+            tarballs.append(doc["versions"][latest]["dist"]["tarball"])
+        except (requests.RequestException, ValueError, KeyError):
+            continue
+    return tarballs
+
+
+def _fetch(npm_manager, session: requests.Session, url: str, timeout: int) -> Dict:
+    """完整下载一个tarball，返回耗时（毫秒）、字节数、HTTP状态和Retry-After要求等待的秒数"""
+    result = {"ms": None, "bytes": 0, "status": None, "retry_after": None, "error": None}
+    start = time.perf_counter()
+    try:
+        response = npm_manager._http_get(url, session=session, timeout=timeout, stream=True)
+        with response:
+            result["status"] = response.status_code
+            result["retry_after"] = parse_retry_after(response.headers.get("Retry-After"))
+            response.raise_for_status()
+            for chunk in response.iter_content(64 * 1024):
+                result["bytes"] += len(chunk)
+        result["ms"] = round((time.perf_counter() - start) * 1000, 2)
+    except requests.RequestException as e:
+        result["error"] = str(e)
+    return result
+
+
+def summarize_level(concurrency: int, fetches: List[Dict], wall: float) -> Dict:
+    """汇总一个并发级别：总吞吐量（字节/秒）、成功请求耗时的P50/P90/P99和错误数"""
+    latencies = [f["ms"] for f in fetches if f["error"] is None]
+    total_bytes = sum(f["bytes"] for f in fetches)
+    return {
+        "concurrency": concurrency,
+        "requests": len(fetches),
+        "errors": len(fetches) - len(latencies),
+        "bytes": total_bytes,
+        "wall": round(wall, 3),
+        "throughput": round(total_bytes / wall) if wall > 0 else None,
+        "p50": percentile(latencies, 50),
+        "p90": percentile(latencies, 90),
+        "p99": percentile(latencies, 99)
+    }
+
+
+def suggest_maxsockets(levels: List[Dict]) -> Optional[int]:
+    """建议的maxsockets：错误率可接受且吞吐量达到峰值90%的最小并发数"""
+    usable = [level for level in levels
+              if level["throughput"] and level["errors"] <= level["requests"] * MAX_ERROR_RATE]
+    if not usable:
+        return None
+    peak = max(level["throughput"] for level in usable)
+    return min(level["concurrency"] for level in usable if level["throughput"] >= peak * SATURATION_RATIO)
+
+
+class LoadProfiler:
+    """对源逐级提高并发数下载固定的一组tarball"""
+
+    def __init__(self, npm_manager, packages: List[str], levels=DEFAULT_LEVELS,
+                 requests_per_level: int = 32, timeout: int = 30):
+        self.npm_manager = npm_manager
+        self.packages = packages
+        self.levels = sorted(set(levels))
+        self.requests_per_level = requests_per_level
+        self.timeout = timeout
+
+    @classmethod
+    def from_config(cls, npm_manager, config_manager, **overrides) -> "LoadProfiler":
+        """按配置创建负载测试"""
+        options = {
+            "packages": config_manager.get("load_profile_packages"),
+            "levels": config_manager.get("load_profile_levels", list(DEFAULT_LEVELS)),
+            "requests_per_level": config_manager.get("load_profile_requests", 32)
+        }
+        options.update({key: value for key, value in overrides.items() if value})
+        return cls(npm_manager, **options)
+
+    def run_level(self, tarballs: List[str], concurrency: int) -> Dict:
+        """以指定并发数下载requests_per_level个tarball（循环使用tarball列表）
+
+        每个并发级别使用新的连接池（大小等于并发数），相当于npm设置maxsockets为该值。
+        """
+        urls = [tarballs[i % len(tarballs)] for i in range(self.requests_per_level)]
+        session = self.npm_manager.new_session(pool_size=concurrency)
+        try:
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=concurrency) as executor:
+                fetches = list(executor.map(
+                    lambda url: _fetch(self.npm_manager, session, url, self.timeout), urls))
+            wall = time.perf_counter() - start
+        finally:
+            session.close()
+
+        # 把限流响应反馈给限速器，之后的级别和其他探测都会避开该主机
+        host = self.npm_manager._probe_host(tarballs[0])
+        for fetch in fetches:
+            if fetch["status"] in (429, 503):
+                self.npm_manager.rate_limiter.report(host, fetch["status"], fetch["retry_after"])
+        return summarize_level(concurrency, fetches, wall)
+
+    def run(self, registry_url: str) -> Dict:
+        """测试一个源的全部并发级别
+
+        返回 {"url", "tarballs", "levels": [...], "peak_throughput", "suggested_maxsockets", "error"}，
+        源开始限流时停止提高并发数。
+        """
+        profile = {"url": registry_url, "tarballs": 0, "levels": [], "peak_throughput": None,
+                   "suggested_maxsockets": None, "error": None}
+        tarballs = resolve_tarballs(self.npm_manager, registry_url, self.packages, self.timeout)
+        profile["tarballs"] = len(tarballs)
+        if not tarballs:
+            profile["error"] = "无法获取任何tarball地址"
+            return profile
+
+        host = self.npm_manager._probe_host(tarballs[0])
+        for concurrency in self.levels:
+            blocked = self.npm_manager.rate_limiter.blocked_for(host)
+            if blocked:
+                profile["error"] = f"源正在限流，已在并发{concurrency}前停止（{round(blocked)}秒后重试）"
+                break
+            profile["levels"].append(self.run_level(tarballs, concurrency))
+
+        throughputs = [level["throughput"] for level in profile["levels"] if level["throughput"]]
+        profile["peak_throughput"] = max(throughputs) if throughputs else None
+        profile["suggested_maxsockets"] = suggest_maxsockets(profile["levels"])
+        return profile
+
+
+def suggest_overall(profiles: List[Dict]) -> Optional[Dict]:
+    """在全部源中选峰值吞吐量最高的源及其建议的maxsockets"""
+    candidates = [p for p in profiles if p["peak_throughput"] and p["suggested_maxsockets"]]
+    if not candidates:
+        return None
+    best = max(candidates, key=lambda p: p["peak_throughput"])
+    return {"url": best["url"], "maxsockets": best["suggested_maxsockets"], "throughput": best["peak_throughput"]}
@@ -95,68 +95,36 @@ def setup_application():
 
 
 def check_dependencies():
-    """检查依赖项"""
-    import subprocess
-    import os
+    """检查依赖项（与NPMRegistryManager共用npm发现缓存，缓存有效时不启动npm进程）"""
+    import shutil
+    from node_discovery import NPM_NAMES, DiscoveryCache, discover_installations, run_version
     
-    # 检查常见的Node.js安装路径
-    possible_paths = [
-        r"C:\Program Files\nodejs",
-        r"C:\Program Files (x86)\nodejs", 
-        os.path.expanduser("~\\AppData\\Roaming\\npm"),
-        os.path.expanduser("~\\scoop\\apps\\nodejs\\current"),
-        os.path.expanduser("~\\scoop\\shims")
-    ]
+    cache = DiscoveryCache()
+    entry = cache.load()
+    if entry is not None:
+        return True, f"NPM版本: {entry['npm_version']}"
     
-    # 检查PATH环境变量
-    current_path = os.environ.get('PATH', '')
+    # 尝试直接运行PATH中的npm
+    for name in NPM_NAMES:
+        if shutil.which(name):
+            check = run_version(name)
+            if check["version"]:
+                cache.save(name, check["version"])
+                return True, f"NPM版本: {check['version']}"
     
-    try:
-        # 尝试直接运行npm
-        result = subprocess.run(
-            ["npm", "--version"], 
-            capture_output=True, 
-            text=True, 
-            check=True,
-            shell=True  # 在Windows上使用shell
-        )
-        return True, f"NPM版本: {result.stdout.strip()}"
-        
-    except (subprocess.CalledProcessError, FileNotFoundError):
-        # 如果直接运行失败，尝试查找Node.js安装位置
-        found_paths = []
-        for path in possible_paths:
-            if os.path.exists(path):
-                found_paths.append(path)
-        
-        # 尝试使用完整路径运行npm
-        for path in found_paths:
-            npm_path = os.path.join(path, "npm.cmd")
-            if os.path.exists(npm_path):
-                try:
-                    result = subprocess.run(
-                        [npm_path, "--version"],
-                        capture_output=True,
-                        text=True,
-                        check=True
-                    )
-                    # 找到了npm，但PATH可能有问题
-                    return False, f"找到NPM (版本: {result.stdout.strip()})，但PATH配置有问题。\n\n请将以下路径添加到系统PATH环境变量：\n{path}\n\n或重启命令行工具后重试。"
-                except:
-                    continue
-        
-        # 检查Node.js是否安装
-        node_found = False
-        for path in found_paths:
-            node_path = os.path.join(path, "node.exe")
-            if os.path.exists(node_path):
-                node_found = True
-                break
-        
-        if node_found:
-            return False, f"检测到Node.js已安装，但NPM不可用。\n\n可能的解决方案：\n1. 重新安装Node.js\n2. 检查PATH环境变量\n3. 重启计算机\n\n找到的Node.js路径：\n{chr(10).join(found_paths)}"
-        else:
-            return False, "未检测到Node.js安装。\n\n请从官网下载并安装Node.js：\nhttps://nodejs.org/\n\n安装完成后重启应用程序。"
+    # 如果直接运行失败，并行检查各平台常见的Node.js安装位置
+    installations = discover_installations()
+    working = [item for item in installations if item["ok"]]
+    if working:
+        # 找到了npm，但PATH可能有问题
+        item = working[0]
+        return False, f"找到NPM (版本: {item['npm_version']['version']})，但PATH配置有问题。\n\n请将以下路径添加到系统PATH环境变量：\n{item['dir']}\n\n或重启命令行工具后重试。"
+    
+    found_paths = [item["dir"] for item in installations if item["node"]]
+    if found_paths:
+        return False, f"检测到Node.js已安装，但NPM不可用。\n\n可能的解决方案：\n1. 重新安装Node.js\n2. 检查PATH环境变量\n3. 重启计算机\n\n找到的Node.js路径：\n{chr(10).join(found_paths)}"
+    else:
+        return False, "未检测到Node.js安装。\n\n请从官网下载并安装Node.js：\nhttps://nodejs.org/\n\n安装完成后重启应用程序。"
 
 
 def main():
@@ -4,44 +4,115 @@
 """
 
 import sys
+from pathlib import Path
 from PySide6.QtWidgets import *
 from PySide6.QtCore import *
 from PySide6.QtGui import *
 from npm_manager import NPMRegistryManager
 from config_manager import ConfigManager
+from metrics import METRICS
+from rate_limit import RateLimiter
+from mirror_selection import MirrorSelector
+from scoring import ScoringEngine
+from connectivity import format_offline
+from registry_import import filter_existing, read_registry_file, validate_registries
 from ui_components import *
 
 
 class SpeedTestWorker(QThread):
     """速度测试工作线程"""
     
-    result_ready = Signal(str, bool, float)  # url, success, speed
+    result_ready = Signal(str, bool, float, object)  # url, success, speed, phases
     
-    def __init__(self, npm_manager, registries):
+    def __init__(self, npm_manager, registries, probe_each_address=False, compare_ip_families=True,
+                 quality_package=None, offline_check_timeout=0.2, range_budget=0):
         super().__init__()
         self.npm_manager = npm_manager
         self.registries = registries
+        self.probe_each_address = probe_each_address
+        self.compare_ip_families = compare_ip_families
+        self.quality_package = quality_package
+        self.offline_check_timeout = offline_check_timeout
+        self.range_budget = range_budget
+        self.connectivity = None
     
     def run(self):
-        """执行速度测试"""
+        """执行速度测试（离线时直接结束，不逐个等待超时）"""
+        self.connectivity = self.npm_manager.check_connectivity(list(self.registries.values()),
+                                                                self.offline_check_timeout)
+        if not self.connectivity["online"]:
+            return
+        self.npm_manager.begin_probe_run()
         for name, url in self.registries.items():
-            success, speed = self.npm_manager.test_registry_speed(url)
-            self.result_ready.emit(url, success, speed)
+            phases = self.npm_manager.test_registry_phases(url)
+            if phases.get("deferred"):
+                # 因限速推迟，不再进行附加测试
+                self.result_ready.emit(url, False, 0.0, phases)
+                continue
+            if self.probe_each_address and len(phases["addresses"]) > 1:
+                phases["per_address"] = self.npm_manager.test_registry_addresses(url)
+            if self.compare_ip_families:
+                phases["families"] = self.npm_manager.test_registry_families(url, known=phases)
+            success = phases["success"]
+            if success and self.quality_package:
+                quality = self.npm_manager.test_registry_quality(url, self.quality_package,
+                                                                 range_budget=self.range_budget)
+                phases["throughput"] = quality["throughput"]
+                phases["sync_lag"] = quality["sync_lag"]
+            speed = phases["total"] if success else 0.0
+            self.result_ready.emit(url, success, speed, phases)
+
+
+class ImportWorker(QThread):
+    """源验证工作线程：并发验证源的可访问性，不阻塞界面"""
+    
+    progress = Signal(int, int, str, bool)  # 已完成数, 总数, url, 是否可用
+    
+    def __init__(self, npm_manager, registries, timeout=5, workers=16):
+        super().__init__()
+        self.npm_manager = npm_manager
+        self.registries = registries
+        self.timeout = timeout
+        self.workers = workers
+        self.results = []
+    
+    def run(self):
+        """执行验证"""
+        self.results = validate_registries(
+            self.npm_manager, self.registries, timeout=self.timeout, workers=self.workers,
+            progress=lambda done, total, registry, valid: self.progress.emit(done, total, registry["url"], valid),
+            cancelled=self.isInterruptionRequested
+        )
 
 
 class MainWindow(QMainWindow):
     """主窗口类"""
     
-    def __init__(self):
+    def __init__(self, npm_manager=None, config_manager=None):
         super().__init__()
-        self.npm_manager = NPMRegistryManager()
-        self.config_manager = ConfigManager()
+        self.config_manager = config_manager or ConfigManager()
+        METRICS.configure(self.config_manager.get("metrics_enabled", False),
+                          self.config_manager.get("metrics_port", 0))
+        self.npm_manager = npm_manager or NPMRegistryManager(
+            cache_ttl=self.config_manager.get("cache_ttl", 300),
+            rate_limiter=RateLimiter.from_config(self.config_manager),
+            sync_package_managers=self.config_manager.get("sync_package_managers", True)
+        )
+        if self.config_manager.get("probe_trace_file"):
+            self.npm_manager.enable_trace(Path(self.config_manager.get("probe_trace_file")).expanduser())
         self.speed_test_worker = None
+        self.import_worker = None
+        self.import_progress = None
+        self.import_skipped = 0
+        self.deferred_before_test = 0
+        self.selection_report = None
+        self.scores = {}
         self.registry_cards = {}
         
         self.setup_ui()
         self.setup_connections()
         self.load_initial_data()
+        self.setup_config_watcher()
         self.restore_window_geometry()
     
     def setup_ui(self):
@@ -113,6 +184,14 @@ class MainWindow(QMainWindow):
         self.test_speed_btn.clicked.connect(self.test_all_speeds)
         toolbar_layout.addWidget(self.test_speed_btn)
         
+        self.profile_btn = ModernButton("时段分析")
+        self.profile_btn.clicked.connect(self.show_profile_dialog)
+        toolbar_layout.addWidget(self.profile_btn)
+        
+        self.fastest_btn = ModernButton("切换到最快源", primary=True)
+        self.fastest_btn.clicked.connect(self.switch_to_fastest)
+        toolbar_layout.addWidget(self.fastest_btn)
+        
         # 将工具栏添加到主布局
         self.centralWidget().layout().insertWidget(0, toolbar)
     
@@ -163,6 +242,16 @@ class MainWindow(QMainWindow):
         self.current_registry_label.setWordWrap(True)
         current_layout.addWidget(self.current_registry_label)
         
+        # 其他包管理器（yarn、pnpm、bun）的源是否与npm一致
+        self.package_managers_label = QLabel()
+        self.package_managers_label.setStyleSheet("font-size: 11px; color: #666666; border: none;")
+        self.package_managers_label.setWordWrap(True)
+        current_layout.addWidget(self.package_managers_label)
+        
+        self.sync_managers_btn = ModernButton("同步到其他包管理器")
+        self.sync_managers_btn.clicked.connect(self.sync_package_managers)
+        current_layout.addWidget(self.sync_managers_btn)
+        
         left_layout.addWidget(current_group)
         
         # 快速操作
@@ -194,6 +283,10 @@ class MainWindow(QMainWindow):
         self.add_custom_btn.clicked.connect(self.add_custom_registry)
         custom_layout.addWidget(self.add_custom_btn)
         
+        self.import_btn = ModernButton("批量导入...")
+        self.import_btn.clicked.connect(self.import_registries)
+        custom_layout.addWidget(self.import_btn)
+        
         quick_layout.addWidget(custom_frame)
         left_layout.addWidget(quick_group)
         
@@ -303,32 +396,66 @@ class MainWindow(QMainWindow):
             
         except Exception as e:
             self.current_registry_label.setText(f"获取信息失败: {str(e)}")
+        self.update_package_manager_status()
+    
+    def update_package_manager_status(self):
+        """更新其他包管理器的源同步状态"""
+        status = self.npm_manager.get_package_manager_status()
+        out_of_sync = [item for item in status if not item["in_sync"]]
+        if not status:
+            self.package_managers_label.setText("未检测到yarn、pnpm或bun")
+        elif out_of_sync:
+            lines = [f"{item['label']}: {item['effective'] or '读取配置失败'}" for item in out_of_sync]
+            self.package_managers_label.setText("与npm不一致:\n" + "\n".join(lines))
+        else:
+            self.package_managers_label.setText(
+                "已同步: " + "、".join(item["label"] for item in status))
+        self.package_managers_label.setStyleSheet(
+            f"font-size: 11px; color: {'#F44336' if out_of_sync else '#666666'}; border: none;")
+        self.package_managers_label.setToolTip("\n".join(str(item["path"]) for item in status))
+        self.sync_managers_btn.setVisible(bool(out_of_sync))
+    
+    def sync_package_managers(self):
+        """把npm当前源写入与之不一致的包管理器配置"""
+        results = self.npm_manager.sync_package_manager_registries()
+        failed = {name: error for name, error in results.items() if error}
+        self.update_package_manager_status()
+        if failed:
+            self.show_error_message("同步失败", "\n".join(f"{name}: {error}" for name, error in failed.items()))
+        else:
+            self.status_bar.set_status(f"已同步 {len(results)} 个包管理器的源", "success")
     
     def load_registry_list(self):
         """加载源列表"""
-        # 清空现有卡片
-        for card in self.registry_cards.values():
-            card.setParent(None)
+        # 清空现有卡片和弹性空间（卡片交给Qt延迟删除，不由Python直接析构）
+        while self.registry_layout.count():
+            item = self.registry_layout.takeAt(0)
+            if item.widget() is not None:
+                item.widget().deleteLater()
         self.registry_cards.clear()
         
         # 获取所有源
-        all_registries = self.npm_manager.CHINA_REGISTRIES.copy()
+        all_registries = self.get_all_registries()
         
-        # 添加自定义源
-        for custom in self.config_manager.get_custom_registries():
-            all_registries[custom["name"]] = custom["url"]
+        # 按综合评分排序（没有测试记录的源保持原顺序排在最后）
+        ranking = ScoringEngine.from_config(self.config_manager).rank(
+            all_registries, self.config_manager.history["speed_tests"]
+        )
+        self.scores = {item["url"]: item for item in ranking}
         
         # 创建源卡片
         current_url = self.npm_manager.current_registry
         
-        for name, url in all_registries.items():
+        for item in ranking:
+            name, url = item["name"], item["url"]
             is_current = (url == current_url)
             
             # 获取历史平均速度
             avg_speed = self.config_manager.get_average_speed(url)
             speed = avg_speed if avg_speed > 0 else None
             
-            card = RegistryCard(name, url, is_current, speed)
+            phases = self.config_manager.get_last_phases(url)
+            card = RegistryCard(name, url, is_current, speed, phases, self.get_card_notice(url), item)
             card.clicked.connect(self.switch_registry)
             
             self.registry_cards[url] = card
@@ -337,6 +464,68 @@ class MainWindow(QMainWindow):
         # 添加弹性空间
         self.registry_layout.addStretch()
     
+    def setup_config_watcher(self):
+        """监视.npmrc和其他包管理器的配置文件，外部修改后自动更新界面
+
+        只监视文件本身（监视用户目录会让其中任何文件的变化都触发重新解析）；
+        编辑器可能分几步写入，变化后等待一小段时间再统一处理。
+        """
+        self.config_watcher = QFileSystemWatcher(self)
+        self.config_watch_timer = QTimer(self)
+        self.config_watch_timer.setSingleShot(True)
+        self.config_watch_timer.setInterval(self.config_manager.get("config_watch_debounce", 300))
+        self.config_watch_timer.timeout.connect(self.on_config_files_changed)
+        self.config_watcher.fileChanged.connect(self.on_config_file_changed)
+        self.watch_config_files()
+    
+    def get_watched_config_files(self):
+        """需要监视的配置文件：npm的全局和用户级.npmrc，以及yarn、pnpm、bun的配置"""
+        files = self.npm_manager.get_npmrc_files()
+        files += [tool.path for tool in self.npm_manager.package_managers.tools]
+        return files
+    
+    def watch_config_files(self):
+        """把存在且尚未监视的配置文件加入监视"""
+        watched = set(self.config_watcher.files())
+        paths = []
+        for path in self.get_watched_config_files():
+            if path.exists() and str(path) not in watched and str(path) not in paths:
+                paths.append(str(path))
+        if paths:
+            self.config_watcher.addPaths(paths)
+    
+    def on_config_file_changed(self, path):
+        """配置文件变化：编辑器以替换方式保存时原文件会被移出监视，文件仍存在则立即重新加入"""
+        if path not in self.config_watcher.files() and Path(path).exists():
+            self.config_watcher.addPath(path)
+        self.config_watch_timer.start()
+    
+    def on_config_files_changed(self):
+        """配置文件变化后直接解析文件更新当前源，只更新受影响的卡片"""
+        self.watch_config_files()
+        try:
+            registry = self.npm_manager.read_configured_registry()
+        except Exception as e:
+            self.status_bar.set_status(f"读取npm配置失败: {str(e)}", "error")
+            return
+        
+        if registry != self.npm_manager.current_registry:
+            self.npm_manager.current_registry = registry
+            self.npm_manager.refresh_network_settings()
+            self.update_current_registry_info()
+            for url, card in self.registry_cards.items():
+                card.set_current(url == registry)
+            name = self.npm_manager.get_registry_name(registry)
+            self.status_bar.set_current_registry(name)
+            self.status_bar.set_status(f"检测到npm配置被外部修改，当前源: {name}", "info")
+        else:
+            self.update_package_manager_status()
+    
+    def get_card_notice(self, url):
+        """获取源卡片上显示的提示（如IPv4/IPv6路径建议）"""
+        recommendation = self.config_manager.get_family_recommendation(url)
+        return recommendation["message"] if recommendation else None
+    
     def switch_registry(self, registry_url):
         """切换源"""
         try:
@@ -368,6 +557,41 @@ class MainWindow(QMainWindow):
             self.show_error_message("切换失败", str(e))
             self.status_bar.set_status(f"切换失败: {str(e)}", "error")
     
+    def get_all_registries(self):
+        """获取预置源和自定义源"""
+        all_registries = self.npm_manager.CHINA_REGISTRIES.copy()
+        for custom in self.config_manager.get_custom_registries():
+            all_registries[custom["name"]] = custom["url"]
+        return all_registries
+    
+    def show_profile_dialog(self):
+        """显示各源的周内时段热力图"""
+        profiles = {
+            name: self.config_manager.get_hourly_profile(url)
+            for name, url in self.get_all_registries().items()
+        }
+        ProfileDialog(profiles, self.config_manager.get_week_slot(), self).exec()
+    
+    def switch_to_fastest(self):
+        """不测速直接切换到综合评分最高的源（最近的测速结果优先，其次为当前时段的历史统计）"""
+        registries = self.get_all_registries()
+        choice = self.config_manager.get_fastest_registry(list(registries.values()))
+        if choice is None:
+            self.show_warning_message("无法选择", "没有最近的测速结果或当前时段的历史统计，请先测试速度")
+            return
+        
+        source = "最近测速" if choice["source"] == "fresh" else "当前时段历史统计"
+        if choice["url"] == self.npm_manager.current_registry:
+            self.status_bar.set_status(f"当前源已是评分最高的源（依据{source}）", "success")
+            return
+        self.switch_registry(choice["url"])
+        if self.npm_manager.current_registry == choice["url"]:
+            self.status_bar.set_status(
+                f"已切换到 {self.npm_manager.get_registry_name(choice['url'])}"
+                f"（依据{source}，评分{choice['score']}，约{choice['speed']}ms）",
+                "success"
+            )
+    
     def test_all_speeds(self):
         """测试所有源的速度"""
         if self.speed_test_worker and self.speed_test_worker.isRunning():
@@ -375,23 +599,39 @@ class MainWindow(QMainWindow):
         
         self.test_speed_btn.setEnabled(False)
         self.loading_spinner.start()
-        self.status_bar.set_status("正在测试源速度...", "info")
+        self.deferred_before_test = self.npm_manager.get_rate_limit_stats()["deferred"]
         
         # 获取所有源
-        all_registries = self.npm_manager.CHINA_REGISTRIES.copy()
-        for custom in self.config_manager.get_custom_registries():
-            all_registries[custom["name"]] = custom["url"]
+        all_registries = self.get_all_registries()
+        
+        # 按探测策略选出本轮需要测试的源
+        selector = MirrorSelector.from_config(self.config_manager)
+        urls = list(all_registries.values())
+        selected = selector.select(urls)
+        self.selection_report = selector.expected_regret(urls, selected)
+        registries = {name: url for name, url in all_registries.items() if url in selected}
+        self.status_bar.set_status(f"正在测试源速度 ({len(registries)}/{len(all_registries)})...", "info")
         
         # 启动速度测试线程
-        self.speed_test_worker = SpeedTestWorker(self.npm_manager, all_registries)
+        self.speed_test_worker = SpeedTestWorker(
+            self.npm_manager, registries,
+            probe_each_address=self.config_manager.get("probe_each_address", False),
+            compare_ip_families=self.config_manager.get("compare_ip_families", True),
+            quality_package=(self.config_manager.get("quality_package", "lodash")
+                             if self.config_manager.get("measure_quality", True) else None),
+            offline_check_timeout=self.config_manager.get("offline_check_timeout", 0.2),
+            range_budget=self.config_manager.get_range_budget()
+        )
         self.speed_test_worker.result_ready.connect(self.on_speed_test_result)
         self.speed_test_worker.finished.connect(self.on_speed_test_finished)
         self.speed_test_worker.start()
     
-    def on_speed_test_result(self, url, success, speed):
+    def on_speed_test_result(self, url, success, speed, phases):
         """处理速度测试结果"""
         # 记录测试结果
-        self.config_manager.record_speed_test(url, speed, success)
+        self.config_manager.record_speed_test(url, speed, success, phases)
+        if phases.get("families"):
+            self.config_manager.record_family_test(url, phases["families"])
         
         # 更新对应的卡片
         if url in self.registry_cards:
@@ -411,13 +651,14 @@ class MainWindow(QMainWindow):
             
             if name:
                 is_current = (url == self.npm_manager.current_registry)
-                new_card = RegistryCard(name, url, is_current, speed if success else 0)
+                new_card = RegistryCard(name, url, is_current, speed if success else 0, phases,
+                                        self.get_card_notice(url), self.scores.get(url))
                 new_card.clicked.connect(self.switch_registry)
                 
                 # 替换旧卡片
                 old_index = self.registry_layout.indexOf(card)
                 self.registry_layout.removeWidget(card)
-                card.setParent(None)
+                card.deleteLater()
                 self.registry_layout.insertWidget(old_index, new_card)
                 self.registry_cards[url] = new_card
     
@@ -425,12 +666,28 @@ class MainWindow(QMainWindow):
         """速度测试完成"""
         self.test_speed_btn.setEnabled(True)
         self.loading_spinner.stop()
-        self.status_bar.set_status("速度测试完成", "success")
+        # 按新的测试结果重新评分排序（离线时为已有记录的排名）
+        self.load_registry_list()
+        connectivity = self.speed_test_worker.connectivity
+        if connectivity is not None and not connectivity["online"]:
+            self.status_bar.set_status(f"{format_offline(connectivity)}，已跳过测速，显示已有记录的排名", "warning")
+            return
+        deferred = self.npm_manager.get_rate_limit_stats()["deferred"] - self.deferred_before_test
+        report = self.selection_report
+        saved = ""
+        if report and report["probes_saved"]:
+            saved = f"，跳过 {report['probes_saved']} 个源（预计遗憾 {report['regret_ms']}ms）"
+        if deferred:
+            self.status_bar.set_status(f"速度测试完成{saved}，{deferred} 次探测因限速推迟", "warning")
+        else:
+            self.status_bar.set_status(f"速度测试完成{saved}", "success")
+        self.export_metrics()
     
     def refresh_data(self):
         """刷新数据"""
         try:
             self.npm_manager.current_registry = self.npm_manager.get_current_registry()
+            self.npm_manager.refresh_network_settings()
             self.load_initial_data()
         except Exception as e:
             self.show_error_message("刷新失败", str(e))
@@ -450,7 +707,7 @@ class MainWindow(QMainWindow):
             self.show_error_message("重置失败", str(e))
     
     def add_custom_registry(self):
-        """添加自定义源"""
+        """添加自定义源（在后台验证可访问性）"""
         name = self.custom_name_input.text().strip()
         url = self.custom_url_input.text().strip()
         
@@ -458,18 +715,105 @@ class MainWindow(QMainWindow):
             self.show_warning_message("输入错误", "请填写完整的源名称和URL")
             return
         
-        if not self.npm_manager.validate_registry_url(url):
+        if not url.startswith(('http://', 'https://')):
             self.show_warning_message("URL错误", "请输入有效的源URL")
             return
         
-        if self.config_manager.add_custom_registry(name, url):
-            self.custom_name_input.clear()
-            self.custom_url_input.clear()
-            self.load_registry_list()
-            self.show_success_message("添加成功", f"自定义源 '{name}' 已添加")
-        else:
-            self.show_warning_message("添加失败", "源名称或URL已存在")
+        if not url.endswith('/'):
+            url += '/'
+        self.start_import([{"name": name, "url": url}], show_progress=False)
+    
+    def import_registries(self):
+        """从文件批量导入源（纯文本、JSON或nrm的registries.json）"""
+        path, _ = QFileDialog.getOpenFileName(
+            self, "导入源列表", str(Path.home()), "源列表 (*.txt *.json *.npmrc);;所有文件 (*)"
+        )
+        if not path:
+            return
+        try:
+            registries, invalid = read_registry_file(Path(path))
+        except Exception as e:
+            self.show_error_message("导入失败", str(e))
+            return
+        
+        registries, duplicates = filter_existing(registries, self.get_all_registries())
+        if not registries:
+            self.show_info_message("导入源", f"没有需要导入的新源（{len(duplicates)} 个已存在，{len(invalid)} 个无效）")
+            return
+        self.import_skipped = len(duplicates) + len(invalid)
+        self.start_import(registries, show_progress=True)
     
+    def start_import(self, registries, show_progress):
+        """启动后台验证，完成后一次性写入配置"""
+        if self.import_worker and self.import_worker.isRunning():
+            self.show_warning_message("正在验证", "上一批源仍在验证中，请稍候")
+            return
+        
+        self.add_custom_btn.setEnabled(False)
+        self.import_btn.setEnabled(False)
+        self.status_bar.set_status(f"正在验证 {len(registries)} 个源...", "info")
+        if not show_progress:
+            self.import_skipped = 0
+        
+        self.import_worker = ImportWorker(
+            self.npm_manager, registries,
+            timeout=self.config_manager.get("import_timeout", 5),
+            workers=self.config_manager.get("import_workers", 16)
+        )
+        if show_progress:
+            self.import_progress = QProgressDialog("正在验证源...", "取消", 0, len(registries), self)
+            self.import_progress.setWindowTitle("导入源")
+            self.import_progress.setWindowModality(Qt.WindowModal)
+            self.import_progress.setMinimumDuration(0)
+            self.import_progress.canceled.connect(self.import_worker.requestInterruption)
+        self.import_worker.progress.connect(self.on_import_progress)
+        self.import_worker.finished.connect(self.on_import_finished)
+        self.import_worker.start()
+    
+    def on_import_progress(self, done, total, url, valid):
+        """更新验证进度"""
+        # 模态进度框的setValue会处理事件，验证可能在其中完成并关闭进度框
+        dialog = self.import_progress
+        if dialog is not None:
+            dialog.setLabelText(f"{'✓' if valid else '✗'} {url}\n{done}/{total}")
+            dialog.setValue(done)
+    
+    def on_import_finished(self):
+        """验证完成，把可用的源一次性写入配置"""
+        results = self.import_worker.results
+        batch = self.import_progress is not None
+        if batch:
+            self.import_progress.close()
+            self.import_progress.deleteLater()
+            self.import_progress = None
+        self.add_custom_btn.setEnabled(True)
+        self.import_btn.setEnabled(True)
+        
+        valid = [result for result in results if result["valid"]]
+        added = self.config_manager.add_custom_registries(valid)
+        if added:
+            self.load_registry_list()
+        
+        if not batch:
+            self.status_bar.set_status("就绪", "success")
+            if not valid:
+                self.show_warning_message("URL错误", "源无法访问，请检查URL")
+            elif added:
+                self.custom_name_input.clear()
+                self.custom_url_input.clear()
+                self.show_success_message("添加成功", f"自定义源 '{added[0]['name']}' 已添加")
+            else:
+                self.show_warning_message("添加失败", "源名称或URL已存在")
+            return
+        
+        cancelled = sum(1 for result in results if result["valid"] is None)
+        message = f"已导入 {len(added)} 个源，{len(results) - len(valid) - cancelled} 个无法访问"
+        if cancelled:
+            message += f"，{cancelled} 个因取消未验证"
+        if self.import_skipped:
+            message += f"，跳过 {self.import_skipped} 个已存在或无效的源"
+        self.status_bar.set_status(message, "success" if added else "warning")
+        self.show_info_message("导入完成", message)
     
     def show_success_message(self, title, message):
         """显示成功消息"""
@@ -487,6 +831,12 @@ class MainWindow(QMainWindow):
         """显示信息消息"""
         QMessageBox.information(self, title, message)
     
+    def export_metrics(self):
+        """把性能指标写入配置的OpenMetrics文件"""
+        metrics_file = self.config_manager.get("metrics_file")
+        if METRICS.enabled and metrics_file:
+            METRICS.write(Path(metrics_file).expanduser())
+    
     def restore_window_geometry(self):
         """恢复窗口几何信息"""
         geometry = self.config_manager.get_window_geometry()
@@ -509,5 +859,10 @@ class MainWindow(QMainWindow):
         if self.speed_test_worker and self.speed_test_worker.isRunning():
             self.speed_test_worker.terminate()
             self.speed_test_worker.wait()
+        if self.import_worker and self.import_worker.isRunning():
+            self.import_worker.requestInterruption()
+            self.import_worker.wait()
         
+        self.npm_manager.disable_trace()
+        self.export_metrics()
         event.accept()
@@ -0,0 +1,259 @@
+"""
+性能指标模块
+记录测速、源信息获取、切换源和npm子进程调用的耗时直方图与计数，
+以OpenMetrics文本格式导出到文件或本地 /metrics 端点。未启用时开销接近于零。
+"""
+
+import threading
+import time
+import weakref
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+
+# 耗时直方图的桶边界（秒）
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# 指标说明
+METRIC_HELP = {
+    "npm_registry_probe_duration_seconds": "Registry probe duration",
+    "npm_registry_info_duration_seconds": "Registry info lookup duration",
+    "npm_registry_set_duration_seconds": "Registry switch duration",
+    "npm_registry_npm_command_duration_seconds": "npm subprocess duration"
+}
+
+
+def _escape(value: str) -> str:
+    """转义标签值"""
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: Tuple[Tuple[str, str], ...], extra: Optional[Tuple[str, str]] = None) -> str:
+    """格式化标签集合"""
+    items = list(labels) + ([extra] if extra else [])
+    if not items:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in items) + "}"
+
+
+class _Histogram:
+    """单个标签组合的直方图"""
+
+    __slots__ = ("counts", "total", "count")
+
+    def __init__(self, bucket_count: int):
+        self.counts = [0] * bucket_count
+        self.total = 0.0
+        self.count = 0
+
+
+class _NullSpan:
+    """未启用指标时返回的空计时器"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def set_outcome(self, outcome: str) -> None:
+        pass
+
+
+NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    """计时器：退出时把耗时和结果写入直方图，发生异常时结果记为error"""
+
+    __slots__ = ("registry", "name", "labels", "outcome", "start")
+
+    def __init__(self, registry: "MetricsRegistry", name: str, labels: Dict[str, str]):
+        self.registry = registry
+        self.name = name
+        self.labels = labels
+        self.outcome = "success"
+        self.start = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self.outcome = "error"
+        self.registry.observe(self.name, time.perf_counter() - self.start,
+                              outcome=self.outcome, **self.labels)
+        return False
+
+    def set_outcome(self, outcome: str) -> None:
+        """设置结果标签（success/failure/error等）"""
+        self.outcome = outcome
+
+
+class MetricsRegistry:
+    """指标注册表"""
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.enabled = False
+        self.buckets = buckets
+        self._histograms: Dict[str, Dict[Tuple, _Histogram]] = {}
+        self._counters: Dict[str, Dict[Tuple, float]] = {}
+        self._gauge_callbacks: Dict[object, Callable[[], Optional[Callable]]] = {}
+        self._lock = threading.Lock()
+        self._server = None
+
+    def span(self, name: str, **labels) -> object:
+        """返回计时上下文管理器；未启用时返回共享的空计时器"""
+        if not self.enabled:
+            return NULL_SPAN
+        return _Span(self, name, labels)
+
+    def observe(self, name: str, seconds: float, **labels) -> None:
+        """记录一次耗时"""
+        if not self.enabled:
+            return
+        key = tuple(sorted((k, str(v)) for k, v in labels.items()))
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            histogram = series.get(key)
+            if histogram is None:
+                histogram = series[key] = _Histogram(len(self.buckets))
+            for index, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    histogram.counts[index] += 1
+                    break
+            histogram.total += seconds
+            histogram.count += 1
+
+    def inc(self, name: str, value: float = 1, **labels) -> None:
+        """计数器加一"""
+        if not self.enabled:
+            return
+        key = tuple(sorted((k, str(v)) for k, v in labels.items()))
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def add_gauge_callback(self, callback: Callable[[], Dict[str, Dict[Tuple, float]]],
+                           key: Optional[object] = None) -> None:
+        """注册导出时才计算的仪表值，回调返回 {指标名: {标签元组: 值}}
+
+        同一key只保留最后注册的回调（默认以回调本身为key，重复注册不会重复导出）；
+        绑定方法只保存弱引用，所属对象被回收后自动注销。
+        """
+        if hasattr(callback, "__self__") and hasattr(callback, "__func__"):
+            reference = weakref.WeakMethod(callback)
+        else:
+            reference = lambda: callback
+        with self._lock:
+            self._gauge_callbacks[callback if key is None else key] = reference
+
+    def reset(self) -> None:
+        """清空已记录的数据"""
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+
+    def render(self) -> str:
+        """以OpenMetrics文本格式导出全部指标"""
+        lines = []
+        with self._lock:
+            for name, series in sorted(self._histograms.items()):
+                lines.append(f"# TYPE {name} histogram")
+                lines.append(f"# HELP {name} {METRIC_HELP.get(name, name)}")
+                for labels, histogram in sorted(series.items()):
+                    cumulative = 0
+                    for bound, count in zip(self.buckets, histogram.counts):
+                        cumulative += count
+                        lines.append(f"{name}_bucket{_format_labels(labels, ('le', str(bound)))} {cumulative}")
+                    lines.append(f"{name}_bucket{_format_labels(labels, ('le', '+Inf'))} {histogram.count}")
+                    lines.append(f"{name}_count{_format_labels(labels)} {histogram.count}")
+                    lines.append(f"{name}_sum{_format_labels(labels)} {round(histogram.total, 6)}")
+
+            for name, series in sorted(self._counters.items()):
+                lines.append(f"# TYPE {name} counter")
+                for labels, value in sorted(series.items()):
+                    lines.append(f"{name}_total{_format_labels(labels)} {value}")
+
+            callbacks = list(self._gauge_callbacks.items())
+
+        # 多个回调可能导出同一指标，合并后每个指标只输出一次类型说明
+        gauges: Dict[str, Dict[Tuple, float]] = {}
+        for key, reference in callbacks:
+            callback = reference()
+            if callback is None:
+                with self._lock:
+                    if self._gauge_callbacks.get(key) is reference:
+                        del self._gauge_callbacks[key]
+                continue
+            try:
+                for name, series in callback().items():
+                    gauges.setdefault(name, {}).update(series)
+            except Exception as e:
+                print(f"收集指标失败: {e}")
+        for name, series in sorted(gauges.items()):
+            lines.append(f"# TYPE {name} gauge")
+            for labels, value in sorted(series.items()):
+                lines.append(f"{name}{_format_labels(labels)} {value}")
+
+        lines.append("# EOF")
+        return "\n".join(lines) + "\n"
+
+    def write(self, path: Path) -> bool:
+        """把指标写入文件（先写临时文件再替换，避免采集端读到半个文件）"""
+        path = Path(path)
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            temp_path = path.with_suffix(path.suffix + ".tmp")
+            temp_path.write_text(self.render(), encoding="utf-8")
+            temp_path.replace(path)
+            return True
+        except OSError as e:
+            print(f"写入指标文件失败: {e}")
+            return False
+
+    def serve(self, port: int, host: str = "127.0.0.1") -> int:
+        """在后台线程中提供 /metrics 端点，返回实际监听的端口"""
+        registry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = registry.render().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/openmetrics-text; version=1.0.0; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self._server.server_address[1]
+
+    def stop_server(self) -> None:
+        """停止 /metrics 端点"""
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def configure(self, enabled: bool, port: int = 0) -> None:
+        """按配置启用指标，port非0时同时启动 /metrics 端点"""
+        self.enabled = enabled
+        if enabled and port and self._server is None:
+            try:
+                self.serve(port)
+            except OSError as e:
+                print(f"启动指标端点失败: {e}")
+
+
+# 全局指标注册表
+METRICS = MetricsRegistry()
@@ -0,0 +1,153 @@
+"""
+选源探测策略模块
+根据历史测速记录（多臂老虎机模型）决定每轮测试哪些源：
+集中测试可能最快的源，同时保留对其他源的探索，并估计相比测试全部源的预期遗憾值
+"""
+
+import math
+import random
+import statistics
+from typing import Dict, List, Optional
+
+
+# 可选的探测策略
+STRATEGIES = ("all", "thompson", "ucb")
+
+# 只有一条成功记录时假设的相对标准差
+DEFAULT_RELATIVE_STD = 0.3
+
+
+class MirrorSelector:
+    """基于历史测速记录的选源探测策略
+
+    speed_tests为 {URL: [{"speed": 毫秒, "success": bool}, ...]}（即ConfigManager的历史记录格式）。
+    失败按penalty_ms计算耗时，没有历史记录的源每轮都会被测试。
+    """
+
+    def __init__(self, speed_tests: Dict[str, List[Dict]], strategy: str = "thompson",
+                 probes_per_round: int = 3, penalty_ms: float = 5000.0,
+                 exploration: float = 1.0, seed: Optional[int] = None):
+        if strategy not in STRATEGIES:
+            raise ValueError(f"未知的探测策略: {strategy}")
+        self.speed_tests = speed_tests
+        self.strategy = strategy
+        self.probes_per_round = probes_per_round
+        self.penalty_ms = penalty_ms
+        self.exploration = exploration
+        self._random = random.Random(seed)
+
+    @classmethod
+    def from_config(cls, config_manager, strategy: Optional[str] = None) -> "MirrorSelector":
+        """按配置创建选源策略，失败按测试超时时间计算耗时"""
+        return cls(config_manager.history["speed_tests"],
+                   strategy=strategy or config_manager.get("probe_strategy", "all"),
+                   probes_per_round=config_manager.get("probes_per_round", 3),
+                   penalty_ms=config_manager.get("test_timeout", 5) * 1000)
+
+    def posterior(self, url: str) -> Dict:
+        """源的耗时分布估计：成功耗时的均值/标准差和失败次数"""
+        tests = self.speed_tests.get(url, [])
+        speeds = [t["speed"] for t in tests if t["success"] and t["speed"] > 0]
+        failures = len(tests) - len(speeds)
+        if speeds:
+            mean = statistics.mean(speeds)
+            std = statistics.stdev(speeds) if len(speeds) > 1 else mean * DEFAULT_RELATIVE_STD
+        else:
+            mean, std = self.penalty_ms, 0.0
+        return {"samples": len(tests), "successes": len(speeds), "failures": failures,
+                "mean": mean, "std": max(std, 1.0)}
+
+    def expected_cost(self, url: str) -> float:
+        """考虑失败率后的平均耗时"""
+        post = self.posterior(url)
+        if not post["samples"]:
+            return self.penalty_ms
+        failure_rate = post["failures"] / post["samples"]
+        return (1 - failure_rate) * post["mean"] + failure_rate * self.penalty_ms
+
+    def sample_cost(self, url: str) -> float:
+        """从后验分布中抽取一次耗时（Thompson采样）"""
+        post = self.posterior(url)
+        failure_rate = self._random.betavariate(post["failures"] + 1, post["successes"] + 1)
+        if not post["successes"] or self._random.random() < failure_rate:
+            return self.penalty_ms
+        # 均值的不确定性随样本数减小
+        return max(self._random.gauss(post["mean"], post["std"] / math.sqrt(post["successes"])), 0.0)
+
+    def _lower_bound(self, url: str, total_samples: int) -> float:
+        """耗时的乐观估计（UCB的最小化版本：均值减去置信半径）"""
+        post = self.posterior(url)
+        radius = self.exploration * post["std"] * math.sqrt(2 * math.log(max(total_samples, 2)) / post["samples"])
+        return self.expected_cost(url) - radius
+
+    def select(self, urls: List[str]) -> List[str]:
+        """选出本轮需要测试的源（保持原顺序）"""
+        if self.strategy == "all" or len(urls) <= self.probes_per_round:
+            return list(urls)
+
+        unexplored = [url for url in urls if not self.speed_tests.get(url)]
+        explored = [url for url in urls if self.speed_tests.get(url)]
+        slots = max(self.probes_per_round - len(unexplored), 0)
+
+        if self.strategy == "thompson":
+            scores = {url: self.sample_cost(url) for url in explored}
+        else:
+            total = sum(len(self.speed_tests[url]) for url in explored)
+            scores = {url: self._lower_bound(url, total) for url in explored}
+
+        chosen = set(unexplored) | set(sorted(explored, key=scores.get)[:slots])
+        return [url for url in urls if url in chosen]
+
+    def expected_regret(self, urls: List[str], selected: List[str], rounds: int = 500) -> Dict:
+        """蒙特卡洛估计只测试selected相比测试全部源的预期遗憾值（毫秒）
+
+        每次从各源的后验分布中抽取一组耗时，比较selected中最快的与全部源中最快的差距。
+        """
+        if not urls or set(selected) >= set(urls):
+            return {"regret_ms": 0.0, "probes_saved": 0, "probes": len(urls)}
+        regret = 0.0
+        for _ in range(rounds):
+            costs = {url: self.sample_cost(url) for url in urls}
+            best_selected = min((costs[url] for url in selected), default=self.penalty_ms)
+            regret += best_selected - min(costs.values())
+        return {
+            "regret_ms": round(regret / rounds, 2),
+            "probes_saved": len(urls) - len(selected),
+            "probes": len(selected)
+        }
+
+
+def simulate_selection(runs: Dict, strategy: str = "thompson", probes_per_round: int = 3,
+                       penalty_ms: float = 5000.0, seed: Optional[int] = 0) -> Dict:
+    """在轨迹上评估探测策略（runs为probe_trace.TraceReplayer.runs）
+
+    每轮只"测试"策略选中的源，在选中的源里选最快的，并与本轮真实最快的源比较；
+    选中源的结果加入模拟历史，供后续轮次使用。
+    """
+    history: Dict[str, List[Dict]] = {}
+    summary = {"runs": 0, "probes": 0, "probes_all": 0, "regret_ms": 0.0}
+    for records in runs.values():
+        results = {record["url"]: record for record in records}
+        urls = list(results)
+        selector = MirrorSelector(history, strategy, probes_per_round, penalty_ms, seed=seed)
+        selected = selector.select(urls)
+
+        costs = {url: (r["total"] if r.get("ok") and r.get("total") is not None else penalty_ms)
+                 for url, r in results.items()}
+        summary["regret_ms"] += min(costs[url] for url in selected) - min(costs.values())
+        summary["probes"] += len(selected)
+        summary["probes_all"] += len(urls)
+        summary["runs"] += 1
+
+        for url in selected:
+            r = results[url]
+            tests = history.setdefault(url, [])
+            tests.append({"speed": r.get("total") or 0.0, "success": bool(r.get("ok"))})
+            del tests[:-10]
+        if seed is not None:
+            seed += 1
+
+    summary["regret_ms"] = round(summary["regret_ms"], 2)
+    if summary["runs"]:
+        summary["avg_regret_ms"] = round(summary["regret_ms"] / summary["runs"], 2)
+    return summary
@@ -0,0 +1,448 @@
+"""
+网络探测模块
+在socket/ssl层面分阶段测量源的访问耗时：DNS解析、TCP连接、TLS握手、首字节时间、传输
+"""
+
+import base64
+import os
+import socket
+import ssl
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import unquote, urljoin, urlsplit
+
+from rate_limit import parse_retry_after
+
+
+# 各阶段的显示名称
+PHASE_LABELS = {
+    "dns": "DNS解析",
+    "connect": "TCP连接",
+    "tls": "TLS握手",
+    "ttfb": "首字节",
+    "transfer": "传输"
+}
+
+# 跟随重定向的最大次数
+MAX_REDIRECTS = 5
+
+# 需要跟随Location的重定向状态码
+REDIRECT_STATUSES = (301, 302, 303, 307, 308)
+
+# 地址族名称
+FAMILY_NAMES = {
+    socket.AF_INET: "ipv4",
+    socket.AF_INET6: "ipv6"
+}
+
+
+def _elapsed_ms(start: float, end: float) -> float:
+    """计算两个时间点之间的毫秒数"""
+    return round((end - start) * 1000, 2)
+
+
+def _header_value(response: bytes, name: str) -> Optional[str]:
+    """从响应的首个数据块中读取响应头的值"""
+    head = response.split(b"\r\n\r\n", 1)[0].decode("latin-1")
+    for line in head.split("\r\n")[1:]:
+        key, _, value = line.partition(":")
+        if key.strip().lower() == name.lower():
+            return value.strip()
+    return None
+
+
+class DNSCache:
+    """DNS解析缓存
+
+    一次测试中每个主机只解析一次，记录返回的全部A/AAAA地址和解析耗时。
+    """
+
+    def __init__(self):
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def resolve(self, host: str, port: int) -> Tuple[List[Tuple], float, bool]:
+        """解析主机，返回(地址列表, 解析耗时毫秒, 是否命中缓存)
+
+        地址列表的元素为 (family, sockaddr)，解析失败时抛出 socket.gaierror。
+        """
+        key = (host, port)
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is not None:
+            return entry["addresses"], entry["resolve_ms"], True
+
+        start = time.perf_counter()
+        infos = socket.getaddrinfo(host, port, 0, socket.SOCK_STREAM)
+        resolve_ms = _elapsed_ms(start, time.perf_counter())
+
+        addresses = []
+        for family, _, _, _, sockaddr in infos:
+            if (family, sockaddr) not in addresses:
+                addresses.append((family, sockaddr))
+
+        with self._lock:
+            self._entries[key] = {"addresses": addresses, "resolve_ms": resolve_ms}
+        return addresses, resolve_ms, False
+
+    def get_addresses(self, host: str) -> List[str]:
+        """获取已解析主机的全部地址"""
+        with self._lock:
+            return [
+                sockaddr[0]
+                for (entry_host, _), entry in self._entries.items() if entry_host == host
+                for _, sockaddr in entry["addresses"]
+            ]
+
+    def clear(self) -> None:
+        """清空缓存（每轮测试开始时调用）"""
+        with self._lock:
+            self._entries.clear()
+
+
+def _config_bool(value, default: bool = True) -> bool:
+    """解析npm配置中的布尔值（可能是布尔或字符串）"""
+    if value is None:
+        return default
+    if isinstance(value, str):
+        return value.strip().lower() not in ("false", "0", "no", "")
+    return bool(value)
+
+
+def _normalize_proxy(proxy: Optional[str]) -> Optional[str]:
+    """补全代理地址的协议前缀"""
+    if not proxy:
+        return None
+    return proxy if "://" in proxy else f"http://{proxy}"
+
+
+def parse_network_settings(npm_config: Dict, environ: Optional[Dict] = None) -> Dict:
+    """从npm有效配置中提取与网络路径相关的设置
+
+    npm未配置代理时与npm一样回退到HTTP(S)_PROXY/NO_PROXY环境变量。
+    """
+    environ = os.environ if environ is None else environ
+
+    def env(*names):
+        for name in names:
+            if environ.get(name):
+                return environ[name]
+        return None
+
+    proxy = _normalize_proxy(npm_config.get("proxy") or env("HTTP_PROXY", "http_proxy"))
+    https_proxy = _normalize_proxy(npm_config.get("https-proxy") or env("HTTPS_PROXY", "https_proxy")) or proxy
+
+    noproxy = npm_config.get("noproxy") or env("NO_PROXY", "no_proxy") or []
+    if isinstance(noproxy, str):
+        noproxy = noproxy.split(",")
+    noproxy = [item.strip() for item in noproxy if item and item.strip()]
+
+    ca = npm_config.get("ca")
+    if isinstance(ca, list):
+        ca = "\n".join(ca)
+
+    return {
+        "proxy": proxy,
+        "https_proxy": https_proxy,
+        "noproxy": noproxy,
+        "cafile": npm_config.get("cafile") or None,
+        "ca": ca or None,
+        "strict_ssl": _config_bool(npm_config.get("strict-ssl"), True)
+    }
+
+
+def proxy_for_url(url: str, settings: Optional[Dict]) -> Optional[str]:
+    """根据npm的proxy/https-proxy/noproxy设置，返回访问该URL应使用的代理"""
+    if not settings:
+        return None
+
+    parsed = urlsplit(url)
+    host = (parsed.hostname or "").lower()
+    for pattern in settings.get("noproxy") or []:
+        pattern = pattern.lower()
+        if pattern == "*":
+            return None
+        domain = pattern.lstrip("*").lstrip(".")
+        if host == domain or host.endswith("." + domain):
+            return None
+
+    if parsed.scheme == "https":
+        return settings.get("https_proxy")
+    return settings.get("proxy")
+
+
+def make_ssl_context(settings: Optional[Dict] = None) -> ssl.SSLContext:
+    """按npm的cafile/ca/strict-ssl设置创建SSL上下文
+
+    与npm一样，配置了cafile或ca时只信任其中的证书，不再加载系统默认证书。
+    """
+    settings = settings or {}
+    if not settings.get("strict_ssl", True):
+        context = ssl.create_default_context()
+        context.check_hostname = False
+        context.verify_mode = ssl.CERT_NONE
+    elif settings.get("cafile"):
+        context = ssl.create_default_context(cafile=settings["cafile"])
+    elif settings.get("ca"):
+        context = ssl.create_default_context(cadata=settings["ca"])
+    else:
+        context = ssl.create_default_context()
+    return context
+
+
+def _proxy_auth_header(proxy: str) -> str:
+    """生成代理认证请求头（代理URL中带用户名密码时）"""
+    parsed = urlsplit(proxy)
+    if not parsed.username:
+        return ""
+    credentials = f"{unquote(parsed.username)}:{unquote(parsed.password or '')}"
+    token = base64.b64encode(credentials.encode("utf-8")).decode("ascii")
+    return f"Proxy-Authorization: Basic {token}\r\n"
+
+
+def _open_tunnel(sock: socket.socket, host: str, port: int, proxy: str) -> None:
+    """通过HTTP代理建立CONNECT隧道"""
+    request = (
+        f"CONNECT {host}:{port} HTTP/1.1\r\n"
+        f"Host: {host}:{port}\r\n"
+        f"{_proxy_auth_header(proxy)}\r\n"
+    )
+    sock.sendall(request.encode("ascii"))
+
+    response = b""
+    while b"\r\n\r\n" not in response:
+        chunk = sock.recv(4096)
+        if not chunk:
+            break
+        response += chunk
+    status_line = response.split(b"\r\n", 1)[0].decode("latin-1")
+    parts = status_line.split()
+    if len(parts) < 2 or parts[1] != "200":
+        raise ConnectionError(f"代理隧道建立失败: {status_line or '无响应'}")
+
+
+def empty_phases(proxy: bool = False) -> Dict:
+    """尚未完成任何阶段的探测结果"""
+    return {
+        "success": False,
+        "status": None,
+        "address": None,
+        "family": None,
+        "addresses": [],
+        "dns_cached": False,
+        "dns": None,
+        "connect": None,
+        "tls": None,
+        "ttfb": None,
+        "transfer": None,
+        "total": None,
+        "bytes": 0,
+        "proxy": proxy,
+        "retry_after": None,
+        "redirects": [],
+        "error": None
+    }
+
+
+def probe_phases(url: str, timeout: float = 5, max_bytes: int = 1024 * 1024,
+                 dns_cache: Optional[DNSCache] = None, address: Optional[str] = None,
+                 family: int = 0, settings: Optional[Dict] = None) -> Dict:
+    """分阶段探测URL的访问耗时，跟随重定向（最多MAX_REDIRECTS次）
+
+    参数和返回值见_probe_once。重定向时各阶段耗时为最终响应的，total为全部请求的合计耗时，
+    redirects为依次请求过的地址（包括最终地址）；address只用于与原地址同一主机的请求。
+    """
+    host = urlsplit(url).hostname
+    redirects = []
+    elapsed = 0.0
+    while True:
+        pinned = address if urlsplit(url).hostname == host else None
+        result = _probe_once(url, timeout, max_bytes, dns_cache, pinned, family, settings)
+        location = result.pop("location", None)
+        if result["total"] is None:
+            break
+        elapsed += result["total"]
+        if result["status"] not in REDIRECT_STATUSES or not location:
+            break
+        redirects.append(url)
+        if len(redirects) > MAX_REDIRECTS:
+            result["error"] = f"重定向次数超过{MAX_REDIRECTS}次"
+            break
+        url = urljoin(url, location)
+
+    if redirects:
+        result["redirects"] = redirects + [url]
+        if result["total"] is not None:
+            result["total"] = round(elapsed, 2)
+    result["success"] = result["status"] == 200 and result["error"] is None
+    return result
+
+
+def _probe_once(url: str, timeout: float, max_bytes: int, dns_cache: Optional[DNSCache],
+                address: Optional[str], family: int, settings: Optional[Dict]) -> Dict:
+    """分阶段探测一次URL的访问耗时（不跟随重定向）
+
+    直接使用socket发送一次HTTP/1.1 GET请求（Connection: close），
+    返回各阶段耗时（毫秒）、状态码和下载字节数。任何阶段失败都会记录在error中。
+    传入dns_cache时复用已有解析结果（命中时DNS阶段记为0）；
+    传入address时跳过地址选择，直接连接该地址；
+    传入family（socket.AF_INET/AF_INET6）时只使用该地址族。
+    传入settings（parse_network_settings的结果）时按npm的代理和证书配置访问：
+    经过代理时DNS/TCP阶段针对代理服务器，HTTPS请求的TCP阶段包含CONNECT隧道建立。
+    """
+    parsed = urlsplit(url)
+    is_https = parsed.scheme == "https"
+    host = parsed.hostname or ""
+    port = parsed.port or (443 if is_https else 80)
+    path = parsed.path or "/"
+    if parsed.query:
+        path += "?" + parsed.query
+
+    proxy = proxy_for_url(url, settings)
+    if proxy:
+        proxy_parsed = urlsplit(proxy)
+        connect_host = proxy_parsed.hostname or ""
+        connect_port = proxy_parsed.port or (443 if proxy_parsed.scheme == "https" else 80)
+        if not is_https:
+            # 明文请求通过代理时使用绝对URI
+            path = f"{parsed.scheme}://{parsed.netloc.rsplit('@', 1)[-1]}{path}"
+    else:
+        connect_host, connect_port = host, port
+
+    result = empty_phases(bool(proxy))
+
+    sock = None
+    start = time.perf_counter()
+    try:
+        # DNS解析
+        if dns_cache is not None:
+            addresses, _, cached = dns_cache.resolve(connect_host, connect_port)
+            result["dns_cached"] = cached
+        else:
+            addresses = [
+                (info[0], info[4])
+                for info in socket.getaddrinfo(connect_host, connect_port, 0, socket.SOCK_STREAM)
+            ]
+        result["addresses"] = [sockaddr[0] for _, sockaddr in addresses]
+
+        if family:
+            addresses = [item for item in addresses if item[0] == family]
+            if not addresses:
+                raise ValueError(f"没有{'IPv6' if family == socket.AF_INET6 else 'IPv4'}地址")
+
+        sock_family, sockaddr = addresses[0]
+        if address is not None:
+            matched = [item for item in addresses if item[1][0] == address]
+            if matched:
+                sock_family, sockaddr = matched[0]
+            else:
+                sock_family = socket.AF_INET6 if ":" in address else socket.AF_INET
+                sockaddr = (address, connect_port)
+        result["address"] = sockaddr[0]
+        result["family"] = FAMILY_NAMES.get(sock_family)
+        t_dns = time.perf_counter()
+        result["dns"] = 0.0 if result["dns_cached"] else _elapsed_ms(start, t_dns)
+
+        # TCP连接
+        sock = socket.socket(sock_family, socket.SOCK_STREAM)
+        sock.settimeout(timeout)
+        sock.connect(sockaddr)
+        if proxy and is_https:
+            _open_tunnel(sock, host, port, proxy)
+        t_connect = time.perf_counter()
+        result["connect"] = _elapsed_ms(t_dns, t_connect)
+
+        # TLS握手
+        t_tls = t_connect
+        if is_https:
+            context = make_ssl_context(settings)
+            sock = context.wrap_socket(sock, server_hostname=host)
+            t_tls = time.perf_counter()
+            result["tls"] = _elapsed_ms(t_connect, t_tls)
+
+        # 发送请求并等待首字节
+        request = (
+            f"GET {path} HTTP/1.1\r\n"
+            f"Host: {parsed.netloc.rsplit('@', 1)[-1]}\r\n"
+            "User-Agent: npm-registry-manager\r\n"
+            "Accept: */*\r\n"
+            "Accept-Encoding: identity\r\n"
+            f"{_proxy_auth_header(proxy) if proxy and not is_https else ''}"
+            "Connection: close\r\n\r\n"
+        )
+        sock.sendall(request.encode("ascii"))
+        first_chunk = sock.recv(65536)
+        t_first = time.perf_counter()
+        result["ttfb"] = _elapsed_ms(t_tls, t_first)
+        if not first_chunk:
+            raise ConnectionError("服务器未返回数据")
+
+        status_line = first_chunk.split(b"\r\n", 1)[0].decode("latin-1")
+        parts = status_line.split()
+        if len(parts) >= 2 and parts[1].isdigit():
+            result["status"] = int(parts[1])
+        if result["status"] in (429, 503):
+            result["retry_after"] = parse_retry_after(_header_value(first_chunk, "Retry-After"))
+        elif result["status"] in REDIRECT_STATUSES:
+            result["location"] = _header_value(first_chunk, "Location")
+
+        # 读取剩余数据
+        total_bytes = len(first_chunk)
+        while total_bytes < max_bytes:
+            chunk = sock.recv(65536)
+            if not chunk:
+                break
+            total_bytes += len(chunk)
+        t_end = time.perf_counter()
+        result["transfer"] = _elapsed_ms(t_first, t_end)
+        result["bytes"] = total_bytes
+        result["total"] = _elapsed_ms(start, t_end)
+    except (OSError, ssl.SSLError, ValueError) as e:
+        result["error"] = str(e) or e.__class__.__name__
+    finally:
+        if sock is not None:
+            try:
+                sock.close()
+            except OSError:
+                pass
+
+    return result
+
+
+def setup_cost(phases: Dict) -> float:
+    """连接建立开销（DNS + TCP + TLS），即连接复用可以节省的部分"""
+    return sum(phases.get(key) or 0.0 for key in ("dns", "connect", "tls"))
+
+
+def format_phases(phases: Optional[Dict]) -> str:
+    """将分阶段耗时格式化为多行文本，用于提示框显示"""
+    if not phases:
+        return ""
+
+    lines = []
+    for key, label in PHASE_LABELS.items():
+        value = phases.get(key)
+        if value is not None:
+            lines.append(f"{label}: {value}ms")
+
+    if phases.get("address"):
+        lines.append(f"地址: {phases['address']}")
+    if len(phases.get("addresses") or []) > 1:
+        lines.append(f"DNS返回 {len(phases['addresses'])} 个地址: {', '.join(phases['addresses'])}")
+    for item in phases.get("per_address") or []:
+        if item.get("success"):
+            lines.append(f"  {item['address']}: {item['total']}ms")
+        else:
+            lines.append(f"  {item['address']}: 连接失败")
+    if phases.get("error"):
+        lines.append(f"错误: {phases['error']}")
+
+    if phases.get("ttfb") is not None:
+        cost = setup_cost(phases)
+        if cost > phases["ttfb"]:
+            lines.append(f"连接建立占 {round(cost, 2)}ms，复用连接收益明显")
+        else:
+            lines.append("服务器响应耗时占主导，可能是距离远或服务器慢")
+
+    return "\n".join(lines)
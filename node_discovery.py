@@ -0,0 +1,250 @@
+"""
+Node.js/npm 安装发现模块
+按平台列出常见安装位置（PATH、nvm、fnm、volta、asdf、/usr/local、Homebrew、Windows安装目录），
+并行以较短超时检查各处的版本，结果缓存到本地，供NPMRegistryManager和诊断工具共用
+"""
+
+import glob
+import json
+import os
+import shutil
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+
+# 单次版本检查的超时时间（秒）
+DEFAULT_TIMEOUT = 3.0
+
+IS_WINDOWS = os.name == "nt"
+NPM_NAMES = ("npm.cmd", "npm") if IS_WINDOWS else ("npm",)
+NODE_NAMES = ("node.exe",) if IS_WINDOWS else ("node",)
+
+
+def _expand(pattern) -> List[Path]:
+    """展开路径中的通配符，只返回存在的目录"""
+    return [Path(path) for path in sorted(glob.glob(str(pattern))) if os.path.isdir(path)]
+
+
+def candidate_dirs() -> List[Tuple[str, Path]]:
+    """可能包含node/npm的目录 [(来源, 目录)]，按优先级排序并去重"""
+    home = Path.home()
+    candidates: List[Tuple[str, object]] = []
+
+    for entry in os.environ.get("PATH", "").split(os.pathsep):
+        if entry:
+            candidates.append(("PATH", entry))
+
+    nvm_dir = os.environ.get("NVM_DIR") or home / ".nvm"
+    volta_home = os.environ.get("VOLTA_HOME") or home / ".volta"
+    candidates += [
+        ("volta", Path(volta_home) / "bin"),
+        ("asdf", home / ".asdf" / "shims"),
+    ]
+
+    if IS_WINDOWS:
+        program_files = [os.environ.get(key) for key in ("ProgramFiles", "ProgramFiles(x86)")]
+        appdata = os.environ.get("APPDATA") or home / "AppData" / "Roaming"
+        local_appdata = os.environ.get("LOCALAPPDATA") or home / "AppData" / "Local"
+        candidates += [("Program Files", Path(path) / "nodejs") for path in program_files if path]
+        candidates += [
+            ("Program Files", r"C:\Program Files\nodejs"),
+            ("npm全局目录", Path(appdata) / "npm"),
+            ("scoop", home / "scoop" / "apps" / "nodejs" / "current"),
+            ("scoop", home / "scoop" / "shims"),
+            ("nvm-windows", os.environ.get("NVM_SYMLINK") or r"C:\Program Files\nodejs"),
+            ("volta", Path(local_appdata) / "Volta" / "bin"),
+            ("fnm", Path(appdata) / "fnm" / "aliases" / "default"),
+            ("chocolatey", r"C:\ProgramData\chocolatey\bin"),
+            ("其他", r"C:\tools\nodejs"),
+            ("其他", r"D:\Program Files\nodejs"),
+            ("其他", r"D:\nodejs"),
+        ]
+        if os.environ.get("NVM_HOME"):
+            candidates += [("nvm-windows", path) for path in _expand(Path(os.environ["NVM_HOME"]) / "v*")]
+    else:
+        fnm_dirs = [os.environ.get("FNM_DIR"), home / ".local" / "share" / "fnm", home / ".fnm",
+                    home / "Library" / "Application Support" / "fnm"]
+        candidates += [("nvm", path) for path in reversed(_expand(Path(nvm_dir) / "versions" / "node" / "*" / "bin"))]
+        for fnm_dir in filter(None, fnm_dirs):
+            candidates.append(("fnm", Path(fnm_dir) / "aliases" / "default" / "bin"))
+            candidates += [("fnm", path) for path in
+                           reversed(_expand(Path(fnm_dir) / "node-versions" / "*" / "installation" / "bin"))]
+        if os.environ.get("N_PREFIX"):
+            candidates.append(("n", Path(os.environ["N_PREFIX"]) / "bin"))
+        candidates += [
+            ("Homebrew", "/opt/homebrew/bin"),
+            ("Homebrew", "/usr/local/opt/node/bin"),
+            ("系统", "/usr/local/bin"),
+            ("系统", "/usr/bin"),
+            ("snap", "/snap/bin"),
+        ]
+
+    result = []
+    seen = set()
+    for source, path in candidates:
+        path = Path(path).expanduser()
+        key = os.path.normcase(str(path))
+        if key in seen:
+            continue
+        seen.add(key)
+        result.append((source, path))
+    return result
+
+
+def _find_executable(directory: Path, names) -> Optional[Path]:
+    """目录中第一个存在的可执行文件"""
+    for name in names:
+        path = directory / name
+        if path.is_file():
+            return path
+    return None
+
+
+def run_version(command: str, timeout: float = DEFAULT_TIMEOUT) -> Dict:
+    """执行 command --version，返回 {"version", "error", "duration_ms"}
+
+    Windows上npm是.cmd批处理，需要通过shell执行；其他平台直接执行。
+    """
+    start = time.perf_counter()
+    result = {"version": None, "error": None}
+    try:
+        process = subprocess.run([command, "--version"], capture_output=True, text=True,
+                                 timeout=timeout, shell=IS_WINDOWS)
+        if process.returncode == 0:
+            result["version"] = process.stdout.strip()
+        else:
+            result["error"] = (process.stderr or process.stdout).strip() or f"退出码 {process.returncode}"
+    except subprocess.TimeoutExpired:
+        result["error"] = f"超时（{timeout}秒）"
+    except OSError as e:
+        result["error"] = str(e)
+    result["duration_ms"] = round((time.perf_counter() - start) * 1000, 1)
+    return result
+
+
+def _check_dir(source: str, directory: Path, timeout: float) -> Optional[Dict]:
+    """检查一个目录中的node和npm，两者都不存在时返回None"""
+    npm = _find_executable(directory, NPM_NAMES)
+    node = _find_executable(directory, NODE_NAMES)
+    if npm is None and node is None:
+        return None
+    start = time.perf_counter()
+    installation = {"source": source, "dir": str(directory), "npm": str(npm) if npm else None,
+                    "node": str(node) if node else None}
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        npm_check = executor.submit(run_version, str(npm), timeout) if npm else None
+        node_check = executor.submit(run_version, str(node), timeout) if node else None
+        installation["npm_version"] = npm_check.result() if npm_check else None
+        installation["node_version"] = node_check.result() if node_check else None
+    installation["ok"] = bool(installation["npm_version"] and installation["npm_version"]["version"])
+    installation["duration_ms"] = round((time.perf_counter() - start) * 1000, 1)
+    return installation
+
+
+def discover_installations(timeout: float = DEFAULT_TIMEOUT, max_workers: Optional[int] = None) -> List[Dict]:
+    """并行检查全部候选目录，返回找到的安装（保持候选目录的优先级顺序）
+
+    同一个npm经符号链接出现在多个目录时只检查一次。启动node主要消耗CPU，
+    默认并行数为CPU核数的两倍（最多8个），避免同时启动过多进程互相拖慢导致超时。
+    """
+    max_workers = max_workers or min(8, 2 * (os.cpu_count() or 1))
+    dirs = []
+    seen = set()
+    for source, directory in candidate_dirs():
+        npm = _find_executable(directory, NPM_NAMES)
+        node = _find_executable(directory, NODE_NAMES)
+        if npm is None and node is None:
+            continue
+        key = tuple(os.path.realpath(path) if path else None for path in (npm, node))
+        if key in seen:
+            continue
+        seen.add(key)
+        dirs.append((source, directory))
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        results = list(executor.map(lambda item: _check_dir(item[0], item[1], timeout), dirs))
+    return [result for result in results if result is not None]
+
+
+class DiscoveryCache:
+    """npm命令发现结果的缓存：命令文件未变化（路径和修改时间相同）时直接复用"""
+
+    def __init__(self, path: Optional[Path] = None):
+        self.path = Path(path) if path else Path.home() / ".npm-registry-manager" / "node_discovery.json"
+
+    @staticmethod
+    def _fingerprint(command: str) -> Optional[Dict]:
+        """命令实际指向的文件及其修改时间"""
+        resolved = shutil.which(command)
+        if not resolved:
+            return None
+        try:
+            return {"resolved": resolved, "mtime": os.stat(resolved).st_mtime}
+        except OSError:
+            return None
+
+    def load(self) -> Optional[Dict]:
+        """读取缓存，命令文件已变化或不存在时返回None"""
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return None
+        if not isinstance(entry, dict) or not entry.get("npm"):
+            return None
+        fingerprint = self._fingerprint(entry["npm"])
+        if fingerprint is None or fingerprint != entry.get("fingerprint"):
+            return None
+        return entry
+
+    def save(self, npm: str, npm_version: Optional[str], node_version: Optional[str] = None) -> None:
+        """保存发现结果"""
+        entry = {"npm": npm, "npm_version": npm_version, "node_version": node_version,
+                 "fingerprint": self._fingerprint(npm), "timestamp": time.time()}
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.path, 'w', encoding='utf-8') as f:
+                json.dump(entry, f, ensure_ascii=False, indent=2)
+        except OSError as e:
+            print(f"保存npm发现缓存失败: {e}")
+
+    def clear(self) -> None:
+        """删除缓存"""
+        try:
+            self.path.unlink()
+        except OSError:
+            pass
+
+
+def find_npm_command(cache: Optional[DiscoveryCache] = None, timeout: float = DEFAULT_TIMEOUT) -> Optional[str]:
+    """查找可用的npm命令：先用缓存，其次PATH中的npm，最后并行检查常见安装位置
+
+    找到后写入缓存，都不可用时返回None。
+    """
+    cache = cache or DiscoveryCache()
+    entry = cache.load()
+    if entry is not None:
+        return entry["npm"]
+
+    for name in NPM_NAMES:
+        if shutil.which(name):
+            check = run_version(name, timeout)
+            if check["version"]:
+                cache.save(name, check["version"])
+                return name
+
+    for installation in discover_installations(timeout):
+        if installation["ok"]:
+            node_version = installation["node_version"]["version"] if installation["node_version"] else None
+            cache.save(installation["npm"], installation["npm_version"]["version"], node_version)
+            return installation["npm"]
+    return None
+
+
+def platform_name() -> str:
+    """当前平台名称"""
+    return {"win32": "Windows", "darwin": "macOS"}.get(sys.platform, sys.platform.capitalize())
@@ -5,11 +5,47 @@ NPM源管理核心模块
 
 import subprocess
 import json
+import atexit
+import threading
 import time
+import datetime
 import requests
 import os
+import socket
+import tempfile
 from pathlib import Path
 from typing import Dict, List, Optional, Tuple
+from urllib.parse import quote, urlsplit
+
+from registry_cache import RegistryCache
+from connectivity import DEFAULT_TIMEOUT as DEFAULT_OFFLINE_TIMEOUT, check_connectivity
+from network_probe import DNSCache, empty_phases, parse_network_settings, probe_phases, proxy_for_url
+from rate_limit import RateLimiter, parse_retry_after
+from scoring import best_registry
+from package_managers import PackageManagerSync
+from npmrc import configured_registry, npmrc_files
+from node_discovery import DiscoveryCache, find_npm_command
+from probe_trace import TraceRecorder
+from range_probe import (DEFAULT_BUDGET, DEFAULT_SLICES, MetadataError, measure_range_throughput, read_capped,
+                         resolve_latest_tarball)
+from metrics import METRICS
+
+
+# 内联证书（npm的ca配置）写入的临时文件，进程退出时删除
+_CA_FILES = set()
+
+
+def _remove_ca_files() -> None:
+    """删除本进程写入的内联证书文件"""
+    for path in list(_CA_FILES):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        _CA_FILES.discard(path)
+
+
+atexit.register(_remove_ca_files)
 
 
 class NPMRegistryManager:
@@ -25,62 +61,49 @@ class NPMRegistryManager:
         "官方源": "https://registry.npmjs.org/"
     }
     
-    def __init__(self):
+    def __init__(self, cache_ttl: int = 300, cache_dir: Optional[Path] = None,
+                 rate_limiter: Optional[RateLimiter] = None, sync_package_managers: bool = False,
+                 discovery_cache: Optional[DiscoveryCache] = None):
+        self.discovery_cache = discovery_cache or DiscoveryCache()
         self.npm_command = self._find_npm_command()
         self.current_registry = self.get_current_registry()
+        self.info_cache = RegistryCache(cache_dir, ttl=cache_ttl)
+        self.dns_cache = DNSCache()
+        self.rate_limiter = rate_limiter or RateLimiter()
+        self.package_managers = PackageManagerSync()
+        self.sync_package_managers = sync_package_managers
+        self._npm_config = None
+        self._network_settings = None
+        self._session = None
+        self._ca_file: Optional[Tuple[str, str]] = None
+        self._ca_lock = threading.Lock()
+        self.trace_recorder: Optional[TraceRecorder] = None
+        self._sync_references: Dict[str, Optional[float]] = {}
+        METRICS.add_gauge_callback(self._cache_gauges, key="npm_manager.cache")
+        METRICS.add_gauge_callback(self._rate_limit_gauges, key="npm_manager.rate_limit")
     
     def _find_npm_command(self) -> str:
-        """查找可用的NPM命令"""
-        # 常见的NPM命令路径
-        possible_commands = ["npm", "npm.cmd"]
-        
-        # 常见的Node.js安装路径
-        possible_paths = [
-            r"C:\Program Files\nodejs",
-            r"C:\Program Files (x86)\nodejs",
-            Path.home() / "AppData" / "Roaming" / "npm",
-            Path.home() / "scoop" / "apps" / "nodejs" / "current",
-            Path.home() / "scoop" / "shims"
-        ]
-        
-        # 首先尝试直接命令
-        for cmd in possible_commands:
-            try:
-                result = subprocess.run([cmd, "--version"], 
-                                      capture_output=True, text=True, 
-                                      timeout=5, shell=True)
-                if result.returncode == 0:
-                    return cmd
-            except:
-                continue
-        
-        # 如果直接命令失败，尝试完整路径
-        for path in possible_paths:
-            path = Path(path)
-            if path.exists():
-                for cmd in ["npm.cmd", "npm"]:
-                    npm_path = path / cmd
-                    if npm_path.exists():
-                        try:
-                            result = subprocess.run([str(npm_path), "--version"],
-                                                  capture_output=True, text=True, timeout=5)
-                            if result.returncode == 0:
-                                return str(npm_path)
-                        except:
-                            continue
-        
-        raise Exception("未找到可用的NPM命令")
+        """查找可用的NPM命令（优先使用发现缓存，其次PATH，最后并行检查常见安装位置）"""
+        command = find_npm_command(self.discovery_cache)
+        if command is None:
+            raise Exception("未找到可用的NPM命令")
+        return command
     
-    def get_current_registry(self) -> str:
-        """获取当前npm源"""
-        try:
-            result = subprocess.run(
-                [self.npm_command, "config", "get", "registry"],
+    def _run_npm(self, args: List[str]) -> subprocess.CompletedProcess:
+        """执行npm命令（失败时抛出CalledProcessError），并记录耗时指标"""
+        with METRICS.span("npm_registry_npm_command_duration_seconds", command=" ".join(args[:2])):
+            return subprocess.run(
+                [self.npm_command] + args,
                 capture_output=True,
                 text=True,
                 check=True,
-                shell=True  # Windows环境下使用shell
+                shell=os.name == "nt"  # Windows上npm为.cmd批处理，需要通过shell执行
             )
+    
+    def get_current_registry(self) -> str:
+        """获取当前npm源"""
+        try:
+            result = self._run_npm(["config", "get", "registry"])
             return result.stdout.strip()
         except subprocess.CalledProcessError as e:
             raise Exception(f"获取当前npm源失败: {e}")
@@ -88,52 +111,382 @@ class NPMRegistryManager:
             raise Exception("未找到npm命令，请确保已安装Node.js和npm")
     
     def set_registry(self, registry_url: str) -> bool:
-        """设置npm源"""
+        """设置npm源（开启同步时一并写入yarn、pnpm、bun的配置文件）"""
+        with METRICS.span("npm_registry_set_duration_seconds", registry=registry_url):
+            try:
+                self._run_npm(["config", "set", "registry", registry_url])
+                self.current_registry = registry_url
+                self._npm_config = None
+            except subprocess.CalledProcessError as e:
+                raise Exception(f"设置npm源失败: {e}")
+        if self.sync_package_managers:
+            self.package_managers.set_registry(registry_url)
+        return True
+    
+    def get_npmrc_files(self) -> List[Path]:
+        """npm读取的全局和用户级.npmrc文件"""
         try:
-            subprocess.run(
-                [self.npm_command, "config", "set", "registry", registry_url],
-                capture_output=True,
-                text=True,
-                check=True,
-                shell=True  # Windows环境下使用shell
-            )
-            self.current_registry = registry_url
+            npm_config = self.get_npm_config()
+        except Exception:
+            npm_config = {}
+        return npmrc_files(npm_config)
+    
+    def read_configured_registry(self) -> str:
+        """直接解析.npmrc得到当前源（不启动npm进程），用于感知外部修改"""
+        return configured_registry(self.get_npmrc_files(), self.CHINA_REGISTRIES["官方源"])
+    
+    def get_package_manager_status(self) -> List[Dict]:
+        """其他包管理器使用的源及是否与npm当前源一致"""
+        return self.package_managers.status(self.current_registry)
+    
+    def sync_package_manager_registries(self) -> Dict[str, Optional[str]]:
+        """把npm当前源写入与之不一致的包管理器配置，返回 {包管理器: 错误信息}"""
+        return self.package_managers.set_registry(self.current_registry)
+    
+    @staticmethod
+    def normalize_scope(scope: str) -> str:
+        """规范化作用域名称（补全开头的@，去掉末尾的:registry）"""
+        scope = scope.strip()
+        if scope.endswith(":registry"):
+            scope = scope[:-len(":registry")]
+        if not scope.startswith("@"):
+            scope = "@" + scope
+        if len(scope) < 2 or "/" in scope or ":" in scope:
+            raise ValueError(f"无效的作用域: {scope}")
+        return scope
+    
+    def get_scope_registry(self, scope: str) -> Optional[str]:
+        """获取作用域的源（@scope:registry），未设置时返回None"""
+        scope = self.normalize_scope(scope)
+        try:
+            result = self._run_npm(["config", "get", f"{scope}:registry"])
+        except subprocess.CalledProcessError as e:
+            raise Exception(f"获取{scope}的源失败: {e}")
+        value = result.stdout.strip()
+        return value if value and value not in ("undefined", "null") else None
+    
+    def set_scope_registry(self, scope: str, registry_url: str) -> bool:
+        """设置作用域的源，只影响该作用域下的包"""
+        scope = self.normalize_scope(scope)
+        with METRICS.span("npm_registry_set_duration_seconds", registry=registry_url):
+            try:
+                self._run_npm(["config", "set", f"{scope}:registry", registry_url])
+                self._npm_config = None
+                return True
+            except subprocess.CalledProcessError as e:
+                raise Exception(f"设置{scope}的源失败: {e}")
+    
+    def delete_scope_registry(self, scope: str) -> bool:
+        """删除作用域的源设置，该作用域的包恢复使用默认源"""
+        scope = self.normalize_scope(scope)
+        try:
+            self._run_npm(["config", "delete", f"{scope}:registry"])
+            self._npm_config = None
             return True
         except subprocess.CalledProcessError as e:
-            raise Exception(f"设置npm源失败: {e}")
+            raise Exception(f"删除{scope}的源失败: {e}")
+    
+    def get_scoped_registries(self) -> Dict[str, str]:
+        """获取npm配置中全部作用域源 {作用域: URL}"""
+        scoped = {}
+        for key, value in self.get_npm_config(refresh=True).items():
+            if key.startswith("@") and key.endswith(":registry") and value:
+                scoped[key[:-len(":registry")]] = value
+        return scoped
     
     def test_registry_speed(self, registry_url: str, timeout: int = 5) -> Tuple[bool, float]:
         """测试源的响应速度"""
-        try:
-            start_time = time.time()
-            response = requests.get(registry_url, timeout=timeout)
-            end_time = time.time()
-            
-            if response.status_code == 200:
-                return True, round((end_time - start_time) * 1000, 2)  # 返回毫秒
-            else:
-                return False, 0.0
-        except requests.RequestException:
+        host = self._probe_host(registry_url)
+        if not self._acquire_probe(registry_url, "speed"):
             return False, 0.0
+        with METRICS.span("npm_registry_probe_duration_seconds", registry=registry_url, kind="speed") as span:
+            try:
+                start_time = time.time()
+                response = self._http_get(registry_url, timeout=timeout)
+                end_time = time.time()
+                
+                elapsed = round((end_time - start_time) * 1000, 2)  # 毫秒
+                self.rate_limiter.report(host, response.status_code,
+                                         parse_retry_after(response.headers.get("Retry-After")))
+                self._record_trace(registry_url, "speed", {
+                    "success": response.status_code == 200, "status": response.status_code,
+                    "total": elapsed, "bytes": len(response.content)
+                })
+                
+                if response.status_code == 200:
+                    return True, elapsed
+                else:
+                    span.set_outcome("failure")
+                    return False, 0.0
+            except requests.RequestException as e:
+                span.set_outcome("failure")
+                self._record_trace(registry_url, "speed", {"success": False, "error": str(e)})
+                return False, 0.0
+    
+    def enable_trace(self, path: Path) -> None:
+        """开启探测轨迹记录，所有探测结果追加写入path（.gz后缀时压缩）"""
+        self.disable_trace()
+        self.trace_recorder = TraceRecorder(path)
+        self.trace_recorder.begin_run()
+    
+    def disable_trace(self) -> None:
+        """关闭探测轨迹记录"""
+        if self.trace_recorder is not None:
+            self.trace_recorder.close()
+            self.trace_recorder = None
+    
+    def _record_trace(self, url: str, kind: str, result: Dict) -> None:
+        """记录一次探测到轨迹文件（未开启时不做任何事）"""
+        if self.trace_recorder is not None:
+            self.trace_recorder.record(url, kind, result)
+    
+    def begin_probe_run(self) -> None:
+        """开始新一轮测试，清空DNS缓存使每个主机在本轮中只解析一次"""
+        self.dns_cache.clear()
+        self._sync_references.clear()
+        if self.trace_recorder is not None:
+            self.trace_recorder.begin_run()
+    
+    @staticmethod
+    def _probe_host(registry_url: str) -> str:
+        """限速使用的主机标识（host:port）"""
+        return urlsplit(registry_url).netloc or registry_url
+    
+    def _acquire_probe(self, registry_url: str, kind: str) -> bool:
+        """按限速设置获取探测许可，被推迟时计入指标"""
+        if self.rate_limiter.acquire(self._probe_host(registry_url)):
+            return True
+        METRICS.inc("npm_registry_probe_deferred", registry=registry_url, kind=kind)
+        return False
+    
+    def _deferred_result(self, registry_url: str) -> Dict:
+        """因限速推迟的探测结果，调用方不应记为连接失败"""
+        result = empty_phases(self.is_proxied(registry_url))
+        blocked = self.rate_limiter.blocked_for(self._probe_host(registry_url))
+        result["deferred"] = True
+        result["error"] = f"已推迟: 源正在限流，{round(blocked)}秒后重试" if blocked else "已推迟: 探测频率超出限制"
+        return result
+    
+    def _probe(self, registry_url: str, timeout: int = 5, kind: str = "phases", **kwargs) -> Dict:
+        """使用共享DNS缓存和npm网络设置进行一次分阶段探测，并记录轨迹和指标
+
+        超出限速时不发出请求，返回deferred为True的结果。
+        """
+        if not self._acquire_probe(registry_url, kind):
+            return self._deferred_result(registry_url)
+        with METRICS.span("npm_registry_probe_duration_seconds", registry=registry_url, kind=kind) as span:
+            result = probe_phases(registry_url, timeout=timeout, dns_cache=self.dns_cache,
+                                  settings=self.get_network_settings(), **kwargs)
+            if not result["success"]:
+                span.set_outcome("failure")
+        self.rate_limiter.report(self._probe_host(registry_url),
+                                 result["status"], result["retry_after"])
+        self._record_trace(registry_url, kind, result)
+        return result
+    
+    def test_registry_phases(self, registry_url: str, timeout: int = 5) -> Dict:
+        """分阶段测试源的响应速度（DNS解析、TCP连接、TLS握手、首字节、传输）"""
+        return self._probe(registry_url, timeout)
+    
+    def test_registry_addresses(self, registry_url: str, timeout: int = 5) -> List[Dict]:
+        """逐个测试源域名解析出的每个地址，用于判断DNS是否分配了较远的边缘节点
+
+        经过代理访问时由代理负责解析，返回空列表。
+        """
+        if self.is_proxied(registry_url):
+            return []
+        first = self._probe(registry_url, timeout, kind="address")
+        if first.get("deferred"):
+            return []
+        results = [first]
+        for address in first["addresses"][1:]:
+            results.append(self._probe(registry_url, timeout, kind="address", address=address))
+        return [
+            {"address": r["address"], "success": r["success"], "total": r["total"]}
+            for r in results if r["address"]
+        ]
+    
+    def test_registry_families(self, registry_url: str, timeout: int = 5,
+                               known: Optional[Dict] = None) -> Dict:
+        """分别通过IPv4和IPv6测试源，返回各地址族的耗时（毫秒，失败或无地址为None）
+
+        known为本轮已完成的分阶段测试结果，其所用地址族不再重复测试。
+        经过代理访问时地址族由代理决定，两个地址族均记为不可用。
+        任一地址族因限速被推迟时结果带有deferred标记。
+        """
+        if self.is_proxied(registry_url):
+            return {"ipv4": None, "ipv6": None, "ipv4_available": False,
+                    "ipv6_available": False, "proxied": True}
+        
+        results = {}
+        for family, name in ((socket.AF_INET, "ipv4"), (socket.AF_INET6, "ipv6")):
+            if known is not None and known.get("family") == name:
+                phases = known
+            else:
+                phases = self._probe(registry_url, timeout, kind=name, family=family)
+            if phases.get("deferred"):
+                results["deferred"] = True
+            results[name] = phases["total"] if phases["success"] else None
+            results[f"{name}_available"] = bool(phases["address"])
+        return results
+    
+    def _fetch_modified(self, registry_url: str, package: str, timeout: int,
+                        max_bytes: Optional[int] = None) -> Tuple[Dict, Optional[float], int]:
+        """获取包的精简元数据和最后修改时间（Unix时间戳），返回 (元数据, 修改时间, 下载的字节数)
+
+        指定max_bytes时最多读取该字节数，超出时抛出MetadataError。
+        """
+        url = f"{registry_url.rstrip('/')}/{quote(package, safe='@')}"
+        response = self._http_get(url, timeout=timeout, stream=max_bytes is not None,
+                                  headers={"Accept": "application/vnd.npm.install-v1+json"})
+        if max_bytes is None:
+            body = response.content
+        else:
+            body, complete = read_capped(response, max_bytes)
+            if not complete:
+                raise MetadataError(f"{package}的包元数据超过{max_bytes}字节的预算", len(body))
+        response.raise_for_status()
+        doc = json.loads(body)
+        modified = doc.get("modified") or doc.get("time", {}).get("modified")
+        if not modified:
+            return doc, None, len(body)
+        return doc, datetime.datetime.fromisoformat(modified.replace("Z", "+00:00")).timestamp(), len(body)
+    
+    def _sync_reference(self, package: str, timeout: int,
+                        max_bytes: Optional[int] = None) -> Tuple[Optional[float], int]:
+        """官方源上包的最后修改时间（每轮测试只获取一次），获取失败时为None
+
+        返回 (修改时间, 本次下载的字节数)，已获取过时字节数为0。
+        """
+        spent = 0
+        if package not in self._sync_references:
+            try:
+                _, modified, spent = self._fetch_modified(self.CHINA_REGISTRIES["官方源"], package, timeout,
+                                                          max_bytes)
+            except MetadataError as e:
+                modified, spent = None, e.spent
+            except (requests.RequestException, ValueError, KeyError):
+                modified = None
+            self._sync_references[package] = modified
+        return self._sync_references[package], spent
+    
+    def test_registry_quality(self, registry_url: str, package: str = "lodash", timeout: int = 10,
+                              max_bytes: int = 1024 * 1024, range_budget: int = 0) -> Dict:
+        """测量源的tarball下载吞吐量（字节/秒）和相对官方源的同步延迟（秒）
+        
+        下载package最新版本的tarball（最多max_bytes字节），吞吐量只统计收到响应头之后的传输时间；
+        range_budget大于0时改为在该字节预算内用Range分片估算吞吐量（见range_probe），
+        本源和官方源的包元数据也计入预算，下载的总字节数见结果中range的bytes。
+        同步延迟为官方源上该包的修改时间比本源晚多少秒，本源不落后时为0。
+        """
+        result = {"throughput": None, "sync_lag": None, "latest": None, "error": None}
+        if not self._acquire_probe(registry_url, "quality"):
+            result.update(deferred=True, error=self._deferred_result(registry_url)["error"])
+            return result
+        
+        with METRICS.span("npm_registry_probe_duration_seconds", registry=registry_url, kind="quality") as span:
+            budget = range_budget if range_budget > 0 else None
+            spent = 0
+            try:
+                doc, modified, spent = self._fetch_modified(registry_url, package, timeout, budget)
+                latest = doc["dist-tags"]["latest"]
+                result["latest"] = latest
+                reference, reference_bytes = self._sync_reference(
+                    package, timeout, None if budget is None else budget - spent)
+                spent += reference_bytes
+                if reference is not None and modified is not None:
+                    result["sync_lag"] = round(max(reference - modified, 0.0), 1)
+                
+                tarball = doc["versions"][latest]["dist"]["tarball"]
+                if budget is not None:
+                    probe = measure_range_throughput(self, tarball, budget, timeout=timeout, metadata_bytes=spent)
+                    spent = probe["bytes"]
+                    if probe["error"]:
+                        raise requests.RequestException(probe["error"])
+                    result["throughput"] = probe["throughput"]
+                    result["range"] = {key: probe[key]
+                                       for key in ("latency_ms", "ramp_up_ms", "range_supported", "bytes")}
+                    return result
+                response = self._http_get(tarball, timeout=timeout, stream=True)
+                with response:
+                    response.raise_for_status()
+                    start = time.perf_counter()
+                    received = 0
+                    for chunk in response.iter_content(64 * 1024):
+                        received += len(chunk)
+                        if received >= max_bytes:
+                            break
+                    elapsed = time.perf_counter() - start
+                if received:
+                    result["throughput"] = round(received / max(elapsed, 1e-6))
+            except MetadataError as e:
+                span.set_outcome("failure")
+                result["error"] = str(e)
+                spent += e.spent
+            except (requests.RequestException, ValueError, KeyError) as e:
+                span.set_outcome("failure")
+                result["error"] = str(e)
+            finally:
+                if budget is not None:
+                    result.setdefault("range", {})["bytes"] = spent
+                    METRICS.inc("npm_registry_probe_bytes", spent, registry=registry_url, kind="quality")
+        return result
+    
+    def test_registry_range(self, registry_url: str, package: str = "typescript", budget: int = DEFAULT_BUDGET,
+                            slices: int = DEFAULT_SLICES, timeout: int = 10) -> Dict:
+        """在字节预算内用Range分片估算源的下载吞吐量和新连接的爬升开销，适合按流量计费的网络
+        
+        只获取package最新版本的元数据（/包名/latest）和tarball中的几个分片，元数据也计入预算，
+        元数据超出预算时不再下载分片。返回range_probe.measure_range_throughput的结果，另含tarball。
+        """
+        result = {"throughput": None, "latency_ms": None, "ramp_up_ms": None, "range_supported": None,
+                  "slices": 0, "bytes": 0, "samples": [], "tarball": None, "error": None}
+        if not self._acquire_probe(registry_url, "range"):
+            result.update(deferred=True, error=self._deferred_result(registry_url)["error"])
+            return result
+        
+        with METRICS.span("npm_registry_probe_duration_seconds", registry=registry_url, kind="range") as span:
+            try:
+                tarball, metadata_bytes = resolve_latest_tarball(self, registry_url, package, timeout, budget)
+            except (requests.RequestException, ValueError, KeyError) as e:
+                span.set_outcome("failure")
+                result["error"] = str(e)
+                result["bytes"] = getattr(e, "spent", 0)
+                METRICS.inc("npm_registry_probe_bytes", result["bytes"], registry=registry_url, kind="range")
+                return result
+            result.update(measure_range_throughput(self, tarball, budget, slices, timeout, metadata_bytes))
+            result["tarball"] = tarball
+            if result["error"] or not result["throughput"]:
+                span.set_outcome("failure")
+        METRICS.inc("npm_registry_probe_bytes", result["bytes"], registry=registry_url, kind="range")
+        return result
     
     def get_registry_info(self, registry_url: str) -> Dict:
-        """获取源的详细信息"""
+        """获取源的详细信息（结果按URL缓存，过期后条件请求重新验证）"""
+        with METRICS.span("npm_registry_info_duration_seconds", registry=registry_url) as span:
+            info = self._fetch_registry_info(registry_url)
+            if info["status"] != "可用":
+                span.set_outcome("failure")
+            return info
+    
+    def _fetch_registry_info(self, registry_url: str) -> Dict:
+        """请求源根路径和测试包，生成源信息"""
         try:
-            response = requests.get(registry_url, timeout=5)
-            if response.status_code == 200:
+            root = self.info_cache.fetch(registry_url, self._http_get, timeout=5)
+            if root["status_code"] == 200:
                 # 尝试获取一些基本信息
                 test_package_url = f"{registry_url.rstrip('/')}/vue"
-                package_response = requests.get(test_package_url, timeout=5)
+                package = self.info_cache.fetch(test_package_url, self._http_get, timeout=5)
                 
                 return {
                     "status": "可用",
-                    "response_code": response.status_code,
-                    "can_fetch_packages": package_response.status_code == 200
+                    "response_code": root["status_code"],
+                    "can_fetch_packages": package["status_code"] == 200
                 }
             else:
                 return {
                     "status": "不可用",
-                    "response_code": response.status_code,
+                    "response_code": root["status_code"],
                     "can_fetch_packages": False
                 }
         except requests.RequestException as e:
@@ -143,24 +496,159 @@ class NPMRegistryManager:
                 "can_fetch_packages": False
             }
     
-    def get_npm_config(self) -> Dict:
-        """获取npm配置信息"""
+    def get_cache_stats(self) -> Dict[str, int]:
+        """获取源信息缓存的命中/未命中/重新验证计数"""
+        return self.info_cache.get_stats()
+    
+    def _cache_gauges(self) -> Dict:
+        """导出源信息缓存统计，供指标模块使用"""
+        return {
+            "npm_registry_info_cache": {
+                (("event", event),): value for event, value in self.get_cache_stats().items()
+            }
+        }
+    
+    def get_rate_limit_stats(self) -> Dict:
+        """获取探测限速统计（已执行、推迟、被限流次数和累计等待时间）"""
+        return self.rate_limiter.get_stats()
+    
+    def _rate_limit_gauges(self) -> Dict:
+        """导出探测限速统计，供指标模块使用"""
+        stats = self.get_rate_limit_stats()
+        return {
+            "npm_registry_probe_rate_limit": {
+                (("event", event),): stats[event] for event in ("acquired", "deferred", "throttled", "waited_ms")
+            },
+            "npm_registry_probe_blocked_seconds": {
+                (("host", host),): seconds for host, seconds in stats["blocked_hosts"].items()
+            }
+        }
+    
+    def get_npm_config(self, refresh: bool = False) -> Dict:
+        """获取npm配置信息（结果会被缓存，refresh=True时重新读取）"""
+        if self._npm_config is not None and not refresh:
+            return self._npm_config
         try:
-            result = subprocess.run(
-                [self.npm_command, "config", "list", "--json"],
-                capture_output=True,
-                text=True,
-                check=True,
-                shell=True  # Windows环境下使用shell
-            )
-            return json.loads(result.stdout)
+            result = self._run_npm(["config", "list", "--json"])
+            self._npm_config = json.loads(result.stdout)
+            return self._npm_config
         except (subprocess.CalledProcessError, json.JSONDecodeError) as e:
             raise Exception(f"获取npm配置失败: {e}")
     
+    def get_network_settings(self) -> Dict:
+        """获取npm实际使用的网络设置（proxy、https-proxy、noproxy、cafile、strict-ssl）"""
+        if self._network_settings is None:
+            try:
+                npm_config = self.get_npm_config()
+            except Exception as e:
+                print(f"读取npm网络配置失败，仅使用环境变量: {e}")
+                npm_config = {}
+            self._network_settings = parse_network_settings(npm_config)
+        return self._network_settings
+    
+    def refresh_network_settings(self) -> None:
+        """重新读取npm网络配置（用户修改代理或证书设置后调用）"""
+        self._npm_config = None
+        self._network_settings = None
+        self._session = None
+    
+    def is_proxied(self, url: str) -> bool:
+        """判断访问该URL时npm是否会经过代理"""
+        return proxy_for_url(url, self.get_network_settings()) is not None
+    
+    def check_connectivity(self, registry_urls: List[str], timeout: float = DEFAULT_OFFLINE_TIMEOUT) -> Dict:
+        """测速前快速检查网络是否可用（经代理访问的源检查代理），timeout不大于0时不检查
+        
+        当前源排在最前面，返回connectivity.check_connectivity的结果。
+        """
+        if timeout <= 0:
+            return {"online": True, "state": "skipped", "reason": None, "target": None, "duration_ms": 0.0}
+        urls = sorted(registry_urls, key=lambda url: url != self.current_registry)
+        targets = []
+        for url in urls:
+            parsed = urlsplit(proxy_for_url(url, self.get_network_settings()) or url)
+            if parsed.hostname:
+                targets.append((parsed.hostname, parsed.port or (443 if parsed.scheme == "https" else 80)))
+        result = check_connectivity(targets, timeout)
+        METRICS.inc("npm_registry_connectivity_checks", state=result["state"])
+        return result
+    
+    def new_session(self, pool_size: Optional[int] = None) -> requests.Session:
+        """创建与npm网络路径一致的HTTP会话（代理按请求单独指定）
+        
+        pool_size为每个主机保持的连接数，用于并发请求（相当于npm的maxsockets）。
+        """
+        settings = self.get_network_settings()
+        session = requests.Session()
+        # 只使用npm配置，不读取环境变量中的代理和证书设置
+        session.trust_env = False
+        if not settings["strict_ssl"]:
+            session.verify = False
+        elif settings["cafile"]:
+            session.verify = settings["cafile"]
+        elif settings["ca"]:
+            session.verify = self._ca_bundle_path(settings["ca"])
+        if pool_size:
+            adapter = requests.adapters.HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+        return session
+    
+    def _ca_bundle_path(self, ca: str) -> str:
+        """把内联证书写入仅当前用户可读的文件（位于程序的配置目录），证书不变时复用同一个文件"""
+        with self._ca_lock:
+            if self._ca_file is not None and self._ca_file[0] == ca and os.path.exists(self._ca_file[1]):
+                return self._ca_file[1]
+            directory = Path.home() / ".npm-registry-manager"
+            try:
+                directory.mkdir(mode=0o700, parents=True, exist_ok=True)
+            except OSError:
+                directory = Path(tempfile.gettempdir())
+            # mkstemp以0600权限独占创建随机文件名，其他用户无法预先创建或读取
+            fd, path = tempfile.mkstemp(prefix="ca-", suffix=".pem", dir=directory)
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(ca)
+            _CA_FILES.add(path)
+            if self._ca_file is not None:
+                try:
+                    os.remove(self._ca_file[1])
+                except OSError:
+                    pass
+                _CA_FILES.discard(self._ca_file[1])
+            self._ca_file = (ca, path)
+            return path
+    
+    def _get_session(self) -> requests.Session:
+        """获取共享的HTTP会话"""
+        if self._session is None:
+            self._session = self.new_session()
+        return self._session
+    
+    def _http_get(self, url: str, session: Optional[requests.Session] = None, **kwargs) -> requests.Response:
+        """按npm网络配置发送GET请求（可指定使用的会话）"""
+        proxy = proxy_for_url(url, self.get_network_settings())
+        proxies = {"http": proxy, "https": proxy} if proxy else {}
+        return (session or self._get_session()).get(url, proxies=proxies, **kwargs)
+    
+    def _http_head(self, url: str, **kwargs) -> requests.Response:
+        """按npm网络配置发送HEAD请求"""
+        proxy = proxy_for_url(url, self.get_network_settings())
+        proxies = {"http": proxy, "https": proxy} if proxy else {}
+        return self._get_session().head(url, proxies=proxies, **kwargs)
+    
     def reset_to_default(self) -> bool:
         """重置到默认官方源"""
         return self.set_registry(self.CHINA_REGISTRIES["官方源"])
     
+    def switch_to_best(self, ranking: List[Dict]) -> Optional[str]:
+        """切换到综合评分最高的源（ranking为ScoringEngine.rank的结果），没有可用评分时返回None"""
+        best = best_registry(ranking)
+        if best is None:
+            return None
+        if best["url"] != self.current_registry:
+            self.set_registry(best["url"])
+        return best["url"]
+    
     def get_registry_name(self, registry_url: str) -> str:
         """根据URL获取源名称"""
         for name, url in self.CHINA_REGISTRIES.items():
@@ -168,14 +656,14 @@ class NPMRegistryManager:
                 return name
         return "自定义源"
     
-    def validate_registry_url(self, url: str) -> bool:
-        """验证源URL格式"""
+    def validate_registry_url(self, url: str, timeout: float = 5) -> bool:
+        """验证源URL格式和可访问性"""
         if not url.startswith(('http://', 'https://')):
             return False
         if not url.endswith('/'):
             url += '/'
         try:
-            response = requests.head(url, timeout=5)
+            response = self._http_head(url, timeout=timeout)
             return response.status_code < 400
         except requests.RequestException:
             return False
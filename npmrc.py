@@ -0,0 +1,107 @@
+"""
+.npmrc 文件解析和修改模块
+按npm使用的ini格式读取配置项，修改时保留原有的注释、顺序和其他配置
+"""
+
+import os
+import re
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+
+# ${VAR} 形式的环境变量引用（npm读取配置时展开）
+_ENV_PATTERN = re.compile(r"(\\*)\$\{([^}]+)\}")
+
+
+def _expand_env(value: str) -> str:
+    """展开值中的环境变量引用，前面带反斜杠的保持原样"""
+    def replace(match):
+        escapes, name = match.group(1), match.group(2)
+        if len(escapes) % 2:
+            return escapes[:-1] + "${" + name + "}"
+        return escapes + os.environ.get(name, "${" + name + "}")
+    return _ENV_PATTERN.sub(replace, value)
+
+
+def _parse_line(line: str) -> Optional[Tuple[str, str]]:
+    """解析一行配置，返回 (键, 值)，注释、空行和节标题返回None"""
+    stripped = line.strip()
+    if not stripped or stripped[0] in ";#" or stripped.startswith("["):
+        return None
+    key, sep, value = stripped.partition("=")
+    key = key.strip()
+    if not key:
+        return None
+    value = value.strip() if sep else "true"
+    if len(value) >= 2 and value[0] == value[-1] and value[0] in "\"'":
+        value = value[1:-1]
+    return key, value
+
+
+def parse_npmrc(text: str, expand: bool = True) -> Dict[str, str]:
+    """解析.npmrc内容为 {键: 值}（同一个键出现多次时以最后一次为准）"""
+    config = {}
+    for line in text.splitlines():
+        parsed = _parse_line(line)
+        if parsed is None:
+            continue
+        key, value = parsed
+        config[key] = _expand_env(value) if expand else value
+    return config
+
+
+def read_npmrc(path: Path) -> Dict[str, str]:
+    """读取.npmrc文件，文件不存在时返回空字典"""
+    try:
+        return parse_npmrc(Path(path).read_text(encoding="utf-8"))
+    except FileNotFoundError:
+        return {}
+    except (OSError, UnicodeDecodeError) as e:
+        raise Exception(f"读取{path}失败: {e}")
+
+
+def set_npmrc_value(text: str, key: str, value: Optional[str]) -> str:
+    """在.npmrc内容中设置（value为None时删除）一个配置项
+
+    替换该键第一次出现的行并删除其余重复行，键不存在时追加到末尾；其他行原样保留。
+    """
+    lines = text.splitlines()
+    output = []
+    replaced = False
+    for line in lines:
+        parsed = _parse_line(line)
+        if parsed is None or parsed[0] != key:
+            output.append(line)
+            continue
+        if value is not None and not replaced:
+            output.append(f"{key}={value}")
+        replaced = True
+    if value is not None and not replaced:
+        output.append(f"{key}={value}")
+    return "\n".join(output) + "\n" if output else ""
+
+
+def registry_key(scope: Optional[str] = None) -> str:
+    """源配置的键：默认源为registry，作用域源为 @scope:registry"""
+    return f"{scope}:registry" if scope else "registry"
+
+
+def npmrc_files(npm_config: Dict) -> List[Path]:
+    """npm读取的全局和用户级.npmrc（按优先级从低到高），npm配置中没有路径时使用默认位置"""
+    userconfig = (npm_config.get("userconfig") or os.environ.get("npm_config_userconfig")
+                  or os.environ.get("NPM_CONFIG_USERCONFIG") or str(Path.home() / ".npmrc"))
+    files = [Path(userconfig).expanduser()]
+    globalconfig = npm_config.get("globalconfig") or os.environ.get("npm_config_globalconfig")
+    if globalconfig:
+        files.insert(0, Path(globalconfig).expanduser())
+    return files
+
+
+def configured_registry(files: List[Path], default: str) -> str:
+    """按npm的优先级（环境变量 > 用户级 > 全局）直接从文件解析当前源，不启动npm进程"""
+    registry = os.environ.get("npm_config_registry") or os.environ.get("NPM_CONFIG_REGISTRY")
+    if registry:
+        return registry
+    for path in files:
+        registry = read_npmrc(path).get("registry", registry)
+    return registry or default
@@ -0,0 +1,279 @@
+"""
+包管理器源同步模块
+直接读写 yarn（classic 的 .yarnrc 和 berry 的 .yarnrc.yml）、pnpm 和 bun 的用户级配置文件中的源设置，
+不需要逐个运行各自的命令行，切换npm源时一次完成同步
+"""
+
+import os
+import re
+import shutil
+import sys
+import tempfile
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+from npmrc import parse_npmrc, set_npmrc_value
+
+
+def _update_lines(text: str, match: Callable[[str], bool], new_line: str) -> str:
+    """替换第一处匹配的行并删除其余匹配行，没有匹配时追加到末尾"""
+    output = []
+    replaced = False
+    for line in text.splitlines():
+        if not match(line):
+            output.append(line)
+        elif not replaced:
+            output.append(new_line)
+            replaced = True
+    if not replaced:
+        output.append(new_line)
+    return "\n".join(output) + "\n"
+
+
+def _unquote(value: str) -> str:
+    """去掉值两端的引号"""
+    value = value.strip()
+    if len(value) >= 2 and value[0] == value[-1] and value[0] in "\"'":
+        return value[1:-1]
+    return value
+
+
+# yarn classic: registry "https://..."
+_YARNRC_PATTERN = re.compile(r'^\s*"?registry"?\s+(.+?)\s*$')
+
+
+def parse_yarnrc(text: str) -> Optional[str]:
+    """读取 .yarnrc 中的registry"""
+    value = None
+    for line in text.splitlines():
+        match = _YARNRC_PATTERN.match(line)
+        if match and not line.lstrip().startswith("#"):
+            value = _unquote(match.group(1))
+    return value
+
+
+def update_yarnrc(text: str, url: str) -> str:
+    """设置 .yarnrc 中的registry"""
+    return _update_lines(text, lambda line: bool(_YARNRC_PATTERN.match(line)) and not line.lstrip().startswith("#"),
+                         f'registry "{url}"')
+
+
+# yarn berry: 顶层的 npmRegistryServer: "https://..."
+_YARNRC_YML_PATTERN = re.compile(r'^npmRegistryServer\s*:\s*(.+?)\s*$')
+
+
+def parse_yarnrc_yml(text: str) -> Optional[str]:
+    """读取 .yarnrc.yml 中的npmRegistryServer"""
+    value = None
+    for line in text.splitlines():
+        match = _YARNRC_YML_PATTERN.match(line)
+        if match:
+            value = _unquote(match.group(1).split(" #", 1)[0])
+    return value
+
+
+def update_yarnrc_yml(text: str, url: str) -> str:
+    """设置 .yarnrc.yml 中的npmRegistryServer"""
+    return _update_lines(text, lambda line: bool(_YARNRC_YML_PATTERN.match(line)), f'npmRegistryServer: "{url}"')
+
+
+# bun: [install] 节中的 registry = "https://..."（也可能是 { url = "..." } 形式）
+_BUNFIG_PATTERN = re.compile(r'^\s*registry\s*=\s*(.+?)\s*$')
+_BUNFIG_URL_PATTERN = re.compile(r'url\s*=\s*"([^"]*)"')
+
+
+def _bunfig_install_lines(text: str):
+    """逐行返回 (行, 是否位于[install]节中)"""
+    section = None
+    for line in text.splitlines():
+        stripped = line.strip()
+        if stripped.startswith("[") and stripped.endswith("]"):
+            section = stripped[1:-1].strip()
+        yield line, section == "install"
+
+
+def parse_bunfig(text: str) -> Optional[str]:
+    """读取 bunfig.toml 中 [install] 节的registry"""
+    value = None
+    for line, in_install in _bunfig_install_lines(text):
+        match = _BUNFIG_PATTERN.match(line) if in_install else None
+        if match:
+            raw = match.group(1).split(" #", 1)[0].strip()
+            table = _BUNFIG_URL_PATTERN.search(raw) if raw.startswith("{") else None
+            value = table.group(1) if table else _unquote(raw)
+    return value
+
+
+def update_bunfig(text: str, url: str) -> str:
+    """设置 bunfig.toml 中 [install] 节的registry，没有该节时追加"""
+    output = []
+    replaced = False
+    has_section = False
+    lines = list(_bunfig_install_lines(text))
+    for index, (line, in_install) in enumerate(lines):
+        if in_install and line.strip() == "[install]":
+            has_section = True
+        if in_install and _BUNFIG_PATTERN.match(line):
+            if not replaced:
+                output.append(f'registry = "{url}"')
+                replaced = True
+            continue
+        output.append(line)
+        # [install]节结束（或文件结束）时仍未替换，则插入到该节最后一个非空行之后
+        next_in_install = lines[index + 1][1] if index + 1 < len(lines) else False
+        if in_install and not next_in_install and not replaced:
+            blanks = []
+            while output and not output[-1].strip():
+                blanks.append(output.pop())
+            output.append(f'registry = "{url}"')
+            output.extend(blanks)
+            replaced = True
+    if not has_section:
+        if output and output[-1].strip():
+            output.append("")
+        output.extend(["[install]", f'registry = "{url}"'])
+    return "\n".join(output) + "\n"
+
+
+def config_home() -> Path:
+    """各平台的用户配置目录"""
+    if os.name == "nt":
+        return Path(os.environ.get("LOCALAPPDATA") or Path.home() / "AppData" / "Local")
+    if sys.platform == "darwin":
+        return Path.home() / "Library" / "Preferences"
+    return Path(os.environ.get("XDG_CONFIG_HOME") or Path.home() / ".config")
+
+
+class ToolConfig:
+    """一个包管理器的源配置文件
+
+    parse从文件内容读取源（未设置时为None），update返回设置源之后的文件内容。
+    inherits_npmrc为True时未设置则沿用.npmrc中的源，否则使用default。
+    requires_file为True时只有配置文件存在才视为在使用（无法不运行命令就区分的版本，如yarn berry）。
+    """
+
+    def __init__(self, name: str, label: str, command: str, path: Path,
+                 parse: Callable[[str], Optional[str]], update: Callable[[str, str], str],
+                 inherits_npmrc: bool = True, default: Optional[str] = None, requires_file: bool = False):
+        self.name = name
+        self.label = label
+        self.command = command
+        self.path = path
+        self.parse = parse
+        self.update = update
+        self.inherits_npmrc = inherits_npmrc
+        self.default = default
+        self.requires_file = requires_file
+
+    def read_text(self) -> Tuple[Optional[str], Optional[str]]:
+        """读取配置文件，返回 (内容, 错误信息)
+
+        文件不存在时内容为None且没有错误；无法读取或不是UTF-8编码时返回错误信息，不能当作空文件覆盖。
+        """
+        try:
+            return self.path.read_text(encoding="utf-8"), None
+        except FileNotFoundError:
+            return None, None
+        except (OSError, UnicodeDecodeError) as e:
+            return None, str(e)
+
+    def write_text(self, text: str) -> None:
+        """先写临时文件再替换，保留原文件的权限（配置文件中可能有令牌）"""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=self.path.parent, prefix=f".{self.path.name}.", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(text)
+            if self.path.exists():
+                os.chmod(tmp, self.path.stat().st_mode & 0o777)
+            os.replace(tmp, self.path)
+        except OSError:
+            if os.path.exists(tmp):
+                os.unlink(tmp)
+            raise
+
+    def installed(self) -> bool:
+        """命令在PATH中，或已有配置文件"""
+        if self.path.exists():
+            return True
+        return not self.requires_file and shutil.which(self.command) is not None
+
+
+def default_tools(home: Optional[Path] = None) -> List[ToolConfig]:
+    """各包管理器的用户级配置文件（指定home时配置目录为home/.config）"""
+    home = Path(home) if home else Path.home()
+    config_dir = config_home() if home == Path.home() else home / ".config"
+    pnpm_rc = config_dir / "pnpm" / ("config/rc" if os.name == "nt" else "rc")
+    xdg = os.environ.get("XDG_CONFIG_HOME") if home == Path.home() else None
+    bunfig = Path(xdg) / ".bunfig.toml" if xdg else home / ".bunfig.toml"
+    return [
+        ToolConfig("yarn", "yarn classic", "yarn", home / ".yarnrc", parse_yarnrc, update_yarnrc),
+        ToolConfig("yarn-berry", "yarn berry", "yarn", home / ".yarnrc.yml", parse_yarnrc_yml, update_yarnrc_yml,
+                   inherits_npmrc=False, default="https://registry.yarnpkg.com", requires_file=True),
+        ToolConfig("pnpm", "pnpm", "pnpm", pnpm_rc,
+                   lambda text: parse_npmrc(text).get("registry"),
+                   lambda text, url: set_npmrc_value(text, "registry", url)),
+        ToolConfig("bun", "bun", "bun", bunfig, parse_bunfig, update_bunfig)
+    ]
+
+
+def _same_registry(a: Optional[str], b: Optional[str]) -> bool:
+    """比较两个源地址（忽略末尾的/）"""
+    return bool(a) and bool(b) and a.rstrip("/") == b.rstrip("/")
+
+
+class PackageManagerSync:
+    """读写其他包管理器的源设置，使其与npm保持一致"""
+
+    def __init__(self, home: Optional[Path] = None, tools: Optional[List[ToolConfig]] = None):
+        self.tools = tools if tools is not None else default_tools(home)
+
+    def status(self, npm_registry: str) -> List[Dict]:
+        """各包管理器实际使用的源及是否与npm一致（未安装的包管理器不列出）
+
+        返回 [{"name", "label", "path", "registry", "effective", "in_sync", "error"}]，
+        registry为配置文件中的设置，effective为考虑沿用.npmrc和默认值后实际使用的源；
+        配置文件无法读取时effective为None、in_sync为False，error为错误信息。
+        """
+        result = []
+        for tool in self.tools:
+            if not tool.installed():
+                continue
+            text, error = tool.read_text()
+            registry = tool.parse(text) if text else None
+            effective = None if error else registry or (npm_registry if tool.inherits_npmrc else tool.default)
+            result.append({"name": tool.name, "label": tool.label, "path": tool.path, "registry": registry,
+                           "effective": effective, "in_sync": _same_registry(effective, npm_registry),
+                           "error": error})
+        return result
+
+    def out_of_sync(self, npm_registry: str) -> List[Dict]:
+        """与npm不一致的包管理器"""
+        return [item for item in self.status(npm_registry) if not item["in_sync"]]
+
+    def set_registry(self, registry_url: str, only_out_of_sync: bool = True) -> Dict[str, Optional[str]]:
+        """把源写入各包管理器的配置文件，返回 {包管理器: 错误信息（成功时为None）}
+
+        配置文件存在但无法读取时跳过该包管理器（不覆盖原文件），返回读取错误。
+        """
+        results = {}
+        for tool in self.tools:
+            if not tool.installed():
+                continue
+            text, error = tool.read_text()
+            if error:
+                results[tool.name] = f"读取{tool.path}失败，未修改: {error}"
+                continue
+            text = text or ""
+            current = tool.parse(text)
+            # 未单独设置且沿用.npmrc的包管理器会随npm一起切换，不需要写入
+            if only_out_of_sync and (_same_registry(current, registry_url)
+                                     or (current is None and tool.inherits_npmrc)):
+                continue
+            try:
+                tool.write_text(tool.update(text, registry_url))
+                results[tool.name] = None
+            except OSError as e:
+                print(f"写入{tool.path}失败: {e}")
+                results[tool.name] = str(e)
+        return results
@@ -0,0 +1,239 @@
+"""
+测速轨迹记录与回放模块
+将每次探测（时间戳、分阶段耗时、状态码、字节数）记录为紧凑的JSON Lines轨迹文件，
+并提供回放工具：在模拟时钟上重新评估评分、超时和并发设置，或通过本地模拟源重放真实请求
+"""
+
+import gzip
+import json
+import threading
+import time
+from collections import OrderedDict, deque
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional
+
+from fake_registry import FakeRegistryServer
+
+
+# 轨迹记录中保存的探测字段
+TRACE_FIELDS = ("status", "dns", "connect", "tls", "ttfb", "transfer", "total", "bytes")
+
+
+def _open_trace(path: Path, mode: str):
+    """打开轨迹文件，.gz后缀时使用gzip压缩"""
+    if path.suffix == ".gz":
+        return gzip.open(path, mode + "t", encoding="utf-8")
+    return open(path, mode, encoding="utf-8")
+
+
+def trace_entry(url: str, kind: str, result: Dict, run_id: int, timestamp: float) -> Dict:
+    """把探测结果转换为紧凑的轨迹记录"""
+    entry = {"t": round(timestamp, 3), "run": run_id, "url": url, "kind": kind,
+             "ok": bool(result.get("success"))}
+    for field in TRACE_FIELDS:
+        if result.get(field) is not None:
+            entry[field] = result[field]
+    if result.get("error"):
+        entry["err"] = result["error"]
+    return entry
+
+
+class TraceRecorder:
+    """探测轨迹记录器（线程安全，逐行追加写入）"""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._file = _open_trace(self.path, "a")
+        self.run_id = 0
+
+    def begin_run(self) -> None:
+        """开始新一轮测试，同一轮的记录共享run编号"""
+        self.run_id = int(time.time() * 1000)
+
+    def record(self, url: str, kind: str, result: Dict) -> None:
+        """记录一次探测结果"""
+        entry = trace_entry(url, kind, result, self.run_id, time.time())
+        line = json.dumps(entry, ensure_ascii=False, separators=(",", ":"))
+        with self._lock:
+            self._file.write(line + "\n")
+            self._file.flush()
+
+    def close(self) -> None:
+        """关闭轨迹文件"""
+        with self._lock:
+            self._file.close()
+
+
+def load_trace(path: Path) -> List[Dict]:
+    """读取轨迹文件，跳过损坏的行"""
+    records = []
+    with _open_trace(Path(path), "r") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                records.append(json.loads(line))
+            except json.JSONDecodeError:
+                continue
+    return records
+
+
+class SimulatedClock:
+    """模拟时钟，回放时代替真实时间推进"""
+
+    def __init__(self, start: float = 0.0):
+        self.now = start
+
+    def time(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float) -> None:
+        self.now += max(seconds, 0.0)
+
+
+def fastest_strategy(results: Dict[str, Dict]) -> Optional[str]:
+    """默认选源策略：选择本轮成功且耗时最短的源"""
+    successful = {url: r["total"] for url, r in results.items() if r["ok"]}
+    if not successful:
+        return None
+    return min(successful, key=successful.get)
+
+
+class TraceReplayer:
+    """在模拟时钟上回放轨迹，评估选源策略、超时和并发设置"""
+
+    def __init__(self, records: Iterable[Dict], kind: str = "phases"):
+        self.runs = OrderedDict()
+        for record in sorted(records, key=lambda r: r["t"]):
+            if record.get("kind", kind) != kind:
+                continue
+            self.runs.setdefault(record["run"], []).append(record)
+
+    @staticmethod
+    def _apply_timeout(record: Dict, timeout_ms: Optional[float]) -> Dict:
+        """按新的超时重新判定一次探测：超时的探测视为失败，只花费超时时间"""
+        result = dict(record)
+        total = record.get("total")
+        if not record.get("ok") and total is None:
+            # 连接失败且未记录耗时，按超时时间计算开销
+            result["total"] = timeout_ms or 0.0
+        elif timeout_ms is not None and total is not None and total > timeout_ms:
+            result["ok"] = False
+            result["total"] = timeout_ms
+        return result
+
+    @staticmethod
+    def _wall_time(durations: List[float], concurrency: int, clock: SimulatedClock) -> float:
+        """按并发数把探测排到工作线程上，返回整轮的模拟墙钟时间（毫秒）"""
+        start = clock.time()
+        workers = [0.0] * max(concurrency, 1)
+        for duration in durations:
+            index = workers.index(min(workers))
+            workers[index] += duration
+        clock.sleep(max(workers) / 1000 if workers else 0.0)
+        return (clock.time() - start) * 1000
+
+    def replay(self, strategy: Callable[[Dict[str, Dict]], Optional[str]] = fastest_strategy,
+               timeout_ms: Optional[float] = None, concurrency: int = 1,
+               clock: Optional[SimulatedClock] = None) -> Dict:
+        """回放全部测试轮次
+
+        每一轮中strategy根据（按新超时判定后的）探测结果选出一个源，
+        与本轮真实最快的源比较得到遗憾值（多花的毫秒数）。
+        """
+        clock = clock or SimulatedClock()
+        summary = {"runs": 0, "choices": {}, "regret_ms": 0.0, "wall_ms": 0.0,
+                   "failed_runs": 0, "per_run": []}
+
+        for run_id, records in self.runs.items():
+            results = {}
+            for record in records:
+                results[record["url"]] = self._apply_timeout(record, timeout_ms)
+
+            wall = self._wall_time([r.get("total") or 0.0 for r in results.values()], concurrency, clock)
+            choice = strategy(results)
+            actual = {url: r["total"] for url, r in results.items() if r["ok"]}
+            best = min(actual.values()) if actual else None
+
+            if choice is None or choice not in actual:
+                summary["failed_runs"] += 1
+                regret = None
+            else:
+                regret = actual[choice] - best
+                summary["regret_ms"] += regret
+                summary["choices"][choice] = summary["choices"].get(choice, 0) + 1
+
+            summary["runs"] += 1
+            summary["wall_ms"] += wall
+            summary["per_run"].append({"run": run_id, "choice": choice, "regret_ms": regret,
+                                       "wall_ms": round(wall, 2)})
+
+        summary["regret_ms"] = round(summary["regret_ms"], 2)
+        summary["wall_ms"] = round(summary["wall_ms"], 2)
+        if summary["runs"]:
+            summary["avg_regret_ms"] = round(summary["regret_ms"] / summary["runs"], 2)
+            summary["avg_wall_ms"] = round(summary["wall_ms"] / summary["runs"], 2)
+        return summary
+
+
+class ReplayServer(FakeRegistryServer):
+    """按轨迹回放单个源的模拟服务器
+
+    每个请求依次取出一条记录，按记录的耗时延迟响应、返回记录的状态码，
+    失败且无状态码的记录模拟为连接中断。记录用完后循环使用。
+    """
+
+    def __init__(self, records: List[Dict], time_scale: float = 1.0, **kwargs):
+        super().__init__(**kwargs)
+        self.records = list(records)
+        self.time_scale = time_scale
+        self._queue = deque(self.records)
+        self._queue_lock = threading.Lock()
+
+    def plan_request(self, path: str) -> Dict:
+        with self._queue_lock:
+            if not self._queue:
+                self._queue.extend(self.records)
+            record = self._queue.popleft() if self._queue else {}
+
+        status = record.get("status")
+        # 开始传输之前的全部耗时（DNS、连接、TLS、首字节）作为响应延迟
+        delay = ((record.get("total") or 0.0) - (record.get("transfer") or 0.0)) / 1000 * self.time_scale
+        drop = not record.get("ok", True) and status is None
+        return {"drop": drop, "delay": delay, "status": status if status not in (None, 200) else None}
+
+
+def replay_servers(records: Iterable[Dict], time_scale: float = 1.0) -> Dict[str, ReplayServer]:
+    """为轨迹中的每个源创建一个回放服务器（未启动），返回 {原URL: 服务器}"""
+    by_url = OrderedDict()
+    for record in sorted(records, key=lambda r: r["t"]):
+        if record.get("kind", "phases") == "phases":
+            by_url.setdefault(record["url"], []).append(record)
+    return {url: ReplayServer(items, time_scale=time_scale) for url, items in by_url.items()}
+
+
+def replay_live(records: List[Dict], probe: Callable[[str], Dict], time_scale: float = 1.0) -> List[Dict]:
+    """通过本地回放服务器重放轨迹：用真实的探测代码逐轮测试每个回放源
+
+    probe通常为使用RateLimiter.unlimited()的NPMRegistryManager.test_registry_phases：
+    按time_scale压缩后的请求很密集，回放的429也不代表真实限流。仍被限速推迟的探测
+    没有实际发出，不写入新轨迹。返回的新轨迹仍以原URL标识源，可以交给TraceReplayer评估。
+    """
+    servers = replay_servers(records, time_scale)
+    run_count = len(TraceReplayer(records).runs)
+    output = []
+    for server in servers.values():
+        server.start()
+    try:
+        for run_id in range(run_count):
+            for url, server in servers.items():
+                result = probe(server.url)
+                if not result.get("deferred"):
+                    output.append(trace_entry(url, "phases", result, run_id, time.time()))
+    finally:
+        for server in servers.values():
+            server.stop()
+    return output
@@ -0,0 +1,238 @@
+"""
+Range分片吞吐量探测模块
+按字节预算用HTTP Range请求从大tarball的几个位置各取一小段，在同一连接上拟合
+"每次请求的固定耗时 + 字节数/带宽"，估算下载吞吐量和新连接的爬升开销，适合按流量计费或很慢的网络；
+源不支持Range时退回为在预算内读取完整响应的开头后断开
+"""
+
+import json
+import re
+import time
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import quote
+
+import requests
+
+
+# 默认的总字节预算
+DEFAULT_BUDGET = 256 * 1024
+
+# 默认的分片数
+DEFAULT_SLICES = 4
+
+# 单个分片的最小字节数（太小时传输耗时被延迟淹没）
+MIN_SLICE = 4 * 1024
+
+_CONTENT_RANGE = re.compile(r"^\s*bytes\s+(\d+)-(\d+)/(\d+|\*)\s*$", re.IGNORECASE)
+
+
+class MetadataError(ValueError):
+    """获取包元数据失败或超出字节预算，spent为已下载的字节数"""
+
+    def __init__(self, message: str, spent: int):
+        super().__init__(message)
+        self.spent = spent
+
+
+def parse_content_range(value: Optional[str]) -> Optional[Tuple[int, int, Optional[int]]]:
+    """解析Content-Range响应头，返回 (起始, 结束, 总长度)，总长度未知时为None"""
+    match = _CONTENT_RANGE.match(value or "")
+    if not match:
+        return None
+    start, end, total = match.groups()
+    return int(start), int(end), None if total == "*" else int(total)
+
+
+def slice_sizes(budget: int, slices: int) -> List[int]:
+    """把预算分成按2倍递增的分片（不同大小才能拟合出带宽），预算不够时减少分片数"""
+    slices = max(min(slices, budget // MIN_SLICE), 1)
+    while slices > 1 and budget // (2 ** slices - 1) < MIN_SLICE:
+        slices -= 1
+    base = budget // (2 ** slices - 1)
+    return [base * 2 ** index for index in range(slices)]
+
+
+def slice_offsets(total: int, sizes: List[int]) -> List[int]:
+    """各分片在文件中的起始位置：均匀分布在文件中，不超出文件末尾"""
+    step = total // len(sizes)
+    return [max(min(index * step, total - size), 0) for index, size in enumerate(sizes)]
+
+
+def fit_latency_bandwidth(samples: List[Dict]) -> Tuple[Optional[float], Optional[float]]:
+    """对同一连接上的分片做最小二乘拟合 耗时 = 固定耗时 + 字节数/带宽
+
+    返回 (每次请求的固定耗时（秒）, 带宽（字节/秒）)，样本不足或拟合出的带宽不为正时带宽为None。
+    """
+    points = [(sample["bytes"], sample["elapsed"]) for sample in samples if sample["bytes"]]
+    if len(points) < 2 or len({size for size, _ in points}) < 2:
+        return None, None
+    mean_x = sum(size for size, _ in points) / len(points)
+    mean_y = sum(elapsed for _, elapsed in points) / len(points)
+    covariance = sum((size - mean_x) * (elapsed - mean_y) for size, elapsed in points)
+    variance = sum((size - mean_x) ** 2 for size, _ in points)
+    slope = covariance / variance
+    if slope <= 0:
+        return None, None
+    return max(mean_y - slope * mean_x, 0.0), 1 / slope
+
+
+def summarize(samples: List[Dict], range_supported: bool, metadata_bytes: int = 0) -> Dict:
+    """由各分片的测量结果估算吞吐量（字节/秒）、每次请求的固定耗时和新连接的爬升开销（毫秒）
+
+    第一个分片在新连接上，包含建立连接和TCP慢启动的开销，只用于估算爬升开销；
+    其余分片拟合出的带宽不可用时（如本机或延迟抖动较大），按传输阶段的平均速度估算。
+    """
+    result = {"throughput": None, "latency_ms": None, "ramp_up_ms": None, "range_supported": range_supported,
+              "slices": len(samples), "bytes": sum(sample["bytes"] for sample in samples) + metadata_bytes}
+    if not samples:
+        return result
+
+    warm = samples[1:]
+    latency, bandwidth = fit_latency_bandwidth(warm)
+    if bandwidth is None:
+        measured = warm or samples
+        transfer = sum(sample["transfer"] for sample in measured)
+        received = sum(sample["bytes"] for sample in measured)
+        if transfer > 0 and received:
+            bandwidth = received / transfer
+        latency = sum(sample["ttfb"] for sample in warm) / len(warm) if warm else None
+
+    result["throughput"] = round(bandwidth) if bandwidth else None
+    if latency is not None:
+        result["latency_ms"] = round(latency * 1000, 2)
+        if bandwidth:
+            cold = samples[0]
+            expected = latency + cold["bytes"] / bandwidth
+            result["ramp_up_ms"] = round(max(cold["elapsed"] - expected, 0.0) * 1000, 2)
+    return result
+
+
+def read_capped(response: requests.Response, limit: int) -> Tuple[bytes, bool]:
+    """从流式响应中最多读取limit字节并关闭响应，返回 (已读取的内容, 是否完整)
+
+    Content-Length超过limit时不读取；否则读满limit后再试读1字节判断是否还有剩余。
+    """
+    body = bytearray()
+    with response:
+        length = response.headers.get("Content-Length")
+        if limit <= 0 or (length and length.isdigit() and int(length) > limit):
+            return b"", False
+        while len(body) < limit:
+            chunk = response.raw.read(min(16 * 1024, limit - len(body)), decode_content=True)
+            if not chunk:
+                return bytes(body), True
+            body += chunk
+        extra = response.raw.read(1, decode_content=True)
+    return bytes(body) + extra, not extra
+
+
+def resolve_latest_tarball(npm_manager, registry_url: str, package: str, timeout: int = 10,
+                           max_bytes: int = DEFAULT_BUDGET) -> Tuple[str, int]:
+    """获取包最新版本的tarball地址，返回 (地址, 下载的元数据字节数)
+
+    优先请求 /{包名}/latest（只有一个版本的元数据，通常几KB），源不支持时退回精简包元数据。
+    两次请求合计最多读取max_bytes字节，超出预算或请求失败时抛出MetadataError。
+    """
+    base = registry_url.rstrip("/")
+    response = npm_manager._http_get(f"{base}/{quote(package, safe='@')}/latest", timeout=timeout, stream=True)
+    body, complete = read_capped(response, max_bytes)
+    spent = len(body)
+    if not complete:
+        raise MetadataError(f"{package}的版本元数据超过{max_bytes}字节的预算", spent)
+    try:
+        doc = json.loads(body) if response.status_code == 200 else {}
+        if doc.get("dist", {}).get("tarball"):
+            return doc["dist"]["tarball"], spent
+    except (ValueError, AttributeError):
+        pass
+
+    response = npm_manager._http_get(f"{base}/{quote(package, safe='@')}", timeout=timeout, stream=True,
+                                     headers={"Accept": "application/vnd.npm.install-v1+json"})
+    body, complete = read_capped(response, max_bytes - spent)
+    spent += len(body)
+    if not complete:
+        raise MetadataError(f"{package}的包元数据超过{max_bytes}字节的预算", spent)
+    if response.status_code != 200:
+        raise MetadataError(f"获取{package}的包元数据失败: HTTP {response.status_code}", spent)
+    try:
+        doc = json.loads(body)
+        latest = doc["dist-tags"]["latest"]
+        return doc["versions"][latest]["dist"]["tarball"], spent
+    except (ValueError, KeyError, TypeError) as e:
+        raise MetadataError(f"解析{package}的包元数据失败: {e}", spent)
+
+
+def _fetch_slice(npm_manager, session: requests.Session, url: str, offset: int, size: int,
+                 timeout: int, full_limit: Optional[int] = None) -> Tuple[Dict, requests.Response]:
+    """请求一个分片，最多读取size字节（源忽略Range返回完整响应时最多读取full_limit字节），返回 (测量结果, 响应)"""
+    start = time.perf_counter()
+    response = npm_manager._http_get(url, session=session, timeout=timeout, stream=True,
+                                     headers={"Range": f"bytes={offset}-{offset + size - 1}",
+                                              "Accept-Encoding": "identity"})
+    headers_at = time.perf_counter()
+    limit = size if response.status_code == 206 else (full_limit or size)
+    received = 0
+    with response:
+        response.raise_for_status()
+        while received < limit:
+            chunk = response.raw.read(min(16 * 1024, limit - received), decode_content=True)
+            if not chunk:
+                break
+            received += len(chunk)
+    end = time.perf_counter()
+    sample = {"offset": offset, "bytes": received, "status": response.status_code,
+              "ttfb": headers_at - start, "transfer": end - headers_at, "elapsed": end - start}
+    return sample, response
+
+
+def measure_range_throughput(npm_manager, tarball_url: str, budget: int = DEFAULT_BUDGET,
+                             slices: int = DEFAULT_SLICES, timeout: int = 10, metadata_bytes: int = 0) -> Dict:
+    """在budget字节内用Range分片估算tarball所在源的吞吐量
+
+    分片在同一个连接上依次请求。源忽略Range（返回200）时在预算内读取完整响应的开头后断开，
+    按该次传输估算吞吐量，range_supported为False。metadata_bytes为已下载的元数据字节数，
+    计入预算；剩余预算不足一个分片时不再请求。返回summarize的结果，另含samples和error。
+    """
+    samples: List[Dict] = []
+    remaining = budget - metadata_bytes
+    if remaining < MIN_SLICE:
+        result = summarize(samples, True, metadata_bytes)
+        result.update(range_supported=None, samples=samples,
+                      error=f"元数据已用去{metadata_bytes}字节，剩余预算不足{MIN_SLICE}字节")
+        return result
+
+    sizes = slice_sizes(remaining, slices)
+    session = npm_manager.new_session(pool_size=1)
+    range_supported = True
+    error = None
+    try:
+        sample, response = _fetch_slice(npm_manager, session, tarball_url, 0, sizes[0], timeout, sum(sizes))
+        samples.append(sample)
+        content_range = parse_content_range(response.headers.get("Content-Range"))
+        if response.status_code != 206 or content_range is None:
+            # 源忽略了Range：剩余响应体未读完，连接不能复用，不再请求其他分片
+            range_supported = False
+            response.close()
+        else:
+            total = content_range[2] or content_range[1] + 1
+            for offset, size in list(zip(slice_offsets(total, sizes), sizes))[1:]:
+                size = min(size, total - offset)
+                if size <= 0 or sum(sample["bytes"] for sample in samples) + size > remaining:
+                    break
+                sample, response = _fetch_slice(npm_manager, session, tarball_url, offset, size, timeout)
+                if response.status_code != 206:
+                    range_supported = False
+                    break
+                samples.append(sample)
+    except requests.RequestException as e:
+        error = str(e)
+    finally:
+        session.close()
+
+    # 源不支持Range时只有第一个分片，按其传输阶段的速度估算，首字节时间作为固定耗时
+    result = summarize(samples if range_supported else samples[:1], range_supported, metadata_bytes)
+    if not range_supported and samples:
+        result["latency_ms"] = round(samples[0]["ttfb"] * 1000, 2)
+    result["samples"] = samples
+    result["error"] = error
+    return result
@@ -0,0 +1,165 @@
+"""
+探测限速模块
+按源主机的令牌桶和全局每分钟探测预算控制探测频率，避免大量机器同时测速时被源限流。
+收到429（或带Retry-After的503）后在指定时间内暂停探测该主机，无法及时执行的探测记为推迟。
+"""
+
+import random
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+
+# 收到429但没有Retry-After时的默认暂停时间（秒）
+DEFAULT_BACKOFF = 60.0
+
+# Retry-After的上限，避免异常值让主机长时间无法测试
+MAX_BACKOFF = 3600.0
+
+
+def parse_retry_after(value: Optional[str], now: Optional[float] = None) -> Optional[float]:
+    """解析Retry-After头（秒数或HTTP日期），返回需要等待的秒数"""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return min(float(value), MAX_BACKOFF)
+    try:
+        from email.utils import parsedate_to_datetime
+        retry_at = parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError, IndexError):
+        return None
+    now = time.time() if now is None else now
+    return min(max(retry_at - now, 0.0), MAX_BACKOFF)
+
+
+class TokenBucket:
+    """令牌桶：以rate个/秒的速度补充令牌，最多积累capacity个"""
+
+    __slots__ = ("rate", "capacity", "tokens", "updated")
+
+    def __init__(self, rate: float, capacity: float, now: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = now
+
+    def wait_time(self, now: float) -> float:
+        """补充令牌后，返回获得一个令牌还需等待的秒数"""
+        if self.rate <= 0:
+            return 0.0
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self) -> None:
+        """预占一个令牌（令牌可以暂时为负，表示已被排队的探测占用）"""
+        if self.rate > 0:
+            self.tokens -= 1
+
+
+class RateLimiter:
+    """探测限速器（线程安全）
+
+    主机以host:port区分。per_host_rate/per_host_burst为每个主机的令牌桶参数，budget_per_minute为全局预算，
+    值为0时不限制。获取许可需要等待超过max_wait秒的探测直接推迟，不占用预算。
+    throttle为False时忽略429等限流响应，不暂停主机。
+    """
+
+    def __init__(self, per_host_rate: float = 1.0, per_host_burst: int = 6,
+                 budget_per_minute: int = 120, jitter: float = 0.05, max_wait: float = 5.0,
+                 clock: Callable[[], float] = time.monotonic, sleep: Callable[[float], None] = time.sleep,
+                 seed: Optional[int] = None, throttle: bool = True):
+        self.per_host_rate = per_host_rate
+        self.per_host_burst = per_host_burst
+        self.budget_per_minute = budget_per_minute
+        self.jitter = jitter
+        self.max_wait = max_wait
+        self.throttle = throttle
+        self._clock = clock
+        self._sleep = sleep
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._global = TokenBucket(budget_per_minute / 60, budget_per_minute, clock())
+        self._blocked_until: Dict[str, float] = {}
+        self.stats = {"acquired": 0, "deferred": 0, "throttled": 0, "waited_ms": 0.0}
+
+    def _bucket(self, host: str, now: float) -> TokenBucket:
+        """获取主机的令牌桶"""
+        bucket = self._buckets.get(host)
+        if bucket is None:
+            bucket = self._buckets[host] = TokenBucket(self.per_host_rate, self.per_host_burst, now)
+        return bucket
+
+    def blocked_for(self, host: str) -> float:
+        """主机因限流还需暂停的秒数"""
+        with self._lock:
+            return max(self._blocked_until.get(host, 0.0) - self._clock(), 0.0)
+
+    def acquire(self, host: str) -> bool:
+        """为一次探测获取许可，必要时等待（含随机抖动）；需要推迟时返回False
+
+        没有排队时立即返回，不增加交互测速的耗时。
+        """
+        with self._lock:
+            now = self._clock()
+            bucket = self._bucket(host, now)
+            wait = max(
+                self._blocked_until.get(host, 0.0) - now,
+                bucket.wait_time(now),
+                self._global.wait_time(now) if self.budget_per_minute > 0 else 0.0
+            )
+            if wait > self.max_wait:
+                self.stats["deferred"] += 1
+                return False
+            bucket.take()
+            if self.budget_per_minute > 0:
+                self._global.take()
+            if wait > 0 and self.jitter:
+                # 需要排队时叠加随机抖动，避免排队的探测在同一时刻一起发出
+                wait += self._random.uniform(0, self.jitter)
+            self.stats["acquired"] += 1
+            self.stats["waited_ms"] += wait * 1000
+
+        if wait > 0:
+            self._sleep(wait)
+        return True
+
+    def report(self, host: str, status: Optional[int], retry_after: Optional[float] = None) -> None:
+        """根据响应状态更新限流状态：429或带Retry-After的503会暂停该主机"""
+        if not self.throttle:
+            return
+        if status == 429 or (status == 503 and retry_after is not None):
+            backoff = retry_after if retry_after is not None else DEFAULT_BACKOFF
+            with self._lock:
+                until = self._clock() + backoff
+                self._blocked_until[host] = max(self._blocked_until.get(host, 0.0), until)
+                self.stats["throttled"] += 1
+
+    @classmethod
+    def from_config(cls, config_manager) -> "RateLimiter":
+        """按配置创建限速器"""
+        return cls(per_host_rate=config_manager.get("probe_rate_per_host", 1.0),
+                   per_host_burst=config_manager.get("probe_burst_per_host", 6),
+                   budget_per_minute=config_manager.get("probe_budget_per_minute", 120))
+
+    @classmethod
+    def unlimited(cls) -> "RateLimiter":
+        """不限速、也不因限流响应暂停的限速器（用于回放本地模拟源）"""
+        return cls(per_host_rate=0, budget_per_minute=0, jitter=0, throttle=False)
+
+    def next_jitter(self, interval: float, ratio: float = 0.1) -> float:
+        """为周期性测速的间隔加上±ratio的随机抖动"""
+        with self._lock:
+            return max(interval * (1 + self._random.uniform(-ratio, ratio)), 0.0)
+
+    def get_stats(self) -> Dict:
+        """获取限速统计"""
+        with self._lock:
+            now = self._clock()
+            stats = dict(self.stats)
+            stats["waited_ms"] = round(stats["waited_ms"], 2)
+            stats["blocked_hosts"] = {host: round(until - now, 1)
+                                      for host, until in self._blocked_until.items() if until > now}
+            return stats
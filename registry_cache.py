@@ -0,0 +1,152 @@
+"""
+源请求缓存模块
+提供内存LRU + 磁盘两级缓存，支持ETag/Last-Modified条件请求重新验证
+"""
+
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Callable, Dict, Optional
+
+
+class RegistryCache:
+    """源请求缓存"""
+
+    def __init__(self, cache_dir: Optional[Path] = None, ttl: int = 300, max_entries: int = 64):
+        self.cache_dir = Path(cache_dir) if cache_dir else Path.home() / ".npm-registry-manager" / "cache"
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "revalidations": 0, "not_modified": 0}
+
+        try:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+        except OSError:
+            self.cache_dir = None
+
+    def _disk_path(self, url: str) -> Optional[Path]:
+        """获取URL对应的磁盘缓存文件"""
+        if self.cache_dir is None:
+            return None
+        return self.cache_dir / f"{hashlib.sha1(url.encode('utf-8')).hexdigest()}.json"
+
+    def get(self, url: str) -> Optional[Dict]:
+        """读取缓存条目（先内存后磁盘）"""
+        with self._lock:
+            entry = self._memory.get(url)
+            if entry is not None:
+                self._memory.move_to_end(url)
+                return entry
+
+        path = self._disk_path(url)
+        if path is None or not path.exists():
+            return None
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+        except (json.JSONDecodeError, IOError):
+            return None
+
+        self._remember(url, entry)
+        return entry
+
+    def put(self, url: str, entry: Dict) -> None:
+        """写入缓存条目"""
+        self._remember(url, entry)
+
+        path = self._disk_path(url)
+        if path is None:
+            return
+        try:
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(entry, f, ensure_ascii=False)
+        except IOError as e:
+            print(f"写入缓存失败: {e}")
+
+    def _remember(self, url: str, entry: Dict) -> None:
+        """放入内存LRU，超出容量时淘汰最久未使用的条目"""
+        with self._lock:
+            self._memory[url] = entry
+            self._memory.move_to_end(url)
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
+
+    def is_fresh(self, entry: Dict) -> bool:
+        """判断条目是否仍在TTL内"""
+        return time.time() - entry.get("fetched_at", 0) < self.ttl
+
+    def conditional_headers(self, entry: Optional[Dict]) -> Dict[str, str]:
+        """根据缓存条目生成条件请求头"""
+        headers = {}
+        if entry:
+            if entry.get("etag"):
+                headers["If-None-Match"] = entry["etag"]
+            if entry.get("last_modified"):
+                headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def fetch(self, url: str, getter: Callable, timeout: int = 5, keep_body: bool = False) -> Dict:
+        """带缓存地获取URL，返回缓存条目
+
+        新鲜条目直接返回；过期条目带条件头重新验证，304时仅刷新时间戳。
+        请求异常会向上抛出，由调用方处理。
+        """
+        entry = self.get(url)
+        if entry is not None and self.is_fresh(entry):
+            self._count("hits")
+            return entry
+
+        headers = self.conditional_headers(entry)
+        if headers:
+            self._count("revalidations")
+
+        response = getter(url, timeout=timeout, headers=headers)
+
+        if entry is not None and response.status_code == 304:
+            self._count("not_modified")
+            entry = dict(entry, fetched_at=time.time())
+            self.put(url, entry)
+            return entry
+
+        self._count("misses")
+        entry = {
+            "url": url,
+            "status_code": response.status_code,
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+            "fetched_at": time.time()
+        }
+        if keep_body:
+            entry["body"] = response.text
+
+        # 只缓存成功的响应，错误状态下次重新请求
+        if 200 <= response.status_code < 300:
+            self.put(url, entry)
+        return entry
+
+    def _count(self, event: str) -> None:
+        """统计计数加一（fetch会被多个测速线程并发调用）"""
+        with self._lock:
+            self.stats[event] += 1
+
+    def clear(self) -> None:
+        """清空缓存"""
+        with self._lock:
+            self._memory.clear()
+        if self.cache_dir is not None and self.cache_dir.exists():
+            for path in self.cache_dir.glob("*.json"):
+                try:
+                    path.unlink()
+                except OSError:
+                    pass
+
+    def get_stats(self) -> Dict[str, int]:
+        """获取缓存命中统计"""
+        with self._lock:
+            stats = dict(self.stats)
+            stats["entries"] = len(self._memory)
+        return stats
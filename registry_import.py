@@ -0,0 +1,169 @@
+"""
+源列表批量导入模块
+解析纯文本、JSON或nrm的registries.json格式的源列表，按规范化后的URL去重，
+在后台并发验证可访问性，验证通过的源一次性写入配置
+"""
+
+import json
+import re
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit, urlunsplit
+
+
+# 默认并发验证数
+DEFAULT_WORKERS = 16
+
+# 纯文本中每行的分隔符：名称与URL之间可以是空白、逗号、等号或制表符
+_LINE_SPLIT = re.compile(r"\s*[,=\t]\s*|\s+")
+
+
+def normalize_registry_url(url: str) -> Optional[str]:
+    """规范化源URL（小写协议和主机名、去掉默认端口和多余的/、以/结尾），无效时返回None"""
+    url = url.strip().strip("\"'")
+    try:
+        parts = urlsplit(url)
+        port = parts.port
+    except ValueError:
+        return None
+    scheme = parts.scheme.lower()
+    if scheme not in ("http", "https") or not parts.hostname:
+        return None
+    host = parts.hostname.lower()
+    if ":" in host:
+        host = f"[{host}]"
+    if port and port != {"http": 80, "https": 443}[scheme]:
+        host = f"{host}:{port}"
+    if parts.username:
+        credentials = parts.username + (f":{parts.password}" if parts.password else "")
+        host = f"{credentials}@{host}"
+    path = re.sub(r"/{2,}", "/", parts.path).rstrip("/") + "/"
+    return urlunsplit((scheme, host, path, "", ""))
+
+
+def default_name(url: str) -> str:
+    """没有名称时用主机名（和路径）作为源名称"""
+    parts = urlsplit(url)
+    path = parts.path.strip("/")
+    return f"{parts.hostname}/{path}" if path else parts.hostname
+
+
+def _entries_from_json(data) -> List[Dict]:
+    """从JSON数据中提取源
+
+    支持 nrm 的 {"名称": {"registry": URL, ...}}、{"名称": URL}、
+    [URL, ...] 以及 [{"name": 名称, "url"或"registry": URL}, ...]。
+    """
+    entries = []
+    if isinstance(data, dict):
+        for name, value in data.items():
+            if isinstance(value, dict):
+                value = value.get("registry") or value.get("url")
+            if isinstance(value, str):
+                entries.append({"name": str(name), "url": value})
+    elif isinstance(data, list):
+        for item in data:
+            if isinstance(item, str):
+                entries.append({"name": None, "url": item})
+            elif isinstance(item, dict) and (item.get("url") or item.get("registry")):
+                entries.append({"name": item.get("name"), "url": item.get("url") or item.get("registry")})
+    return entries
+
+
+def _entries_from_text(text: str) -> List[Dict]:
+    """从纯文本中提取源：每行一个URL，或"名称 URL"（也可用逗号、等号分隔），#开头为注释"""
+    entries = []
+    for line in text.splitlines():
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        fields = [field for field in _LINE_SPLIT.split(line) if field]
+        url_index = next((i for i, field in enumerate(fields) if "://" in field), None)
+        if url_index is None:
+            entries.append({"name": None, "url": line})
+            continue
+        name = " ".join(fields[:url_index]) or None
+        entries.append({"name": name, "url": fields[url_index]})
+    return entries
+
+
+def parse_registry_list(text: str) -> Tuple[List[Dict], List[str]]:
+    """解析源列表（自动识别JSON和纯文本），返回 (规范化后的源列表, 无效的条目)
+
+    源列表中每项为 {"name", "url"}，URL重复的只保留第一次出现的。
+    """
+    try:
+        entries = _entries_from_json(json.loads(text))
+    except ValueError:
+        entries = _entries_from_text(text)
+
+    registries = []
+    invalid = []
+    seen = set()
+    for entry in entries:
+        url = normalize_registry_url(entry["url"])
+        if url is None:
+            invalid.append(entry["url"])
+            continue
+        if url in seen:
+            continue
+        seen.add(url)
+        registries.append({"name": (entry["name"] or "").strip() or default_name(url), "url": url})
+    return registries, invalid
+
+
+def read_registry_file(path: Path) -> Tuple[List[Dict], List[str]]:
+    """读取并解析源列表文件"""
+    try:
+        text = Path(path).read_text(encoding="utf-8-sig")
+    except (OSError, UnicodeDecodeError) as e:
+        raise Exception(f"读取{path}失败: {e}")
+    return parse_registry_list(text)
+
+
+def filter_existing(registries: List[Dict], existing: Dict[str, str]) -> Tuple[List[Dict], List[Dict]]:
+    """去掉已存在（规范化后URL相同）的源，名称冲突时加序号，返回 (新的源, 已存在的源)"""
+    existing_urls = {normalize_registry_url(url) for url in existing.values()}
+    names = set(existing)
+    fresh = []
+    duplicates = []
+    for registry in registries:
+        if registry["url"] in existing_urls:
+            duplicates.append(registry)
+            continue
+        name = registry["name"]
+        index = 2
+        while name in names:
+            name = f"{registry['name']} ({index})"
+            index += 1
+        names.add(name)
+        fresh.append({"name": name, "url": registry["url"]})
+    return fresh, duplicates
+
+
+def validate_registries(npm_manager, registries: List[Dict], timeout: float = 5,
+                        workers: int = DEFAULT_WORKERS,
+                        progress: Optional[Callable[[int, int, Dict, bool], None]] = None,
+                        cancelled: Optional[Callable[[], bool]] = None) -> List[Dict]:
+    """并发验证源的可访问性，返回每个源的结果 [{"name", "url", "valid"}]（保持原顺序）
+
+    每完成一个调用progress(已完成数, 总数, 源, 是否可用)；cancelled返回True时不再验证剩余的源，
+    这些源的valid为None。
+    """
+    results = [dict(registry, valid=None) for registry in registries]
+    if not registries:
+        return results
+    with ThreadPoolExecutor(max_workers=min(workers, len(registries))) as executor:
+        futures = {executor.submit(npm_manager.validate_registry_url, registry["url"], timeout): index
+                   for index, registry in enumerate(registries)}
+        for done, future in enumerate(as_completed(futures), 1):
+            index = futures[future]
+            results[index]["valid"] = future.result()
+            if progress is not None:
+                progress(done, len(registries), results[index], results[index]["valid"])
+            if cancelled is not None and cancelled():
+                for pending in futures:
+                    pending.cancel()
+                break
+    return results
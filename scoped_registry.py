@@ -0,0 +1,89 @@
+"""
+作用域源模块
+为 @scope:registry 形式的作用域源选择最快的地址：
+内部包和公共包分别从各自候选列表中最快的源下载
+"""
+
+import sys
+from typing import Dict, List, Optional
+
+from scoring import ScoringEngine, best_registry
+
+
+def choose_fastest(npm_manager, config_manager, urls: List[str], probe: bool = False,
+                   max_age: Optional[int] = None) -> Optional[Dict]:
+    """在urls中选出综合评分最高的源：优先使用已有结果，没有（或probe为True）时实际测速并记录
+
+    返回 {"url", "speed", "score", "source"}，source为"fresh"、"profile"、"probe"或"cached"；
+    离线时不测速，改用已有结果（没有时用最后一次成功的测速，source为"cached"），结果中offline为True。
+    全部连接失败或离线且没有任何记录时返回None。
+    """
+    choice = None if probe else config_manager.get_fastest_registry(urls, max_age)
+    if choice is not None:
+        return choice
+
+    connectivity = npm_manager.check_connectivity(urls, config_manager.get("offline_check_timeout", 0.2))
+    if not connectivity["online"]:
+        choice = config_manager.get_fastest_registry(urls, max_age)
+        if choice is None:
+            choice = config_manager.get_fastest_registry(urls, sys.maxsize)
+            if choice is not None:
+                choice["source"] = "cached"
+        if choice is not None:
+            choice["offline"] = True
+        return choice
+
+    timeout = config_manager.get("test_timeout", 5)
+    npm_manager.begin_probe_run()
+    speeds = {}
+    for url in urls:
+        phases = npm_manager.test_registry_phases(url, timeout)
+        if phases.get("deferred"):
+            continue
+        config_manager.record_speed_test(url, phases["total"] if phases["success"] else 0.0,
+                                         phases["success"], phases)
+        if phases["success"]:
+            speeds[url] = phases["total"]
+    if not speeds:
+        return None
+    # 在本次连通的源中按（包含本次结果的）测速历史综合评分
+    best = best_registry(ScoringEngine.from_config(config_manager).rank(
+        {url: url for url in speeds}, config_manager.history["speed_tests"]))
+    if best is None:
+        return None
+    return {"url": best["url"], "speed": speeds[best["url"]], "score": best["score"], "source": "probe"}
+
+
+def scope_candidates(npm_manager, config_manager) -> Dict[str, List[str]]:
+    """各作用域的候选源：配置中的候选列表，加上npm中当前设置的作用域源"""
+    candidates = {scope: list(urls) for scope, urls in config_manager.get_scope_candidates().items()}
+    for scope, url in npm_manager.get_scoped_registries().items():
+        urls = candidates.setdefault(scope, [])
+        if url not in urls:
+            urls.insert(0, url)
+    return candidates
+
+
+def select_scope_registries(npm_manager, config_manager, scopes: Optional[List[str]] = None,
+                            probe: bool = False, switch: bool = False,
+                            max_age: Optional[int] = None) -> List[Dict]:
+    """为每个作用域选出最快的候选源，switch为True时写入 @scope:registry
+
+    返回 [{"scope", "current", "choice", "switched"}]，choice为choose_fastest的结果。
+    """
+    candidates = scope_candidates(npm_manager, config_manager)
+    if scopes:
+        scopes = [npm_manager.normalize_scope(scope) for scope in scopes]
+        candidates = {scope: candidates.get(scope, []) for scope in scopes}
+
+    current = npm_manager.get_scoped_registries()
+    results = []
+    for scope, urls in candidates.items():
+        choice = choose_fastest(npm_manager, config_manager, urls, probe, max_age) if urls else None
+        switched = False
+        if switch and choice is not None and choice["url"] != current.get(scope):
+            npm_manager.set_scope_registry(scope, choice["url"])
+            config_manager.record_scope_switch(scope, current.get(scope), choice["url"])
+            switched = True
+        results.append({"scope": scope, "current": current.get(scope), "choice": choice, "switched": switched})
+    return results
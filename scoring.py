@@ -0,0 +1,178 @@
+"""
+源综合评分模块
+按可配置的权重综合响应时间分位数、下载吞吐量、错误率和同步延迟为源打分，
+返回带各项明细的排名，供界面、命令行和常驻服务统一使用
+"""
+
+import math
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional
+
+
+# 默认权重（某项指标所有源都没有数据时，按其余指标重新分配权重，所有源使用相同的权重）
+DEFAULT_WEIGHTS = {
+    "latency_p50": 0.3,
+    "latency_p90": 0.2,
+    "throughput": 0.25,
+    "error_rate": 0.15,
+    "sync_lag": 0.1
+}
+
+# 同步延迟达到该秒数时该项得分为0.5
+SYNC_LAG_SCALE = 600.0
+
+
+def percentile(values: List[float], pct: float) -> Optional[float]:
+    """最近秩法计算分位数"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(math.ceil(pct / 100 * len(ordered)), 1)
+    return ordered[rank - 1]
+
+
+def _successful_speeds(tests: List[Dict]) -> List[float]:
+    """成功测试的响应时间"""
+    return [t["speed"] for t in tests if t["success"] and t["speed"] > 0]
+
+
+def _phase_values(tests: List[Dict], key: str) -> List[float]:
+    """测试记录的分阶段结果中某一项的全部有效值"""
+    return [t["phases"][key] for t in tests if t.get("phases") and t["phases"].get(key) is not None]
+
+
+def _lower_is_better(value: float, low: float, high: float) -> float:
+    """越小越好：最优值（最小值）与该值之比"""
+    return low / value if value > 0 else 1.0
+
+
+def _higher_is_better(value: float, low: float, high: float) -> float:
+    """越大越好：该值与最优值（最大值）之比"""
+    return value / high if high > 0 else 0.0
+
+
+class ScoreComponent:
+    """评分项：extract从测试记录中提取原始值（无数据时为None），
+    normalize(值, 所有源中的最小值, 最大值)把原始值映射到0~1（1为最好）"""
+
+    def __init__(self, name: str, label: str, unit: str,
+                 extract: Callable[[List[Dict]], Optional[float]],
+                 normalize: Callable[[float, float, float], float]):
+        self.name = name
+        self.label = label
+        self.unit = unit
+        self.extract = extract
+        self.normalize = normalize
+
+
+# 已注册的评分项
+COMPONENTS: "OrderedDict[str, ScoreComponent]" = OrderedDict()
+
+
+def register_component(component: ScoreComponent) -> None:
+    """注册评分项（同名时覆盖），权重通过配置中的score_weights设置"""
+    COMPONENTS[component.name] = component
+
+
+def _median_of(key: str) -> Callable[[List[Dict]], Optional[float]]:
+    """提取分阶段结果中某一项的中位数"""
+    return lambda tests: percentile(_phase_values(tests, key), 50)
+
+
+register_component(ScoreComponent("latency_p50", "响应时间P50", "ms",
+                                  lambda tests: percentile(_successful_speeds(tests), 50), _lower_is_better))
+register_component(ScoreComponent("latency_p90", "响应时间P90", "ms",
+                                  lambda tests: percentile(_successful_speeds(tests), 90), _lower_is_better))
+register_component(ScoreComponent("throughput", "下载吞吐量", "KB/s", _median_of("throughput"),
+                                  _higher_is_better))
+register_component(ScoreComponent("error_rate", "错误率", "",
+                                  lambda tests: sum(1 for t in tests if not t["success"]) / len(tests) if tests else None,
+                                  lambda value, low, high: 1.0 - value))
+register_component(ScoreComponent("sync_lag", "同步延迟", "s", _median_of("sync_lag"),
+                                  lambda value, low, high: 1.0 / (1.0 + value / SYNC_LAG_SCALE)))
+
+
+class ScoringEngine:
+    """综合评分引擎"""
+
+    def __init__(self, weights: Optional[Dict[str, float]] = None):
+        self.weights = dict(DEFAULT_WEIGHTS)
+        if weights:
+            self.weights.update(weights)
+
+    @classmethod
+    def from_config(cls, config_manager) -> "ScoringEngine":
+        """按配置中的score_weights创建评分引擎"""
+        return cls(config_manager.get("score_weights"))
+
+    def rank(self, registries: Dict[str, str], speed_tests: Dict[str, List[Dict]]) -> List[Dict]:
+        """为源打分并按得分从高到低排序，没有成功测试记录的源得分为None并排在最后（不会被选为最佳源）
+
+        只有部分源有数据的评分项（如吞吐量测试失败），没有数据的源该项按最差计0分；
+        所有源都没有数据的评分项不参与评分，其余评分项的权重对所有源相同。
+        返回 [{"name", "url", "score", "breakdown": {评分项: {"value", "normalized", "weight", "points"}}}]，
+        没有数据的评分项value为None。
+        """
+        components = [c for name, c in COMPONENTS.items() if self.weights.get(name, 0) > 0]
+        tested = {url for url in registries.values() if any(t["success"] for t in speed_tests.get(url) or [])}
+        raw = {url: {c.name: c.extract(speed_tests[url]) for c in components} for url in tested}
+
+        # 每个评分项的取值范围只计算一次
+        bounds = {}
+        for component in components:
+            values = [raw[url][component.name] for url in raw if raw[url][component.name] is not None]
+            if values:
+                bounds[component.name] = (min(values), max(values))
+        total_weight = sum(self.weights[key] for key in bounds)
+
+        ranking = []
+        for name, url in registries.items():
+            breakdown = OrderedDict()
+            score = None
+            if url in raw and total_weight > 0:
+                score = 0.0
+                for component in components:
+                    if component.name not in bounds:
+                        continue
+                    value = raw[url][component.name]
+                    normalized = 0.0
+                    if value is not None:
+                        normalized = max(min(component.normalize(value, *bounds[component.name]), 1.0), 0.0)
+                    weight = self.weights[component.name] / total_weight
+                    points = normalized * weight * 100
+                    score += points
+                    breakdown[component.name] = {"value": None if value is None else round(value, 4),
+                                                 "normalized": round(normalized, 3),
+                                                 "weight": round(weight, 3), "points": round(points, 1)}
+                score = round(score, 1)
+            ranking.append({"name": name, "url": url, "score": score, "breakdown": breakdown})
+
+        ranking.sort(key=lambda item: (item["score"] is None, -(item["score"] or 0)))
+        return ranking
+
+
+def best_registry(ranking: List[Dict]) -> Optional[Dict]:
+    """排名中得分最高的源"""
+    return next((item for item in ranking if item["score"] is not None), None)
+
+
+def format_breakdown(item: Optional[Dict]) -> str:
+    """将评分明细格式化为多行文本，用于提示框和命令行显示"""
+    if not item or item.get("score") is None:
+        return ""
+    lines = [f"综合评分: {item['score']}"]
+    for key, detail in item["breakdown"].items():
+        component = COMPONENTS.get(key)
+        if component is None:
+            continue
+        value = detail["value"]
+        unit = component.unit
+        if value is None:
+            value, unit = "无数据", ""
+        elif key == "throughput":
+            value = round(value / 1024, 1)
+        elif key == "error_rate":
+            value = f"{round(value * 100)}%"
+        lines.append(f"{component.label}: {value}{unit}  "
+                     f"(+{detail['points']}, 权重{round(detail['weight'] * 100)}%)")
+    return "\n".join(lines)
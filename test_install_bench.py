@@ -0,0 +1,49 @@
+"""
+npm ci 安装基准测试
+把内置测试项目的锁文件改写到本地模拟源，并对其执行 npm ci（未安装npm时跳过）
+"""
+
+import json
+import shutil
+
+import pytest
+
+from fake_registry import FakeRegistryServer
+from install_bench import InstallBenchmark, rewrite_lockfile
+
+
+def test_rewrite_lockfile():
+    """全部依赖的resolved地址改写到目标源，保留包路径"""
+    with FakeRegistryServer() as origin:
+        lockfile = origin.registry.lockfile(origin.url, {"tiny-lib": "^1.0.0", "@fixture/scoped": "^0.1.0"})
+    rewritten = rewrite_lockfile(lockfile, "https://mirror.example.com/npm/")
+
+    packages = {key: entry for key, entry in rewritten["packages"].items() if key}
+    assert set(packages) == {"node_modules/tiny-lib", "node_modules/left-pad", "node_modules/@fixture/scoped"}
+    assert (packages["node_modules/left-pad"]["resolved"]
+            == "https://mirror.example.com/npm/left-pad/-/left-pad-1.3.0.tgz")
+    assert packages["node_modules/@fixture/scoped"]["resolved"].startswith(
+        "https://mirror.example.com/npm/@fixture/scoped/-/")
+    # 原锁文件不被修改
+    assert lockfile["packages"]["node_modules/left-pad"]["resolved"].startswith(origin.url)
+
+
+@pytest.mark.skipif(shutil.which("npm") is None, reason="未找到npm")
+def test_run_install_benchmark(tmp_path):
+    """锁文件指向另一个（已停止的）源时，npm ci 从改写后的源下载全部tarball"""
+    with FakeRegistryServer() as origin:
+        project = origin.write_fixture_project(tmp_path / "project")
+
+    with FakeRegistryServer(latency=0.01) as server:
+        result = InstallBenchmark(shutil.which("npm"), project, repeats=2, timeout=120).run(server.url)
+        tarballs = {request["path"] for request in server.requests if request["path"].endswith(".tgz")}
+
+    assert result["url"] == server.url
+    assert result["failures"] == 0, [run["error"] for run in result["runs"]]
+    assert len(result["runs"]) == 2
+    assert result["median_wall"] > 0
+    assert result["median_bytes"] > 0
+    assert len(tarballs) == 3
+    # 测试项目本身的锁文件不被修改
+    lockfile = json.loads((project / "package-lock.json").read_text(encoding="utf-8"))
+    assert all(server.url not in entry.get("resolved", "") for entry in lockfile["packages"].values())
@@ -0,0 +1,75 @@
+"""
+测速引擎测试
+对本地模拟源执行分阶段测速、质量测试（吞吐量和同步延迟）和Range分片探测
+"""
+
+import pytest
+
+from fake_registry import FakeRegistryServer
+from npm_manager import NPMRegistryManager
+
+
+@pytest.fixture
+def server():
+    """本地模拟源"""
+    with FakeRegistryServer(latency=0.01, seed=1) as registry:
+        yield registry
+
+
+@pytest.fixture
+def manager(tmp_path, monkeypatch, server):
+    """使用隔离目录的NPMRegistryManager，官方源指向模拟源（同步延迟的参考不访问外网）"""
+    monkeypatch.setenv("HOME", str(tmp_path))
+    monkeypatch.setitem(NPMRegistryManager.CHINA_REGISTRIES, "官方源", server.url)
+    try:
+        return NPMRegistryManager(cache_dir=tmp_path / "cache")
+    except Exception as e:
+        pytest.skip(f"无法创建NPMRegistryManager: {e}")
+
+
+def test_speed_probe(manager, server):
+    """分阶段测速成功，总耗时不小于注入的延迟"""
+    phases = manager.test_registry_phases(server.url)
+    assert phases["success"]
+    assert phases["total"] >= 10
+
+
+def test_quality_probe(manager, server):
+    """下载默认质量测试包的tarball，模拟源与参考源同步，同步延迟为0"""
+    quality = manager.test_registry_quality(server.url)
+    assert quality["error"] is None
+    assert quality["latest"] == "4.17.21"
+    assert quality["throughput"] > 0
+    assert quality["sync_lag"] == 0
+
+
+def test_quality_probe_range_budget(manager, server):
+    """Range模式下包元数据和分片都计入预算"""
+    budget = 64 * 1024
+    quality = manager.test_registry_quality(server.url, range_budget=budget)
+    assert quality["error"] is None
+    assert quality["throughput"] > 0
+    assert 0 < quality["range"]["bytes"] <= budget
+
+
+def test_range_probe(manager, server):
+    """默认Range探测包在预算内完成分片探测"""
+    budget = 128 * 1024
+    result = manager.test_registry_range(server.url, budget=budget)
+    assert result["error"] is None
+    assert result["range_supported"]
+    assert result["slices"] > 1
+    assert result["throughput"] > 0
+    assert result["bytes"] <= budget
+    assert "/typescript/-/" in result["tarball"]
+
+
+def test_range_probe_without_range_support(manager):
+    """源忽略Range时只读取预算内的字节"""
+    budget = 32 * 1024
+    with FakeRegistryServer(support_range=False) as server:
+        result = manager.test_registry_range(server.url, budget=budget)
+    assert result["error"] is None
+    assert result["range_supported"] is False
+    assert result["throughput"] > 0
+    assert result["bytes"] <= budget
@@ -6,6 +6,8 @@ UI组件模块
 from PySide6.QtWidgets import *
 from PySide6.QtCore import *
 from PySide6.QtGui import *
+from network_probe import format_phases
+from scoring import format_breakdown
 
 
 class ModernButton(QPushButton):
@@ -74,12 +76,15 @@ class RegistryCard(QFrame):
     
     clicked = Signal(str)  # 发送源URL信号
     
-    def __init__(self, name, url, is_current=False, speed=None):
+    def __init__(self, name, url, is_current=False, speed=None, phases=None, notice=None, score=None):
         super().__init__()
         self.name = name
         self.url = url
         self.is_current = is_current
         self.speed = speed
+        self.phases = phases
+        self.notice = notice
+        self.score = score
         self.setup_ui()
         self.setup_style()
     
@@ -100,17 +105,16 @@ class RegistryCard(QFrame):
         top_layout.addStretch()
         
         # 当前源标识
-        if self.is_current:
-            current_label = QLabel("当前")
-            current_label.setStyleSheet("""
-                background-color: #28A745;
-                color: white;
-                border-radius: 10px;
-                padding: 2px 8px;
-                font-size: 11px;
-                font-weight: 500;
-            """)
-            top_layout.addWidget(current_label)
+        self.current_label = QLabel("当前")
+        self.current_label.setStyleSheet("""
+            background-color: #28A745;
+            color: white;
+            border-radius: 10px;
+            padding: 2px 8px;
+            font-size: 11px;
+            font-weight: 500;
+        """)
+        top_layout.addWidget(self.current_label)
         
         layout.addLayout(top_layout)
         
@@ -125,7 +129,10 @@ class RegistryCard(QFrame):
         
         # 速度信息
         if self.speed is not None:
-            if self.speed > 0:
+            if self.phases and self.phases.get("deferred"):
+                speed_text = "已推迟（限速）"
+                color = "#6C757D"
+            elif self.speed > 0:
                 speed_text = f"响应时间: {self.speed}ms"
                 color = "#28A745" if self.speed < 1000 else "#FFC107" if self.speed < 3000 else "#DC3545"
             else:
@@ -134,18 +141,47 @@ class RegistryCard(QFrame):
             
             speed_label = QLabel(speed_text)
             speed_label.setStyleSheet(f"color: {color}; font-size: 11px; font-weight: 500;")
+            
+            # 分阶段耗时明细
+            if self.phases:
+                self.setToolTip(format_phases(self.phases))
             bottom_layout.addWidget(speed_label)
         
+        # 综合评分
+        if self.score and self.score.get("score") is not None:
+            score_label = QLabel(f"评分: {round(self.score['score'])}")
+            score_label.setStyleSheet("color: #007ACC; font-size: 11px; font-weight: 500;")
+            score_label.setToolTip(format_breakdown(self.score))
+            bottom_layout.addWidget(score_label)
+        
+        # 网络路径提示
+        if self.notice:
+            notice_label = QLabel("⚠ 网络路径建议")
+            notice_label.setStyleSheet("color: #FFC107; font-size: 11px; font-weight: 500;")
+            notice_label.setToolTip(self.notice)
+            bottom_layout.addWidget(notice_label)
+        
         bottom_layout.addStretch()
         
         # 操作按钮
-        if not self.is_current:
-            switch_btn = ModernButton("切换", primary=True)
-            switch_btn.clicked.connect(lambda: self.clicked.emit(self.url))
-            switch_btn.setFixedSize(60, 28)
-            bottom_layout.addWidget(switch_btn)
+        self.switch_btn = ModernButton("切换", primary=True)
+        self.switch_btn.clicked.connect(lambda: self.clicked.emit(self.url))
+        self.switch_btn.setFixedSize(60, 28)
+        bottom_layout.addWidget(self.switch_btn)
         
         layout.addLayout(bottom_layout)
+        
+        self.current_label.setVisible(self.is_current)
+        self.switch_btn.setVisible(not self.is_current)
+    
+    def set_current(self, is_current):
+        """更新是否为当前源（只改变标识、按钮和样式，不重建卡片）"""
+        if is_current == self.is_current:
+            return
+        self.is_current = is_current
+        self.current_label.setVisible(is_current)
+        self.switch_btn.setVisible(not is_current)
+        self.setup_style()
     
     def setup_style(self):
         """设置卡片样式"""
@@ -349,3 +385,133 @@ class CustomLineEdit(QLineEdit):
                 outline: none;
             }
         """)
+
+
+class ProfileHeatmap(QWidget):
+    """周内时段热力图：7行（周一至周日）× 24列（小时），颜色表示平均响应时间"""
+    
+    DAYS = ["周一", "周二", "周三", "周四", "周五", "周六", "周日"]
+    LABEL_WIDTH = 36
+    HEADER_HEIGHT = 16
+    
+    def __init__(self, current_slot=None):
+        super().__init__()
+        self.profile = [None] * 168
+        self.scale = None
+        self.current_slot = current_slot
+        self.setMouseTracking(True)
+        self.setMinimumSize(self.LABEL_WIDTH + 24 * 18, self.HEADER_HEIGHT + 7 * 18)
+    
+    def set_profile(self, profile, scale=None):
+        """设置168个时段的统计（{"count", "total", "failures"} 或 None）
+        
+        scale为颜色对应的 (最快, 最慢) 毫秒数，默认按该源自身的范围着色。
+        """
+        self.profile = profile
+        self.scale = scale
+        self.update()
+    
+    def _cell_size(self):
+        """单元格宽高"""
+        width = (self.width() - self.LABEL_WIDTH) / 24
+        height = (self.height() - self.HEADER_HEIGHT) / 7
+        return width, height
+    
+    @staticmethod
+    def _average(stats):
+        """时段平均响应时间，没有成功记录时为None"""
+        if not stats or not stats["count"]:
+            return None
+        return stats["total"] / stats["count"]
+    
+    def _color(self, stats, low, high):
+        """按响应时间在绿色到红色之间插值，全部失败为深红，无数据为灰色"""
+        if not stats:
+            return QColor("#EEEEEE")
+        average = self._average(stats)
+        if average is None:
+            return QColor("#8B0000")
+        ratio = 0.0 if high <= low else (average - low) / (high - low)
+        return QColor.fromHsvF((1 - ratio) * 0.33, 0.7, 0.9)
+    
+    def paintEvent(self, event):
+        """绘制热力图"""
+        painter = QPainter(self)
+        averages = [a for a in (self._average(s) for s in self.profile) if a is not None]
+        low, high = self.scale or ((min(averages), max(averages)) if averages else (0, 0))
+        width, height = self._cell_size()
+        
+        painter.setPen(QColor("#666666"))
+        font = painter.font()
+        font.setPointSize(8)
+        painter.setFont(font)
+        for hour in range(0, 24, 3):
+            painter.drawText(QRectF(self.LABEL_WIDTH + hour * width, 0, width * 3, self.HEADER_HEIGHT),
+                             Qt.AlignLeft | Qt.AlignVCenter, str(hour))
+        for day, label in enumerate(self.DAYS):
+            painter.drawText(QRectF(0, self.HEADER_HEIGHT + day * height, self.LABEL_WIDTH, height),
+                             Qt.AlignLeft | Qt.AlignVCenter, label)
+        
+        for slot, stats in enumerate(self.profile):
+            day, hour = divmod(slot, 24)
+            rect = QRectF(self.LABEL_WIDTH + hour * width, self.HEADER_HEIGHT + day * height,
+                          width - 1, height - 1)
+            painter.fillRect(rect, self._color(stats, low, high))
+            if slot == self.current_slot:
+                painter.setPen(QPen(QColor("#007ACC"), 2))
+                painter.drawRect(rect)
+    
+    def mouseMoveEvent(self, event):
+        """悬停时显示时段的统计"""
+        width, height = self._cell_size()
+        pos = event.position()
+        hour = int((pos.x() - self.LABEL_WIDTH) // width) if width else -1
+        day = int((pos.y() - self.HEADER_HEIGHT) // height) if height else -1
+        if not (0 <= hour < 24 and 0 <= day < 7):
+            QToolTip.hideText()
+            return
+        stats = self.profile[day * 24 + hour]
+        text = f"{self.DAYS[day]} {hour}:00-{hour + 1}:00\n"
+        if not stats:
+            text += "无数据"
+        else:
+            average = self._average(stats)
+            text += f"平均响应时间: {round(average, 2)}ms\n" if average is not None else "全部失败\n"
+            text += f"成功 {stats['count']} 次，失败 {stats['failures']} 次"
+        QToolTip.showText(event.globalPosition().toPoint(), text, self)
+
+
+class ProfileDialog(QDialog):
+    """时段分析对话框：选择源查看其周内时段热力图"""
+    
+    def __init__(self, profiles, current_slot=None, parent=None):
+        super().__init__(parent)
+        self.profiles = profiles
+        # 所有源使用同一颜色范围，便于横向比较
+        averages = [
+            stats["total"] / stats["count"]
+            for profile in profiles.values() for stats in profile if stats and stats["count"]
+        ]
+        self.scale = (min(averages), max(averages)) if averages else None
+        self.setWindowTitle("时段分析")
+        self.setMinimumSize(560, 260)
+        
+        layout = QVBoxLayout(self)
+        self.registry_combo = CustomComboBox()
+        self.registry_combo.addItems(list(profiles.keys()))
+        layout.addWidget(self.registry_combo)
+        
+        self.heatmap = ProfileHeatmap(current_slot)
+        layout.addWidget(self.heatmap, 1)
+        
+        hint = QLabel("颜色越绿响应越快，深红表示全部失败，灰色表示没有数据；蓝框为当前时段")
+        hint.setStyleSheet("color: #666666; font-size: 11px;")
+        layout.addWidget(hint)
+        
+        self.registry_combo.currentTextChanged.connect(self.show_registry)
+        if profiles:
+            self.show_registry(self.registry_combo.currentText())
+    
+    def show_registry(self, name):
+        """显示指定源的热力图"""
+        self.heatmap.set_profile(self.profiles.get(name, [None] * 168), self.scale)